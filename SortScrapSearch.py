@@ -1,20 +1,70 @@
 import json
 import os
 
+from export_writers import detect_format, export_sorted, open_input
+from geo_index import GeoIndex, get_coordinates
+from listing import (AMENITY_LABELS, Equipement, Listing, Rejet, format_surface,
+                     listing_document_id, parse_amenities, parse_number,
+                     parse_specificites)
+from snapshot_cache import SnapshotCache, content_digest
+from stats_engine import StatsAccumulator
+
+# Le score (NumPy), l'index plein texte (SQLite) et le rapprochement des
+# sources sont importés à la demande pour accélérer le démarrage
+
+
+# Critères de tri par défaut (surchargeables à l'instanciation)
+DEFAULT_CRITERIA = {
+    "prix_min": 200,
+    "prix_max": 1000,
+    "surface_min": 25,
+    # Liste de points (latitude, longitude), ex: lieu de travail
+    "points_reference": None,
+    # Distance maximale en km à au moins un des points de référence
+    "distance_max_km": None,
+}
+
+# Version de la normalisation : à incrémenter à chaque modification de
+# normalizeDataFormat ou des conversions, pour invalider le cache
+NORMALIZER_VERSION = 4
+
+# Équipements signalés par les drapeaux du format API SeLoger
+API_AMENITIES = (
+    ('has_balcony', Equipement.BALCON),
+    ('has_terrace', Equipement.TERRASSE),
+    ('has_garden', Equipement.JARDIN),
+    ('has_parking', Equipement.PARKING),
+    ('has_elevator', Equipement.ASCENSEUR),
+    ('has_furnished', Equipement.MEUBLE),
+)
+
 
 class SortScrapSearch:
-    def __init__(self, data_source=None) -> None:
+    def __init__(self, data_source=None, criteria=None, use_cache=True) -> None:
         """
         Initialise le trieur de recherche d'appartements
 
         Args:
             data_source: Peut être un chemin vers un fichier JSON, 
                         un dictionnaire de données, ou None pour utiliser le fichier par défaut
+            criteria: Dictionnaire de critères surchargeant DEFAULT_CRITERIA
+            use_cache: Réutiliser les données déjà normalisées d'un fichier inchangé
         """
+        self.criteria = dict(DEFAULT_CRITERIA)
+        if criteria:
+            self.criteria.update(criteria)
+        self.cache = SnapshotCache(NORMALIZER_VERSION) if use_cache else None
+
         self.search = self.getJson(data_source)
         self.rejectedSearch = {}
         self.validSearch = {}
         self.stats = {}
+        self.statsEngine = None
+        self.geoIndex = None
+        self.bitmapIndex = None
+        self.similarityIndex = None
+        self.scoreMatrix = None
+        self.documentKeys = None
 
         self.sortSearch()
         self.calculateStats()
@@ -24,18 +74,18 @@ class SortScrapSearch:
         Charge les données depuis différentes sources
 
         Args:
-            data_source: Source des données (fichier, dictionnaire, ou None)
-        """
-        if isinstance(data_source, dict):
-            # Si c'est déjà un dictionnaire, l'utiliser directement
-            return data_source
+            data_source: Source des données (fichier, dictionnaire, liste de
+                        sources à rapprocher, ou None)
+        """
+        if isinstance(data_source, (list, tuple)):
+            return self.mergeSources(data_source)
+        elif isinstance(data_source, dict):
+            # Si c'est déjà un dictionnaire, le normaliser en mémoire
+            return self.normalizeDataFormat(data_source)
         elif isinstance(data_source, str):
             # Si c'est un chemin de fichier
             if os.path.exists(data_source):
-                with open(data_source, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    # Adapter le format si nécessaire
-                    return self.normalizeDataFormat(data)
+                return self.loadFile(data_source)
             else:
                 raise FileNotFoundError(
                     f"Le fichier {data_source} n'existe pas")
@@ -44,13 +94,74 @@ class SortScrapSearch:
             default_files = ["./res.json", "./files/seLoger1.json"]
             for file_path in default_files:
                 if os.path.exists(file_path):
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        data = json.load(f)
-                        print(f"Données chargées depuis: {file_path}")
-                        return self.normalizeDataFormat(data)
+                    data = self.loadFile(file_path)
+                    print(f"Données chargées depuis: {file_path}")
+                    return data
 
             raise FileNotFoundError("Aucun fichier de données trouvé")
 
+    def loadFile(self, file_path):
+        """
+        Charge et normalise un fichier JSON ou JSON Lines (éventuellement
+        compressé .gz / .zst), en passant par le cache, ou ouvre un
+        instantané .msnap, déjà normalisé
+
+        Args:
+            file_path: Chemin du fichier JSON, JSON Lines ou de l'instantané
+
+        Returns:
+            dict: Données normalisées {clé: Listing}
+        """
+        if file_path.endswith(".msnap"):
+            # Instantané binaire : projeté par mmap, champs décodés à la lecture
+            from snapshot_format import Snapshot
+            return Snapshot(file_path).listings()
+
+        if self.cache is not None:
+            data = self.cache.load(file_path)
+            if data is not None:
+                return data
+
+        stat = os.stat(file_path)
+        fmt, compression = detect_format(file_path)
+        with open_input(file_path, compression, binary=True) as f:
+            raw = f.read()
+        if fmt == "jsonl":
+            data = self.parseJsonLines(raw)
+        else:
+            data = json.loads(raw)
+        # Adapter le format si nécessaire
+        data = self.normalizeDataFormat(data)
+
+        if self.cache is not None:
+            self.cache.store(file_path, data, stat=stat,
+                             digest=content_digest(raw))
+        return data
+
+    def mergeSources(self, sources):
+        """
+        Charge plusieurs sources et fusionne les annonces présentes dans
+        plusieurs d'entre elles (ex: res.json et seLoger1.json)
+
+        Args:
+            sources: Liste de chemins ou de dictionnaires
+
+        Returns:
+            dict: Annonces dédoublonnées, clés préfixées par leur source
+        """
+        combined = {}
+        for i, source in enumerate(sources):
+            prefix = os.path.basename(source) if isinstance(
+                source, str) else f"source{i + 1}"
+            for key, item in self.getJson(source).items():
+                combined[f"{prefix}:{key}"] = item
+
+        from entity_resolution import EntityResolver
+        resolved, matches = EntityResolver().resolve(combined)
+        if matches:
+            print(f"{len(matches)} annonce(s) fusionnée(s) entre sources")
+        return resolved
+
     def normalizeDataFormat(self, data):
         """
         Normalise le format des données pour qu'elles soient compatibles
@@ -59,27 +170,75 @@ class SortScrapSearch:
             data: Données brutes du fichier JSON
 
         Returns:
-            dict: Données normalisées
+            dict: Données normalisées {clé: Listing}
         """
         normalized_data = {}
 
-        for key, item in data.items():
+        for key, item in self.unwrapListings(data).items():
             # Détecter le format des données
-            if self.isSeLogerApiFormat(item):
+            if isinstance(item, Listing):
+                # Déjà normalisé
+                normalized_item = item
+            elif self.isSeLogerApiFormat(item):
                 # Format API SeLoger (seLoger1.json)
                 normalized_item = self.convertSeLogerApiFormat(item)
             elif self.isScrapedFormat(item):
                 # Format scraped (res.json)
-                normalized_item = item
+                normalized_item = self.convertScrapedFormat(item)
             else:
                 # Format inconnu, essayer de deviner
                 normalized_item = self.guessFormat(item)
 
             if normalized_item:
-                normalized_data[key] = normalized_item
+                normalized_data[key] = Listing.from_dict(normalized_item)
 
         return normalized_data
 
+    def parseJsonLines(self, raw):
+        """
+        Décode un export JSON Lines (une annonce par ligne, avec sa clé
+        "cle" ; le statut exporté est recalculé par le tri)
+
+        Args:
+            raw: Contenu du fichier (octets)
+
+        Returns:
+            dict: Annonces brutes {clé: annonce}
+        """
+        listings = {}
+        for number, line in enumerate(raw.decode("utf-8").splitlines(), 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            record.pop("statut", None)
+            key = record.pop("cle", None)
+            listings[str(key) if key is not None else
+                     listing_document_id(str(number), record)] = record
+        return listings
+
+    def unwrapListings(self, data):
+        """
+        Extrait les annonces des fichiers qui les enveloppent
+
+        - fichier détaillé du spider : {'metadata': ..., 'annonces': {...}}
+        - résultats triés exportés : {'annonces_valides': ..., 'annonces_rejetees': ...}
+        - liste d'annonces : clé tirée de l'annonce, à défaut son rang
+
+        Returns:
+            dict: Annonces {clé: annonce}
+        """
+        if isinstance(data, dict):
+            if 'annonces_valides' in data or 'annonces_rejetees' in data:
+                listings = dict(data.get('annonces_valides') or {})
+                listings.update(data.get('annonces_rejetees') or {})
+                return listings
+            if 'metadata' in data and isinstance(data.get('annonces'), (dict, list)):
+                data = data['annonces']
+        if isinstance(data, list):
+            return {listing_document_id(str(i), item): item
+                    for i, item in enumerate(data) if isinstance(item, dict)}
+        return data
+
     def isSeLogerApiFormat(self, item):
         """
         Vérifie si l'item est au format API SeLoger
@@ -108,8 +267,8 @@ class SortScrapSearch:
         try:
             # Extraction des informations de base
             description = item.get('description', '')
-            prix_str = f"{item.get('price', 0)} €" if item.get(
-                'price') else "N/A"
+            prix = parse_number(item.get('price')) or None
+            charges = parse_number(item.get('charges')) or None
 
             # Construction de l'URL
             annonce_id = item.get('annonce_id', '')
@@ -124,44 +283,42 @@ class SortScrapSearch:
             address = item.get('address', '')
             district = item.get('district', '')
             localisation = f"{address}, {district}" if district else address
-
-            # Spécificités
+            coordinates = get_coordinates(item)
+
+            # Valeurs numériques (certains exports nomment rooms_count "rooms")
+            rooms = parse_number(item.get('rooms_count', item.get('rooms'))) or 0
+            bedrooms = parse_number(item.get('bedrooms_count')) or 0
+            area = parse_number(item.get('area')) or 0
+            floor = parse_number(item.get('floor'))
+            max_floor = parse_number(item.get('max_floor'))
+            tags = str(item.get('tags') or '').split(',')
+            if floor is None:
+                # Étage uniquement présent dans les tags ("Étage 2/–")
+                values = parse_specificites(tags)
+                floor = values.get('etage')
+                max_floor = max_floor or values.get('etage_max')
+
+            # Spécificités (libellés d'affichage)
             specificite = []
-
-            # Nombre de pièces
-            rooms = item.get('rooms_count', 0)
             if rooms:
                 specificite.append(f"{rooms} pièces")
-
-            # Nombre de chambres
-            bedrooms = item.get('bedrooms_count', 0)
             if bedrooms:
                 specificite.append(f"{bedrooms} chambres")
-
-            # Surface
-            area = item.get('area', 0)
             if area:
-                specificite.append(f"{int(area)} m²")
-
-            # Étage
-            floor = item.get('floor', '')
-            max_floor = item.get('max_floor', '')
-            if floor and max_floor:
+                specificite.append(format_surface(area))
+            if floor is not None and max_floor:
                 specificite.append(f"Étage {floor}/{max_floor}")
-            elif floor:
+            elif floor is not None:
                 specificite.append(f"Étage {floor}")
 
-            # Équipements
-            if item.get('has_balcony'):
-                specificite.append("Balcon")
-            if item.get('has_terrace'):
-                specificite.append("Terrasse")
-            if item.get('has_garden'):
-                specificite.append("Jardin")
-            if item.get('has_parking'):
-                specificite.append("Parking")
-            if item.get('has_elevator'):
-                specificite.append("Ascenseur")
+            # Équipements (drapeaux de l'API, à défaut tags "Ascenseur, Balcon")
+            equipements = parse_amenities(tags, type_bien)
+            for field, flag in API_AMENITIES:
+                if item.get(field):
+                    equipements |= flag
+            for flag, label in AMENITY_LABELS.items():
+                if equipements & flag and flag != Equipement.MEUBLE:
+                    specificite.append(label)
 
             # Détection colocation et studio
             colocation_keywords = [
@@ -177,18 +334,35 @@ class SortScrapSearch:
             normalized_item = {
                 'lien': lien,
                 'type': type_bien,
-                'prix': prix_str,
+                'prix': prix,
+                'charges': charges,
                 'localisation': localisation,
                 'specificite': specificite,
                 'description': description,
-                'surface_m2': int(area) if area else None,
+                'titre': item.get('title') or None,
+                'caracteristiques': item.get('features') or None,
+                'dpe': item.get('dpe') or None,
+                'ges': item.get('ges') or None,
+                'equipements': int(equipements),
+                'surface_m2': area if area else None,
                 'nombre_pieces': rooms if rooms else None,
+                'nombre_chambres': bedrooms if bedrooms else None,
+                'etage': floor,
+                'etage_max': max_floor,
                 'colocation': colocation,
                 'studio': studio,
                 'VALIDE': None,
                 # Données supplémentaires
                 'annonce_id': annonce_id,
-                'source': 'api_seloger'
+                'latitude': coordinates[0] if coordinates else None,
+                'longitude': coordinates[1] if coordinates else None,
+                'insee_code': item.get('insee_code') or None,
+                'postal_code': item.get('postal_code') or None,
+                'district': district or None,
+                'source': 'api_seloger',
+                'date_scraping': item.get('collected_at') or None,
+                # Baisse de prix signalée par SeLoger (historique des prix)
+                'baisse_prix_pct': parse_number(item.get('price_decrease_percent')) or None
             }
 
             return normalized_item
@@ -197,6 +371,23 @@ class SortScrapSearch:
             print(f"Erreur lors de la conversion de l'item: {e}")
             return None
 
+    def convertScrapedFormat(self, item):
+        """
+        Complète une annonce scrapée avec ses valeurs numériques
+
+        Les valeurs absentes (anciens fichiers res.json) sont extraites une
+        seule fois des spécificités textuelles (dont les équipements) ; le
+        prix est converti par Listing.
+        """
+        normalized_item = dict(item)
+        for field, value in parse_specificites(item.get('specificite')).items():
+            if normalized_item.get(field) is None:
+                normalized_item[field] = value
+        if normalized_item.get('equipements') is None:
+            normalized_item['equipements'] = int(parse_amenities(
+                item.get('specificite'), item.get('type')))
+        return normalized_item
+
     def guessFormat(self, item):
         """
         Essaie de deviner le format des données
@@ -225,97 +416,342 @@ class SortScrapSearch:
         text_lower = text.lower()
         return any(word.lower() in text_lower for word in words)
 
-    def sortSearch(self):
+    def sortSearch(self, keys=None):
         """
         Trie les annonces entre valides et rejetées selon les critères
+
+        Args:
+            keys: Clés des annonces à trier (par défaut toutes)
         """
-        for key, item in self.search.items():
+        distances = self.computeDistances()
+
+        for key in self.search if keys is None else keys:
+            item = self.search[key]
             # Critères de rejet
             is_colocation = item.get("colocation", False)
             is_studio = item.get("studio", False)
 
             # Critères supplémentaires de validation
-            has_valid_price = self.validatePrice(
-                item.get("prix", item.get("price", "")))
+            has_valid_price = self.validatePrice(item.get("prix"))
             has_valid_surface = self.validateSurfaceFromItem(item)
-
-            if not is_colocation and not is_studio and has_valid_price and has_valid_surface:
+            has_valid_distance = True
+            if distances is not None and get_coordinates(item):
+                has_valid_distance = key in distances
+                if has_valid_distance:
+                    item["distance_km"] = round(distances[key], 2)
+
+            reasons = Rejet(0)
+            if is_colocation:
+                reasons |= Rejet.COLOCATION
+            if is_studio:
+                reasons |= Rejet.STUDIO
+            if not has_valid_price:
+                reasons |= Rejet.PRIX
+            if not has_valid_surface:
+                reasons |= Rejet.SURFACE
+            if not has_valid_distance:
+                reasons |= Rejet.DISTANCE
+
+            if not reasons:
                 self.validSearch[key] = item
-                # Ajouter une note de validation
-                item["validation_reason"] = "Critères respectés"
+                # Statut de validation ("Critères respectés")
+                item.mark_valid()
             else:
                 self.rejectedSearch[key] = item
-                # Ajouter la raison du rejet
-                reasons = []
-                if is_colocation:
-                    reasons.append("colocation")
-                if is_studio:
-                    reasons.append("studio")
-                if not has_valid_price:
-                    reasons.append("prix invalide")
-                if not has_valid_surface:
-                    reasons.append("surface invalide")
+                # Motifs de rejet (exposés via item["rejection_reason"])
+                item.mark_rejected(reasons)
+
+    def addListings(self, listings):
+        """
+        Ajoute et trie de nouvelles annonces (affichage au fil du crawl)
+
+        Seules les nouvelles annonces sont triées ; les statistiques sont
+        complétées sans repasser sur les précédentes.
 
-                item["rejection_reason"] = ", ".join(reasons)
+        Args:
+            listings: Dictionnaire {clé: annonce} ; les clés déjà chargées
+                      sont ignorées
 
-    def validatePrice(self, prix_str):
+        Returns:
+            tuple: (valides, rejetées), dictionnaires des nouvelles annonces
         """
-        Valide si le prix est dans une fourchette acceptable
+        new = self.normalizeDataFormat(
+            {key: item for key, item in listings.items() if key not in self.search})
+        if not new:
+            return {}, {}
+        self.search.update(new)
+        # Index construits sur l'ancien ensemble d'annonces
+        self.geoIndex = None
+        self.bitmapIndex = None
+        self.similarityIndex = None
+        self.scoreMatrix = None
+        self.documentKeys = None
+
+        self.sortSearch(new)
+        for item in new.values():
+            self.statsEngine.add(item)
+        self.stats = self.statsEngine.summary()
+
+        valid = {key: item for key, item in new.items() if key in self.validSearch}
+        rejected = {key: item for key, item in new.items() if key in self.rejectedSearch}
+        return valid, rejected
+
+    def getGeoIndex(self):
+        """
+        Retourne l'index géospatial des annonces (construit à la demande)
+        """
+        if self.geoIndex is None:
+            self.geoIndex = GeoIndex.from_listings(self.search)
+        return self.geoIndex
+
+    def findSimilar(self, key, k=10, metric="cosinus", valid_only=True):
+        """
+        Annonces les plus proches d'une annonce (prix, surface, pièces,
+        équipements, position, description)
 
         Args:
-            prix_str: Chaîne contenant le prix (ex: "550 €") ou nombre
+            key: Clé de l'annonce de référence
+            k: Nombre d'annonces retournées
+            metric: "cosinus" ou "euclidienne"
+            valid_only: Ne proposer que des annonces valides
 
         Returns:
-            bool: True si le prix est valide
+            list: [(clé, similarité cosinus ou distance)], du plus proche au plus éloigné
+
+        Raises:
+            KeyError: Annonce inconnue
+            RuntimeError: NumPy indisponible
         """
-        if not prix_str or prix_str == "N/A":
-            return False
+        if self.similarityIndex is None:
+            from similarity import SimilarityIndex
+            self.similarityIndex = SimilarityIndex(self.search)
+        index = self.similarityIndex
+        mask = index.mask_for(self.validSearch) if valid_only else None
+        return index.similar(key, k, metric, mask)
+
+    def computeDistances(self):
+        """
+        Calcule la distance aux points de référence des annonces dans le rayon
+
+        Returns:
+            dict: {clé: distance_km} ou None si aucun critère géographique
+        """
+        points = self.criteria.get("points_reference")
+        distance_max = self.criteria.get("distance_max_km")
+        if not points or distance_max is None:
+            return None
+
+        return self.getGeoIndex().within_radius_of_any(points, distance_max)
+
+    def findNearest(self, lat, lon, k=10):
+        """
+        Retourne les k annonces les plus proches d'un point
+
+        Returns:
+            list: Tuples (clé, distance_km) triés par distance
+        """
+        return self.getGeoIndex().nearest(lat, lon, k)
+
+    def findWithinRadius(self, points, radius_km):
+        """
+        Retourne les annonces à moins de radius_km d'au moins un point
+
+        Args:
+            points: Liste de tuples (latitude, longitude)
+            radius_km: Rayon en km
+
+        Returns:
+            dict: {clé: distance_km}
+        """
+        return self.getGeoIndex().within_radius_of_any(points, radius_km)
+
+    def getScoringModel(self, weights=None):
+        """
+        Construit le modèle de score (distance mesurée aux points de référence)
+        """
+        from scoring import ScoringModel
+        return ScoringModel(weights=weights,
+                            reference_points=self.criteria.get("points_reference"))
+
+    def getScoreMatrix(self):
+        """
+        Retourne les caractéristiques des annonces valides en colonnes
+        (construites à la demande, réutilisées par chaque classement)
+        """
+        if self.scoreMatrix is None:
+            from scoring import FeatureMatrix
+            self.scoreMatrix = FeatureMatrix(self.validSearch,
+                                             self.criteria.get("points_reference"))
+        return self.scoreMatrix
 
+    def rankValid(self, k=20, weights=None):
+        """
+        Classe les annonces valides par score pondéré
+
+        Args:
+            k: Nombre d'annonces à retourner (None pour toutes)
+            weights: Poids surchargeant scoring.DEFAULT_WEIGHTS
+
+        Returns:
+            list: Tuples (clé, score) par score décroissant
+        """
+        return self.getScoringModel(weights).top_k(self.validSearch, k,
+                                                   matrix=self.getScoreMatrix())
+
+    def explainScore(self, key, weights=None):
+        """
+        Détaille le score d'une annonce critère par critère
+        """
+        return self.getScoringModel(weights).explain(self.search[key])
+
+    def matchProfiles(self, profiles=None):
+        """
+        Évalue plusieurs recherches enregistrées en un seul passage
+
+        Args:
+            profiles: Liste de SearchProfile (par défaut ceux de profils.json)
+
+        Returns:
+            ProfileResults: Annonces valides / rejetées de chaque profil
+        """
+        from profiles import ProfileMatcher, load_profiles
+        if profiles is None:
+            profiles = load_profiles()
+        return ProfileMatcher(profiles).match(self.search)
+
+    def selectAmenities(self, expression):
+        """
+        Annonces chargées vérifiant une requête sur les équipements et les
+        classes énergétiques, résolue par l'index bitmap
+
+        Args:
+            expression: Requête (ex: "balcon ET parking ET dpe<=C ET NON meuble")
+
+        Returns:
+            list: Clés des annonces retenues
+        """
+        from bitmap_index import BitmapIndex
+        if self.bitmapIndex is None:
+            self.bitmapIndex = BitmapIndex(self.search)
+        return self.bitmapIndex.select(expression)
+
+    def buildCube(self, status=None):
+        """
+        Cube d'agrégats (quartier, code postal, pièces, meublé, DPE) des
+        annonces chargées
+
+        Args:
+            status: Ne retenir que les annonces de ce statut (None pour toutes)
+
+        Returns:
+            StatsCube: Interrogeable par query(), drill_down() et compare()
+        """
+        from stats_cube import StatsCube
+        cube = StatsCube()
+        cube.add_all(self.search, status=status)
+        return cube
+
+    def updateCube(self, cube_path=None):
+        """
+        Met le cube enregistré à l'état des annonces chargées (crawl
+        complet) : annonces nouvelles ou modifiées (re)comptées, annonces
+        absentes retirées
+
+        Args:
+            cube_path: Fichier du cube (par défaut stats_cube.DEFAULT_CUBE_PATH)
+
+        Returns:
+            tuple: (annonces ajoutées ou mises à jour, annonces retirées)
+        """
+        from stats_cube import DEFAULT_CUBE_PATH, update_cube
+        return update_cube(self.search, cube_path or DEFAULT_CUBE_PATH)
+
+    def indexText(self, index_path=None, source=None):
+        """
+        Ajoute les annonces chargées à l'index plein texte persistant
+
+        Args:
+            index_path: Base SQLite (par défaut text_index.DEFAULT_INDEX_PATH)
+            source: Nom de la source enregistré avec les annonces
+
+        Returns:
+            int: Nombre d'annonces ajoutées ou mises à jour
+        """
+        from text_index import DEFAULT_INDEX_PATH, TextIndex
+        with TextIndex(index_path or DEFAULT_INDEX_PATH) as index:
+            return index.add_listings(self.search, source=source)
+
+    def getDocumentKeys(self):
+        """
+        Retourne la correspondance identifiant d'index plein texte -> clé des
+        annonces chargées (construite à la demande, réutilisée par chaque
+        recherche)
+        """
+        if self.documentKeys is None:
+            self.documentKeys = {listing_document_id(key, item): key
+                                 for key, item in self.search.items()}
+        return self.documentKeys
+
+    def searchText(self, query, limit=20, index_path=None):
+        """
+        Recherche plein texte parmi les annonces chargées
+
+        Lecture seule : l'index est alimenté à l'ingestion (fin de crawl) ou
+        par indexText pour des fichiers chargés explicitement.
+
+        Args:
+            query: Requête FTS5 (ex: '"chauffage individuel" calme')
+            limit: Nombre maximal de résultats
+            index_path: Base SQLite (par défaut text_index.DEFAULT_INDEX_PATH)
+
+        Returns:
+            list: Tuples (clé, score BM25) triés par pertinence (vide si
+                  l'index n'existe pas encore)
+
+        Raises:
+            ValueError: Requête FTS5 invalide
+        """
+        from text_index import DEFAULT_INDEX_PATH, TextIndex
+        keys_by_doc = self.getDocumentKeys()
         try:
-            # Si c'est déjà un nombre
-            if isinstance(prix_str, (int, float)):
-                prix = float(prix_str)
-            else:
-                # Extraire le nombre du prix
-                import re
-                prix_match = re.search(
-                    r'(\d+(?:\.\d+)?)', str(prix_str).replace(" ", "").replace(",", "."))
-                if prix_match:
-                    prix = float(prix_match.group(1))
-                else:
-                    return False
-
-            # Fourchette de prix acceptable (peut être configurée)
-            return 200 <= prix <= 1000  # Élargir la fourchette
+            index = TextIndex(index_path or DEFAULT_INDEX_PATH, read_only=True)
+        except FileNotFoundError:
+            return []
+        with index:
+            results = index.search(query, limit=limit, doc_ids=keys_by_doc)
+        return [(keys_by_doc[r['doc_id']], r['score']) for r in results]
 
-        except Exception as e:
-            print(f"Erreur validation prix '{prix_str}': {e}")
+    def validatePrice(self, prix):
+        """
+        Valide si le prix est dans une fourchette acceptable
+
+        Args:
+            prix: Prix numérique (une chaîne comme "550 €" est aussi acceptée)
+
+        Returns:
+            bool: True si le prix est valide
+        """
+        if isinstance(prix, str):
+            prix = parse_number(prix)
+        if not prix:
             return False
 
+        # Fourchette de prix acceptable (configurable via criteria)
+        return self.criteria["prix_min"] <= prix <= self.criteria["prix_max"]
+
     def validateSurface(self, specificites):
         """
         Valide si la surface est acceptable
 
         Args:
-            specificites: Liste des spécificités de l'annonce ou données directes
+            specificites: Liste des spécificités de l'annonce
 
         Returns:
             bool: True si la surface est valide
         """
-        import re
-
-        # Si specificites est une liste
-        if isinstance(specificites, list):
-            for spec in specificites:
-                if "m²" in str(spec):
-                    surface_match = re.search(
-                        r'(\d+(?:\.\d+)?)\s*m²', str(spec))
-                    if surface_match:
-                        surface = float(surface_match.group(1))
-                        return surface >= 25  # Surface minimale acceptable
-
-        # Si on a accès aux données directement dans l'item parent
-        # (cette fonction sera appelée depuis sortSearch avec plus de contexte)
+        surface = parse_specificites(specificites).get('surface_m2')
+        if surface:
+            return surface >= self.criteria["surface_min"]
         return True  # Par défaut, accepter si pas d'info de surface
 
     def validateSurfaceFromItem(self, item):
@@ -323,32 +759,14 @@ class SortScrapSearch:
         Valide la surface depuis un item complet
 
         Args:
-            item: Item complet avec toutes les données
+            item: Annonce normalisée (surface_m2 numérique)
 
         Returns:
             bool: True si la surface est valide
         """
-        # Vérifier d'abord surface_m2 si disponible
         surface_m2 = item.get('surface_m2')
-        if surface_m2 and isinstance(surface_m2, (int, float)):
-            return surface_m2 >= 25
-
-        # Sinon chercher dans les spécificités
-        specificites = item.get('specificite', [])
-        if isinstance(specificites, list):
-            import re
-            for spec in specificites:
-                if "m²" in str(spec):
-                    surface_match = re.search(
-                        r'(\d+(?:\.\d+)?)\s*m²', str(spec))
-                    if surface_match:
-                        surface = float(surface_match.group(1))
-                        return surface >= 25
-
-        # Si aucune surface trouvée, vérifier dans les données brutes (format API)
-        area = item.get('area')
-        if area and isinstance(area, (int, float)):
-            return area >= 25
+        if surface_m2:
+            return surface_m2 >= self.criteria["surface_min"]
 
         # Par défaut, accepter si pas d'information de surface
         return True
@@ -356,49 +774,27 @@ class SortScrapSearch:
     def calculateStats(self):
         """
         Calcule les statistiques sur les données
+
+        Un seul passage alimente l'accumulateur (self.statsEngine), fusionnable
+        avec ceux d'autres fichiers ou crawls : quantiles, histogrammes et
+        motifs de rejet en plus des effectifs et moyennes.
         """
-        total = len(self.search)
-        valid = len(self.validSearch)
-        rejected = len(self.rejectedSearch)
-
-        self.stats = {
-            "total_annonces": total,
-            "annonces_valides": valid,
-            "annonces_rejetees": rejected,
-            "taux_validation": round(valid / total * 100, 2) if total > 0 else 0,
-            "prix_moyen_valides": self.calculateAveragePrice(self.validSearch),
-            "surface_moyenne_valides": self.calculateAverageSurface(self.validSearch)
-        }
+        self.statsEngine = StatsAccumulator().add_all(self.search)
+        self.stats = self.statsEngine.summary()
 
     def calculateAveragePrice(self, data):
         """
         Calcule le prix moyen des annonces valides
         """
-        import re
-        prices = []
-        for item in data.values():
-            prix_str = item.get("prix", "")
-            prix_match = re.search(r'(\d+)', prix_str.replace(" ", ""))
-            if prix_match:
-                prices.append(int(prix_match.group(1)))
-
+        prices = [item.get("prix") for item in data.values() if item.get("prix")]
         return round(sum(prices) / len(prices), 2) if prices else 0
 
     def calculateAverageSurface(self, data):
         """
         Calcule la surface moyenne des annonces valides
         """
-        import re
-        surfaces = []
-        for item in data.values():
-            specificites = item.get("specificite", [])
-            for spec in specificites:
-                if "m²" in spec:
-                    surface_match = re.search(r'(\d+)\s*m²', spec)
-                    if surface_match:
-                        surfaces.append(int(surface_match.group(1)))
-                        break
-
+        surfaces = [item.get("surface_m2") for item in data.values()
+                    if item.get("surface_m2")]
         return round(sum(surfaces) / len(surfaces), 2) if surfaces else 0
 
     def printStats(self):
@@ -415,30 +811,62 @@ class SortScrapSearch:
         print(f"Prix moyen (valides): {self.stats['prix_moyen_valides']} €")
         print(
             f"Surface moyenne (valides): {self.stats['surface_moyenne_valides']} m²")
+        for name, label, unit in (("prix", "Prix médian", "€"),
+                                  ("surface", "Surface médiane", "m²"),
+                                  ("prix_m2", "Prix médian au m²", "€")):
+            quantiles = self.stats[name]
+            if quantiles["mediane"] is not None:
+                print(f"{label}: {quantiles['mediane']} {unit} "
+                      f"(p10: {quantiles['p10']}, p90: {quantiles['p90']})")
+        motifs = {label: count for label, count in self.stats["motifs_rejet"].items()
+                  if count}
+        if motifs:
+            print("Motifs de rejet: " + ", ".join(
+                f"{label} ({count})" for label, count in motifs.items()))
         print("="*50 + "\n")
 
-    def exportResults(self, filename="resultats_tries.json"):
+    def exportResults(self, filename="resultats_tries.json", fmt=None, compression=None,
+                      register=False):
         """
         Exporte les résultats triés
 
+        Les annonces sont écrites en flux (mémoire constante). Le format et la
+        compression sont déduits de l'extension : .json, .jsonl, .csv, .msac,
+        suivie éventuellement de .gz ou .zst.
+
         Args:
             filename: Nom du fichier de sortie
+            fmt: Format forcé ("json", "jsonl", "csv", "columnar")
+            compression: Compression forcée ("gzip", "zstd")
+            register: Inscrire l'export au catalogue des données (data_catalog)
         """
-        results = {
-            "statistiques": self.stats,
-            "annonces_valides": self.validSearch,
-            "annonces_rejetees": self.rejectedSearch,
-            "metadata": {
-                "date_traitement": __import__('datetime').datetime.now().isoformat(),
-                "nombre_total": len(self.search)
-            }
-        }
-
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
+        export_sorted(filename, self.validSearch, self.rejectedSearch,
+                      stats=self.stats, fmt=fmt, compression=compression,
+                      register=register)
 
         print(f"Résultats exportés dans: {filename}")
 
+    def saveSnapshot(self, filename="annonces.msnap", source=None):
+        """
+        Enregistre les annonces normalisées et triées dans un instantané
+        binaire, rechargeable sans décodage JSON par tous les consommateurs
+
+        Args:
+            filename: Fichier .msnap
+            source: Fichier d'origine, noté dans l'en-tête
+
+        Returns:
+            int: Nombre d'annonces écrites
+        """
+        from data_catalog import register_file
+        from snapshot_format import write_snapshot
+        count = write_snapshot(self.search, filename,
+                               metadata={"source": source,
+                                         "normalisation": NORMALIZER_VERSION})
+        register_file(filename)
+        print(f"Instantané enregistré dans: {filename}")
+        return count
+
     def getValidAnnouncements(self):
         """
         Retourne les annonces valides
@@ -473,7 +901,7 @@ if __name__ == "__main__":
                 "Nom du fichier (défaut: resultats_tries.json): ").strip()
             if not filename:
                 filename = "resultats_tries.json"
-            sorter.exportResults(filename)
+            sorter.exportResults(filename, register=True)
 
         print("Test terminé avec succès.")
 
@@ -481,7 +909,3 @@ if __name__ == "__main__":
         print(f"Erreur lors du test: {e}")
         import traceback
         traceback.print_exc()
-
-
-if __name__ == "__main__":
-    SortScrapSearch()
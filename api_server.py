@@ -0,0 +1,654 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+API HTTP locale (asyncio) sur les annonces triées
+Le jeu de données est chargé, normalisé et trié une seule fois puis gardé en
+mémoire ; plusieurs outils (tableaux de bord, scripts, interface web) peuvent
+l'interroger sans repayer ce coût.
+
+    python api_server.py res.json files/seLoger1.json --port 8765
+
+Points d'accès :
+    GET  /health                  État du service
+    GET  /stats                   Statistiques de tri
+    GET  /stats/cube              Agrégats par quartier, code postal, pièces,
+                                  meublé et DPE (détail par dimension)
+    GET  /listings                Annonces (filtres, tri, pagination)
+    GET  /listings/{id}           Une annonce (clé ou identifiant SeLoger)
+    GET  /listings/{id}/similar   Annonces les plus proches (k, metrique, statut)
+    POST /reload                  Recharge les sources
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from listing import Status, listing_document_id
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+CACHE_SIZE = 256
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024      # Aucun point d'accès n'attend de corps
+KEEP_ALIVE_TIMEOUT = 15
+
+STATUS_FILTERS = {
+    "valide": (Status.VALIDE,),
+    "rejetee": (Status.REJETEE,),
+    "tous": (Status.VALIDE, Status.REJETEE, Status.A_TRIER),
+}
+
+# Clés de tri : fonction (annonce, score) -> valeur ; None est toujours en dernier
+SORT_KEYS = {
+    "score": lambda item, score: score,
+    "prix": lambda item, score: item.prix,
+    "surface": lambda item, score: item.surface_m2,
+    "prix_m2": lambda item, score: item.prix / item.surface_m2
+    if item.prix and item.surface_m2 else None,
+    "pieces": lambda item, score: item.nombre_pieces,
+    "distance": lambda item, score: item.distance_km,
+    "date": lambda item, score: item.date_scraping,
+}
+
+# Tri par défaut de chaque clé (les meilleurs scores d'abord)
+DESCENDING_BY_DEFAULT = frozenset(("score", "date"))
+
+REASONS = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    501: "Not Implemented",
+}
+
+
+class HttpError(Exception):
+    """Erreur renvoyée au client avec son code HTTP"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def parse_float(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        raise HttpError(400, f"Paramètre '{name}' invalide: {value}")
+    if math.isnan(number):
+        raise HttpError(400, f"Paramètre '{name}' invalide: {value}")
+    return number
+
+
+def parse_int(params, name, default, low, high):
+    value = params.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise HttpError(400, f"Paramètre '{name}' invalide: {value}")
+    return min(max(number, low), high)
+
+
+class ListingStore:
+    """Jeu de données trié résident en mémoire"""
+
+    def __init__(self, sources=None, criteria=None):
+        """
+        Args:
+            sources: Liste de fichiers (rapprochés s'il y en a plusieurs),
+                     None pour les fichiers par défaut
+            criteria: Critères de tri surchargeant DEFAULT_CRITERIA
+        """
+        self.sources = sources
+        self.criteria = criteria
+        self.load()
+
+    def load(self):
+        """(Re)charge et trie les sources"""
+        from SortScrapSearch import SortScrapSearch
+
+        start = time.perf_counter()
+        sources = self.sources
+        if sources and len(sources) == 1:
+            sources = sources[0]
+        sorter = SortScrapSearch(sources or None, criteria=self.criteria)
+
+        self.sorter = sorter
+        self.scores = dict(sorter.rankValid(k=None))
+        self.by_id = {}
+        for key, item in sorter.search.items():
+            self.by_id[str(key)] = key
+            self.by_id.setdefault(listing_document_id(key, item), key)
+        # Ordres de tri, cube et bitmaps calculés à la demande, une fois par chargement
+        self.orders = {}
+        self.cube = None
+        self.bitmaps = None
+        self.loaded_at = datetime.now().isoformat(timespec="seconds")
+        self.load_seconds = round(time.perf_counter() - start, 3)
+        self.version = hashlib.blake2b(
+            f"{self.loaded_at}:{len(sorter.search)}:{id(sorter)}".encode(),
+            digest_size=6).hexdigest()
+
+    def reloaded(self):
+        """
+        Nouveau jeu de données chargé depuis les mêmes sources (l'actuel reste
+        utilisable pendant le chargement)
+
+        Returns:
+            ListingStore
+        """
+        return ListingStore(self.sources, criteria=self.criteria)
+
+    def order(self, sort_key):
+        """
+        Clés des annonces triées (ordre croissant, valeurs absentes à la fin)
+        """
+        if sort_key not in self.orders:
+            key_function = SORT_KEYS[sort_key]
+            present, missing = [], []
+            for key, item in self.sorter.search.items():
+                value = key_function(item, self.scores.get(key))
+                if value is None:
+                    missing.append(key)
+                else:
+                    present.append((value, key))
+            present.sort(key=lambda pair: pair[0])
+            self.orders[sort_key] = ([key for _, key in present], missing)
+        return self.orders[sort_key]
+
+    def matches(self, item, filters):
+        """Vérifie qu'une annonce respecte les filtres de la requête"""
+        if item.status not in filters["statuts"]:
+            return False
+        prix, surface = item.prix, item.surface_m2
+        for value, low, high in ((prix, "prix_min", "prix_max"),
+                                 (surface, "surface_min", "surface_max")):
+            if filters[low] is not None and (value is None or value < filters[low]):
+                return False
+            if filters[high] is not None and (value is None or value > filters[high]):
+                return False
+        if filters["pieces_min"] is not None and \
+                (item.nombre_pieces or 0) < filters["pieces_min"]:
+            return False
+        if filters["district"] and (item.district or "").lower() != filters["district"]:
+            return False
+        if filters["q"]:
+            text = f"{item.titre or ''} {item.description or ''}".lower()
+            if filters["q"] not in text:
+                return False
+        return True
+
+    def amenity_keys(self, expression):
+        """
+        Clés des annonces vérifiant une requête sur les équipements
+
+        Raises:
+            HttpError: 400 si la requête est invalide
+        """
+        from bitmap_index import BitmapIndex
+        if self.bitmaps is None:
+            self.bitmaps = BitmapIndex(self.sorter.search)
+        try:
+            return set(self.bitmaps.select(expression))
+        except ValueError as e:
+            raise HttpError(400, str(e))
+
+    def query(self, params):
+        """
+        Filtre, trie et pagine les annonces
+
+        Args:
+            params: Paramètres de la requête (statut, prix_min, prix_max,
+                    surface_min, surface_max, pieces_min, district, q,
+                    equipements, tri, page, par_page)
+
+        Returns:
+            dict: Page de résultats
+        """
+        statut = params.get("statut", "valide")
+        if statut not in STATUS_FILTERS:
+            raise HttpError(400, f"Statut inconnu: {statut}")
+        filters = {
+            "statuts": STATUS_FILTERS[statut],
+            "prix_min": parse_float(params, "prix_min"),
+            "prix_max": parse_float(params, "prix_max"),
+            "surface_min": parse_float(params, "surface_min"),
+            "surface_max": parse_float(params, "surface_max"),
+            "pieces_min": parse_float(params, "pieces_min"),
+            "district": (params.get("district") or "").lower(),
+            "q": (params.get("q") or "").lower(),
+        }
+
+        tri = params.get("tri", "score")
+        descending = tri.startswith("-")
+        sort_key = tri.lstrip("-+")
+        if sort_key not in SORT_KEYS:
+            raise HttpError(400, f"Tri inconnu: {tri} (valeurs: {', '.join(SORT_KEYS)})")
+        if sort_key in DESCENDING_BY_DEFAULT and not tri.startswith(("-", "+")):
+            descending = True
+
+        page = parse_int(params, "page", 1, 1, 10 ** 9)
+        per_page = parse_int(params, "par_page", DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+
+        present, missing = self.order(sort_key)
+        ordered = (present[::-1] if descending else present) + missing
+        search = self.sorter.search
+        if params.get("equipements"):
+            # Résolu par bitmaps avant les filtres annonce par annonce
+            allowed = self.amenity_keys(params["equipements"])
+            ordered = [key for key in ordered if key in allowed]
+        selected = [key for key in ordered if self.matches(search[key], filters)]
+
+        start = (page - 1) * per_page
+        return {
+            "total": len(selected),
+            "page": page,
+            "par_page": per_page,
+            "pages": math.ceil(len(selected) / per_page),
+            "tri": tri,
+            "annonces": [self.serialize(key) for key in selected[start:start + per_page]],
+        }
+
+    def serialize(self, key):
+        item = self.sorter.search[key]
+        data = item.to_dict()
+        data["cle"] = key
+        data["statut"] = Status(item.status).name.lower()
+        data["score"] = self.scores.get(key)
+        return data
+
+    def get(self, listing_id):
+        """
+        Annonce par clé ou identifiant SeLoger
+
+        Raises:
+            HttpError: 404 si l'annonce est inconnue
+        """
+        key = self.by_id.get(listing_id)
+        if key is None:
+            raise HttpError(404, f"Annonce inconnue: {listing_id}")
+        data = self.serialize(key)
+        if key in self.scores:
+            data["detail_score"] = self.sorter.explainScore(key)
+        return data
+
+    def similar(self, listing_id, params):
+        """
+        Annonces les plus proches d'une annonce
+
+        Args:
+            listing_id: Clé ou identifiant SeLoger
+            params: k (nombre, défaut 10), metrique (cosinus ou euclidienne),
+                    statut (valide ou tous)
+
+        Raises:
+            HttpError: 404 si l'annonce est inconnue, 400 si un paramètre est
+                       invalide, 501 sans NumPy
+        """
+        from similarity import METRICS
+        key = self.by_id.get(listing_id)
+        if key is None:
+            raise HttpError(404, f"Annonce inconnue: {listing_id}")
+        k = parse_int(params, "k", 10, 1, MAX_PAGE_SIZE)
+        metric = params.get("metrique", "cosinus")
+        if metric not in METRICS:
+            raise HttpError(400, f"Métrique inconnue: {metric}")
+        statut = params.get("statut", "valide")
+        if statut not in ("valide", "tous"):
+            raise HttpError(400, f"Statut invalide: {statut}")
+        try:
+            neighbours = self.sorter.findSimilar(key, k, metric,
+                                                 valid_only=statut == "valide")
+        except RuntimeError as e:
+            raise HttpError(501, str(e))
+        field = "similarite" if metric == "cosinus" else "distance"
+        annonces = []
+        for neighbour, value in neighbours:
+            data = self.serialize(neighbour)
+            data[field] = value
+            annonces.append(data)
+        return {"reference": key, "metrique": metric, "annonces": annonces}
+
+    def stats(self):
+        """Statistiques de tri (quantiles, histogrammes, motifs de rejet)"""
+        stats = dict(self.sorter.stats)
+        stats["criteres"] = self.sorter.criteria
+        return stats
+
+    def cube_stats(self, params):
+        """
+        Agrégats précalculés du cube
+
+        Args:
+            params: Modalités fixées (quartier, code_postal, pieces, meuble,
+                    dpe) et éventuellement detail=<dimension> pour le détail
+
+        Returns:
+            dict: {filtres, agregats} ou {filtres, detail, agregats: {modalité: ...}}
+        """
+        from stats_cube import DIMENSIONS
+        if self.cube is None:
+            self.cube = self.sorter.buildCube()
+        filters = {name: value for name, value in params.items() if name in DIMENSIONS}
+        unknown = set(params) - set(DIMENSIONS) - {"detail"}
+        if unknown:
+            raise HttpError(400, f"Paramètres inconnus: {', '.join(sorted(unknown))}")
+        detail = params.get("detail")
+        if detail is None:
+            return {"filtres": filters, "agregats": self.cube.query(**filters)}
+        if detail not in DIMENSIONS or detail in filters:
+            raise HttpError(400, f"Dimension de détail invalide: {detail}")
+        return {"filtres": filters, "detail": detail,
+                "agregats": self.cube.drill_down(detail, **filters)}
+
+    def health(self):
+        return {
+            "statut": "ok",
+            "annonces": len(self.sorter.search),
+            "version": self.version,
+            "charge_le": self.loaded_at,
+            "duree_chargement_s": self.load_seconds,
+        }
+
+
+class ResponseCache:
+    """Cache LRU des réponses (corps encodé et ETag)"""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def encode_json(payload):
+    """
+    Encode une réponse JSON et calcule son ETag
+
+    Returns:
+        tuple: (corps, etag)
+    """
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"),
+                      default=str).encode("utf-8")
+    etag = '"' + hashlib.blake2b(body, digest_size=10).hexdigest() + '"'
+    return body, etag
+
+
+class ApiServer:
+    """Serveur HTTP/1.1 minimal (GET, HEAD, POST /reload) sur asyncio"""
+
+    def __init__(self, store, cache_size=CACHE_SIZE):
+        self.store = store
+        self.cache = ResponseCache(cache_size)
+        # Créé dans la boucle d'événements (serve)
+        self.reload_lock = None
+
+    async def reload(self):
+        """
+        Recharge les sources dans un thread : la boucle continue de servir
+        les autres clients avec le jeu de données courant, remplacé d'un bloc
+        une fois le nouveau prêt
+
+        Returns:
+            dict: État du nouveau jeu de données
+        """
+        if self.reload_lock is None:
+            self.reload_lock = asyncio.Lock()
+        async with self.reload_lock:
+            loop = asyncio.get_running_loop()
+            self.store = await loop.run_in_executor(None, self.store.reloaded)
+            self.cache.clear()
+        return self.store.health()
+
+    def route(self, method, path, params):
+        """
+        Calcule la réponse JSON d'une requête
+
+        Returns:
+            dict: Contenu de la réponse
+
+        Raises:
+            HttpError: Chemin ou méthode invalide
+        """
+        parts = [unquote(part) for part in path.strip("/").split("/") if part]
+        if parts == ["reload"]:
+            # POST /reload est traité par reload(), hors de la boucle
+            raise HttpError(405, "Utiliser POST /reload")
+
+        if method not in ("GET", "HEAD"):
+            raise HttpError(405, f"Méthode non autorisée: {method}")
+        if parts == ["health"]:
+            payload = self.store.health()
+            payload["cache"] = {"entrees": len(self.cache.entries),
+                                "hits": self.cache.hits,
+                                "misses": self.cache.misses}
+            return payload
+        if parts == ["stats"]:
+            return self.store.stats()
+        if parts == ["stats", "cube"]:
+            return self.store.cube_stats(params)
+        if parts == ["listings"]:
+            return self.store.query(params)
+        if len(parts) == 2 and parts[0] == "listings":
+            return self.store.get(parts[1])
+        if len(parts) == 3 and parts[0] == "listings" and parts[2] == "similar":
+            return self.store.similar(parts[1], params)
+        raise HttpError(404, f"Chemin inconnu: {path}")
+
+    async def respond(self, method, target, headers):
+        """
+        Produit la réponse HTTP d'une requête (avec cache et ETag)
+
+        Returns:
+            tuple: (code, en-têtes, corps)
+        """
+        url = urlsplit(target)
+        if method == "POST" and url.path.strip("/") == "reload":
+            body, etag = encode_json(await self.reload())
+            return 200, {"Content-Type": "application/json; charset=utf-8",
+                         "ETag": etag, "Cache-Control": "no-cache"}, body
+
+        params = {name: values[-1] for name, values in
+                  parse_qs(url.query, keep_blank_values=False).items()}
+        cacheable = method in ("GET", "HEAD") and url.path.rstrip("/") != "/health"
+        cache_key = (self.store.version, url.path.rstrip("/"),
+                     tuple(sorted(params.items())))
+
+        entry = self.cache.get(cache_key) if cacheable else None
+        if entry is None:
+            try:
+                payload = self.route(method, url.path, params)
+                status = 200
+            except HttpError as e:
+                payload, status = {"erreur": e.message}, e.status
+            body, etag = encode_json(payload)
+            entry = (status, body, etag)
+            if cacheable and status == 200:
+                self.cache.put(cache_key, entry)
+
+        status, body, etag = entry
+        response_headers = {
+            "Content-Type": "application/json; charset=utf-8",
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+        }
+        if status == 200 and etag in headers.get("if-none-match", "").split(", "):
+            return 304, {"ETag": etag}, b""
+        return status, response_headers, body
+
+    async def read_request(self, reader):
+        """
+        Lit une requête HTTP
+
+        Returns:
+            tuple: (méthode, cible, en-têtes) ou None si la connexion est fermée
+
+        Raises:
+            HttpError: Requête mal formée (400) ou trop volumineuse (413)
+        """
+        try:
+            raw = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"),
+                                         KEEP_ALIVE_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError,
+                ConnectionError):
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(413, "En-têtes trop volumineux")
+
+        lines = raw.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Ligne de requête invalide")
+        headers = {"_version": version}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        value = headers.get("content-length") or "0"
+        try:
+            length = int(value)
+        except ValueError:
+            raise HttpError(400, f"Content-Length invalide: {value}")
+        if length < 0:
+            raise HttpError(400, f"Content-Length invalide: {value}")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "Corps de requête trop volumineux")
+        if length:
+            # Corps ignoré (aucun point d'accès n'en attend)
+            try:
+                await asyncio.wait_for(reader.readexactly(length), KEEP_ALIVE_TIMEOUT)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError,
+                    ConnectionError):
+                return None
+        return method.upper(), target, headers
+
+    async def handle_client(self, reader, writer):
+        """Traite les requêtes d'une connexion (keep-alive HTTP/1.1)"""
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except HttpError as e:
+                    body, _ = encode_json({"erreur": e.message})
+                    self.write_response(writer, e.status, {
+                        "Content-Type": "application/json; charset=utf-8"},
+                        body, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+
+                method, target, headers = request
+                try:
+                    status, response_headers, body = await self.respond(
+                        method, target, headers)
+                except Exception as e:
+                    status, response_headers = 500, {
+                        "Content-Type": "application/json; charset=utf-8"}
+                    body, _ = encode_json({"erreur": f"{type(e).__name__}: {e}"})
+
+                keep_alive = headers.get("connection", "").lower() != "close" and \
+                    headers["_version"] == "HTTP/1.1"
+                self.write_response(writer, status, response_headers,
+                                    b"" if method == "HEAD" else body,
+                                    keep_alive, content_length=len(body))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    def write_response(self, writer, status, headers, body, keep_alive=True,
+                       content_length=None):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        headers = dict(headers)
+        headers["Content-Length"] = str(len(body) if content_length is None
+                                        else content_length)
+        headers["Connection"] = "keep-alive" if keep_alive else "close"
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Démarre le serveur et le fait tourner jusqu'à interruption"""
+        server = await asyncio.start_server(self.handle_client, host, port,
+                                            limit=MAX_HEADER_BYTES)
+        address = server.sockets[0].getsockname()
+        print(f"API disponible sur http://{address[0]}:{address[1]} "
+              f"({len(self.store.sorter.search)} annonces)")
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="API HTTP locale sur les annonces triées")
+    parser.add_argument("sources", nargs="*",
+                        help="Fichiers de données (défaut: res.json ou files/seLoger1.json)")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help=f"Adresse d'écoute (défaut: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help=f"Port d'écoute (défaut: {DEFAULT_PORT})")
+    parser.add_argument("--prix-min", type=float, help="Prix minimum (€)")
+    parser.add_argument("--prix-max", type=float, help="Prix maximum (€)")
+    parser.add_argument("--surface-min", type=float, help="Surface minimum (m²)")
+    args = parser.parse_args(argv)
+
+    criteria = {name: getattr(args, name)
+                for name in ("prix_min", "prix_max", "surface_min")
+                if getattr(args, name) is not None}
+    store = ListingStore(args.sources, criteria=criteria)
+    try:
+        asyncio.run(ApiServer(store).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nArrêt de l'API")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Traitement non interactif de nombreux fichiers de crawl
+Chaque fichier est trié dans un processus séparé (map), les statistiques
+partielles sont ensuite agrégées (reduce). Utilisable depuis cron :
+
+    python batch_cli.py "archives/2024-05-*.json" --prix-max 900 -o sorties/
+
+Codes de sortie : 0 succès, 1 au moins un fichier en échec,
+2 erreur d'usage ou aucun fichier trouvé.
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from export_writers import FORMATS
+from stats_engine import StatsAccumulator
+
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+
+OUTPUT_EXTENSIONS = {
+    "json": ".json",
+    "jsonl": ".jsonl",
+    "csv": ".csv",
+    "columnar": ".msac",
+}
+
+COMPRESSION_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+
+
+def expand_inputs(patterns):
+    """
+    Développe les motifs glob en une liste de fichiers sans doublons
+
+    Args:
+        patterns: Chemins ou motifs ("archives/*.json", "crawls/**/*.json")
+
+    Returns:
+        list: Chemins triés
+    """
+    files = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True)
+        if not matches and os.path.isfile(pattern):
+            matches = [pattern]
+        files.update(path for path in matches if os.path.isfile(path))
+    return sorted(files)
+
+
+def output_path(input_path, output_dir, fmt, compression=None, qualified=False):
+    """
+    Chemin du fichier de résultats d'un fichier d'entrée
+
+    Args:
+        qualified: Préfixer par le dossier d'origine (noms de fichiers en double)
+
+    Returns:
+        str: ex. sorties/crawl_2024-05-01_tries.jsonl.gz
+    """
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    if qualified:
+        parent = os.path.basename(os.path.dirname(os.path.abspath(input_path)))
+        stem = f"{parent}_{stem}"
+    filename = f"{stem}_tries{OUTPUT_EXTENSIONS[fmt]}"
+    if compression:
+        filename += COMPRESSION_EXTENSIONS[compression]
+    return os.path.join(output_dir, filename)
+
+
+def partial_stats(sorter):
+    """
+    Statistiques partielles d'un fichier, agrégeables entre fichiers
+
+    État sérialisable de l'accumulateur du trieur (effectifs, sketches de
+    quantiles, histogrammes), transmis du processus de travail au parent.
+    """
+    return sorter.statsEngine.to_dict()
+
+
+def merge_stats(partials, accumulator=None):
+    """
+    Agrège des statistiques partielles (étape reduce)
+
+    Args:
+        partials: Itérable d'états produits par partial_stats
+        accumulator: Accumulateur existant à compléter (cumul entre crawls)
+
+    Returns:
+        StatsAccumulator: Statistiques globales
+    """
+    accumulator = accumulator or StatsAccumulator()
+    for partial in partials:
+        accumulator.merge(StatsAccumulator.from_dict(partial))
+    return accumulator
+
+
+def process_file(path, criteria, output_dir=None, fmt="json", compression=None,
+                 qualified=False):
+    """
+    Trie un fichier de crawl (exécuté dans un processus de travail)
+
+    Args:
+        path: Fichier JSON d'annonces (scrapé ou API)
+        criteria: Critères de tri
+        output_dir: Dossier des résultats (None pour ne rien écrire)
+        fmt: Format d'export
+        compression: Compression de l'export
+        qualified: Préfixer le fichier de sortie par le dossier d'origine
+
+    Returns:
+        dict: {fichier, ok, erreur, sortie, stats, etat, duree}
+    """
+    # Import dans le processus de travail
+    from SortScrapSearch import SortScrapSearch
+
+    start = time.perf_counter()
+    result = {"fichier": path, "ok": False, "erreur": None,
+              "sortie": None, "stats": None, "etat": None}
+    try:
+        # Les messages du trieur resteraient entremêlés entre processus
+        with contextlib.redirect_stdout(io.StringIO()):
+            sorter = SortScrapSearch(path, criteria=criteria)
+            if output_dir:
+                result["sortie"] = output_path(path, output_dir, fmt, compression,
+                                               qualified)
+                sorter.exportResults(result["sortie"], fmt=fmt,
+                                     compression=compression)
+        result["etat"] = partial_stats(sorter)
+        result["stats"] = {name: sorter.stats[name] for name in
+                           ("total_annonces", "annonces_valides", "annonces_rejetees")}
+        result["ok"] = True
+    except Exception as e:
+        result["erreur"] = f"{type(e).__name__}: {e}"
+    result["duree"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def parse_point(value):
+    """Convertit "lat,lon" en tuple (argparse)"""
+    try:
+        lat, lon = (float(part) for part in value.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"point invalide '{value}' (attendu: latitude,longitude)")
+    return lat, lon
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Tri non interactif de fichiers de crawl, en parallèle")
+    parser.add_argument("inputs", nargs="+",
+                        help="Fichiers ou motifs glob (ex: 'archives/*.json')")
+    parser.add_argument("--prix-min", type=float, help="Prix minimum (€)")
+    parser.add_argument("--prix-max", type=float, help="Prix maximum (€)")
+    parser.add_argument("--surface-min", type=float, help="Surface minimum (m²)")
+    parser.add_argument("--point", type=parse_point, action="append",
+                        dest="points_reference", metavar="LAT,LON",
+                        help="Point de référence (répétable)")
+    parser.add_argument("--distance-max", type=float, dest="distance_max_km",
+                        help="Distance maximale aux points de référence (km)")
+    parser.add_argument("-o", "--output-dir",
+                        help="Dossier des résultats triés (aucun export si absent)")
+    parser.add_argument("-f", "--format", choices=FORMATS, default="json",
+                        help="Format d'export (défaut: json)")
+    parser.add_argument("--compression", choices=sorted(COMPRESSION_EXTENSIONS),
+                        help="Compression des exports")
+    parser.add_argument("-j", "--workers", type=int, default=None,
+                        help="Nombre de processus (défaut: nombre de cœurs)")
+    parser.add_argument("--summary",
+                        help="Fichier JSON du bilan (statistiques globales et par fichier)")
+    parser.add_argument("--cumul", metavar="FICHIER",
+                        help="État des statistiques cumulées entre exécutions "
+                             "(lu puis mis à jour)")
+    parser.add_argument("-q", "--quiet", action="store_true",
+                        help="N'afficher que les erreurs")
+    return parser
+
+
+def criteria_from_args(args):
+    """Critères de tri fournis en ligne de commande"""
+    criteria = {}
+    for name in ("prix_min", "prix_max", "surface_min",
+                 "points_reference", "distance_max_km"):
+        value = getattr(args, name)
+        if value is not None:
+            criteria[name] = value
+    return criteria
+
+
+def run(args):
+    """
+    Traite les fichiers et agrège les statistiques
+
+    Returns:
+        int: Code de sortie
+    """
+    files = expand_inputs(args.inputs)
+    if not files:
+        print("Aucun fichier ne correspond aux motifs donnés", file=sys.stderr)
+        return EXIT_USAGE
+    if args.distance_max_km is not None and not args.points_reference:
+        print("--distance-max nécessite au moins un --point", file=sys.stderr)
+        return EXIT_USAGE
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    criteria = criteria_from_args(args)
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in files]
+    qualified = len(set(stems)) < len(stems)
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(files)))
+    start = time.perf_counter()
+    results = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(process_file, path, criteria, args.output_dir,
+                                   args.format, args.compression, qualified)
+                   for path in files]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if not result["ok"]:
+                print(f"ÉCHEC {result['fichier']}: {result['erreur']}",
+                      file=sys.stderr)
+            elif not args.quiet:
+                stats = result["stats"]
+                print(f"OK    {result['fichier']}: {stats['annonces_valides']}/"
+                      f"{stats['total_annonces']} valides ({result['duree']} s)")
+
+    results.sort(key=lambda result: result["fichier"])
+    failures = [result for result in results if not result["ok"]]
+    partials = [result.pop("etat") for result in results if result["ok"]]
+    stats = merge_stats(partials).summary()
+    if args.cumul:
+        cumulative = merge_stats(partials, StatsAccumulator.load(args.cumul))
+        cumulative.save(args.cumul)
+
+    if not args.quiet:
+        print(f"\n{len(files) - len(failures)}/{len(files)} fichier(s) traité(s) "
+              f"avec {workers} processus en {time.perf_counter() - start:.2f} s")
+        print(json.dumps(stats, indent=2, ensure_ascii=False))
+
+    if args.summary:
+        with open(args.summary, "w", encoding="utf-8") as f:
+            summary = {"statistiques": stats, "fichiers": results}
+            if args.cumul:
+                summary["statistiques_cumulees"] = cumulative.summary()
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+    return EXIT_FAILURES if failures else EXIT_OK
+
+
+def main(argv=None):
+    """Point d'entrée de la ligne de commande"""
+    # argparse quitte avec le code 2 en cas d'erreur d'usage
+    args = build_parser().parse_args(argv)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Mesure du coût de démarrage de chaque point d'entrée
+Chaque module est importé dans un interpréteur neuf avec `python -X importtime`
+(le code sous `if __name__ == "__main__"` n'est pas exécuté). On relève la
+durée cumulée de l'import et les dépendances les plus coûteuses.
+
+    python bench_startup.py
+    python bench_startup.py main quick_start --repeat 5 --json startup.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+ENTRY_POINTS = ("main", "quick_start", "SortScrapSearch", "batch_cli",
+                "gui", "scrapImmo")
+
+
+def parse_importtime(stderr):
+    """
+    Analyse la sortie de -X importtime
+
+    Returns:
+        list: Tuples (profondeur, module, durée propre µs, durée cumulée µs)
+        dans l'ordre de sortie (les sous-imports précèdent leur parent)
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def module_tree(entries, module):
+    """
+    Sous-arbre d'import d'un module (hors modules chargés au démarrage de
+    l'interpréteur, comme site)
+
+    Returns:
+        tuple: (durée cumulée µs, [(dépendance directe, durée cumulée µs)])
+    """
+    for i, (depth, name, _, cumulative) in enumerate(entries):
+        if depth == 0 and name == module:
+            break
+    else:
+        return 0, []
+
+    children = []
+    for depth, name, _, child_cumulative in reversed(entries[:i]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append((name, child_cumulative))
+    return cumulative, children
+
+
+def measure(module, python=sys.executable):
+    """
+    Importe un module dans un nouvel interpréteur
+
+    Returns:
+        dict: {module, ok, erreur, total_ms, dependances}
+    """
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)))
+    total, children = module_tree(parse_importtime(result.stderr), module)
+    error = None
+    if result.returncode != 0:
+        lines = [line for line in result.stderr.splitlines()
+                 if not line.startswith("import time:")]
+        error = lines[-1] if lines else f"code {result.returncode}"
+    return {
+        "module": module,
+        "ok": result.returncode == 0,
+        "erreur": error,
+        "total_ms": round(total / 1000, 1),
+        "dependances": children,
+    }
+
+
+def run_benchmark(modules, repeat=3, top=5):
+    """
+    Mesure chaque point d'entrée plusieurs fois et garde la meilleure mesure
+
+    Returns:
+        list: Résultats par module
+    """
+    results = []
+    for module in modules:
+        runs = [measure(module) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run["total_ms"])
+        children = sorted(best.pop("dependances"), key=lambda item: item[1],
+                          reverse=True)[:top]
+        best["lourds"] = [(name, round(us / 1000, 1)) for name, us in children]
+        results.append(best)
+    return results
+
+
+def print_report(results):
+    print("Point d'entrée".ljust(20) + "Import (ms)".rjust(12)
+          + "   Dépendances les plus lourdes")
+    print("-" * 78)
+    for result in results:
+        if not result["ok"]:
+            print(f"{result['module']:<20}{'échec':>12}   {result['erreur']}")
+            continue
+        heavy = ", ".join(f"{name} {ms}" for name, ms in result["lourds"])
+        print(f"{result['module']:<20}{result['total_ms']:>12}   {heavy}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Coût d'import des points d'entrée (python -X importtime)")
+    parser.add_argument("modules", nargs="*", default=list(ENTRY_POINTS),
+                        help="Modules à mesurer (défaut: tous les points d'entrée)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Nombre de mesures par module (la meilleure est gardée)")
+    parser.add_argument("--top", type=int, default=5,
+                        help="Nombre de dépendances lourdes affichées")
+    parser.add_argument("--json", dest="json_path",
+                        help="Fichier JSON où enregistrer les mesures")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.modules, repeat=max(1, args.repeat), top=args.top)
+    print_report(results)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0 if all(result["ok"] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Index bitmap des équipements et des classes énergétiques
+Chaque annonce reçoit une position ; chaque équipement (balcon, parking...)
+et chaque classe DPE / GES est un entier Python dont le bit i indique si
+l'annonce i est concernée. Une requête comme
+
+    balcon ET parking ET dpe<=C ET NON meuble
+
+se résout alors en quelques opérations bit à bit sur tout le catalogue, au
+lieu de parcourir les textes des spécificités.
+"""
+
+import re
+
+from listing import AMENITY_LABELS, Equipement
+from entity_resolution import normalize_text
+
+
+ENERGY_CLASSES = "ABCDEFG"
+ENERGY_FIELDS = ("dpe", "ges")
+
+# Noms utilisables dans les requêtes ("meuble", "balcon"...)
+AMENITY_NAMES = {normalize_text(label): flag for flag, label in AMENITY_LABELS.items()}
+
+KEYWORDS = {
+    "et": "ET", "and": "ET", "&": "ET",
+    "ou": "OU", "or": "OU", "|": "OU",
+    "non": "NON", "not": "NON", "!": "NON", "-": "NON",
+}
+
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<energie>(?:dpe|ges)\s*(?:<=|>=|≤|≥|<|>|=)\s*[a-g])
+      | (?P<parenthese>[()])
+      | (?P<symbole>[&|!-])
+      | (?P<mot>[\w]+)
+    )""", re.VERBOSE | re.IGNORECASE)
+
+ENERGY_PATTERN = re.compile(r"(dpe|ges)\s*(<=|>=|≤|≥|<|>|=)\s*([a-g])", re.IGNORECASE)
+
+# Bits à 1 de chaque valeur d'octet (décodage des positions)
+_BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1)
+                   for value in range(256))
+
+
+def bitmap_from_positions(positions, size):
+    """
+    Construit un bitmap depuis des positions
+
+    Les bits sont posés dans un tampon d'octets puis convertis en une fois :
+    coût linéaire, contrairement à des 1 << i successifs sur un grand entier.
+    """
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def bitmap_positions(bitmap):
+    """Positions des bits à 1, dans l'ordre croissant"""
+    if not bitmap:
+        return []
+    positions = []
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for index, byte in enumerate(data):
+        if byte:
+            base = index << 3
+            positions.extend(base + bit for bit in _BYTE_BITS[byte])
+    return positions
+
+
+def bitmap_count(bitmap):
+    """Nombre de bits à 1"""
+    return bin(bitmap).count("1")
+
+
+class BitmapIndex:
+    """Bitmaps par équipement et par classe DPE / GES d'un ensemble d'annonces"""
+
+    def __init__(self, listings):
+        """
+        Args:
+            listings: Dictionnaire {clé: annonce} (Listing ou dictionnaire)
+        """
+        self.keys = list(listings)
+        self.size = len(self.keys)
+        self.universe = (1 << self.size) - 1
+
+        amenity_positions = {flag: [] for flag in AMENITY_LABELS}
+        energy_positions = {field: {energy_class: [] for energy_class in ENERGY_CLASSES}
+                            for field in ENERGY_FIELDS}
+        for position, item in enumerate(listings.values()):
+            flags = item.get("equipements") or 0
+            if flags:
+                for flag, positions in amenity_positions.items():
+                    if flags & flag:
+                        positions.append(position)
+            for field in ENERGY_FIELDS:
+                energy_class = (item.get(field) or "").strip().upper()
+                if energy_class in energy_positions[field]:
+                    energy_positions[field][energy_class].append(position)
+
+        self.amenities = {flag: bitmap_from_positions(positions, self.size)
+                          for flag, positions in amenity_positions.items()}
+        self.energy = {field: {energy_class: bitmap_from_positions(positions, self.size)
+                               for energy_class, positions in classes.items()}
+                       for field, classes in energy_positions.items()}
+
+    def amenity(self, name):
+        """
+        Bitmap d'un équipement ("balcon", "parking", "meuble"...)
+
+        Raises:
+            ValueError: Équipement inconnu
+        """
+        if isinstance(name, Equipement):
+            return self.amenities[name]
+        flag = AMENITY_NAMES.get(normalize_text(name))
+        if flag is None:
+            raise ValueError(f"Équipement inconnu: {name} "
+                             f"(valeurs: {', '.join(sorted(AMENITY_NAMES))})")
+        return self.amenities[flag]
+
+    def energy_range(self, field, operator, energy_class):
+        """
+        Bitmap des annonces dont la classe vérifie la comparaison
+        (A est la meilleure classe : dpe<=C retient A, B et C)
+
+        Les annonces sans classe connue ne vérifient aucune comparaison.
+        """
+        field = field.lower()
+        rank = ENERGY_CLASSES.index(energy_class.upper())
+        selected = {
+            "<=": ENERGY_CLASSES[:rank + 1], "≤": ENERGY_CLASSES[:rank + 1],
+            "<": ENERGY_CLASSES[:rank],
+            ">=": ENERGY_CLASSES[rank:], "≥": ENERGY_CLASSES[rank:],
+            ">": ENERGY_CLASSES[rank + 1:],
+            "=": ENERGY_CLASSES[rank],
+        }[operator]
+        bitmap = 0
+        for name in selected:
+            bitmap |= self.energy[field][name]
+        return bitmap
+
+    def evaluate(self, expression):
+        """
+        Évalue une requête booléenne
+
+        Syntaxe : équipements (balcon, terrasse, jardin, parking, ascenseur,
+        meuble), comparaisons de classes (dpe<=C, ges=B, dpe>D), opérateurs
+        ET / OU / NON (ou AND / OR / NOT, &, |, !) et parenthèses. Deux
+        termes juxtaposés sont combinés par ET.
+
+        Returns:
+            int: Bitmap des annonces retenues
+
+        Raises:
+            ValueError: Requête invalide
+        """
+        return _QueryParser(self, expression).parse()
+
+    def select(self, expression):
+        """
+        Returns:
+            list: Clés des annonces retenues, dans l'ordre d'origine
+        """
+        keys = self.keys
+        return [keys[position] for position in bitmap_positions(self.evaluate(expression))]
+
+    def count(self, expression):
+        """Nombre d'annonces retenues par une requête"""
+        return bitmap_count(self.evaluate(expression))
+
+
+class _QueryParser:
+    """Analyse descendante : expr := terme (OU terme)* ; terme := facteur (ET? facteur)*"""
+
+    def __init__(self, index, expression):
+        self.index = index
+        self.expression = expression
+        self.tokens = self.tokenize(expression)
+        self.position = 0
+
+    def tokenize(self, expression):
+        tokens = []
+        position = 0
+        expression = expression.strip()
+        while position < len(expression):
+            match = TOKEN_PATTERN.match(expression, position)
+            if not match or match.end() == position:
+                raise ValueError(f"Requête invalide près de: {expression[position:]!r}")
+            position = match.end()
+            if match.group("energie"):
+                tokens.append(("ENERGIE", match.group("energie")))
+            elif match.group("parenthese"):
+                tokens.append((match.group("parenthese"), None))
+            else:
+                word = (match.group("symbole") or match.group("mot")).lower()
+                kind = KEYWORDS.get(word)
+                tokens.append((kind, None) if kind else ("NOM", word))
+        return tokens
+
+    def peek(self):
+        return self.tokens[self.position][0] if self.position < len(self.tokens) else None
+
+    def take(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("Requête vide")
+        bitmap = self.parse_or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Requête invalide: {self.expression!r}")
+        return bitmap
+
+    def parse_or(self):
+        bitmap = self.parse_and()
+        while self.peek() == "OU":
+            self.take()
+            bitmap |= self.parse_and()
+        return bitmap
+
+    def parse_and(self):
+        bitmap = self.parse_not()
+        while self.peek() in ("ET", "NON", "NOM", "ENERGIE", "("):
+            if self.peek() == "ET":
+                self.take()
+            bitmap &= self.parse_not()
+        return bitmap
+
+    def parse_not(self):
+        if self.peek() == "NON":
+            self.take()
+            return self.index.universe & ~self.parse_not()
+        return self.parse_atom()
+
+    def parse_atom(self):
+        if self.peek() is None:
+            raise ValueError(f"Requête incomplète: {self.expression!r}")
+        kind, value = self.take()
+        if kind == "(":
+            bitmap = self.parse_or()
+            if self.peek() != ")":
+                raise ValueError(f"Parenthèse non fermée: {self.expression!r}")
+            self.take()
+            return bitmap
+        if kind == "NOM":
+            return self.index.amenity(value)
+        if kind == "ENERGIE":
+            field, operator, energy_class = ENERGY_PATTERN.match(value).groups()
+            return self.index.energy_range(field, operator, energy_class)
+        raise ValueError(f"Requête invalide: {self.expression!r}")
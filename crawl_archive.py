@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Archive compressée des crawls successifs
+Chaque crawl écrase res.json ; l'archive en conserve une copie compacte.
+Les crawls sont ajoutés à des segments (un fichier par mois par défaut) sous
+forme de blocs JSON Lines compressés indépendamment (membres gzip ou trames
+zstd concaténés). Le manifeste donne, pour chaque crawl, la date et la
+position de ses blocs : un crawl se relit sans décompresser le reste du
+segment, et la recherche par date est une recherche dichotomique.
+
+Structure :
+    archives_crawl/manifest.json
+    archives_crawl/crawls_2024-05.jsonl.zst    (ou .jsonl.gz sans zstandard)
+
+Usage:
+    python crawl_archive.py liste
+    python crawl_archive.py ajouter res.json
+    python crawl_archive.py restaurer 2024-05-12T08:00 --sortie res_archive.json
+    python crawl_archive.py purger --jours 365
+"""
+
+import argparse
+import bisect
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+from listing import as_dict
+
+try:
+    import zstandard
+except ImportError:  # zstd est optionnel
+    zstandard = None
+
+
+DEFAULT_ARCHIVE_DIR = "archives_crawl"
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+CHUNK_LISTINGS = 2000                   # Annonces par bloc compressé
+MAX_SEGMENT_BYTES = 256 * 1024 * 1024   # Au-delà, le segment est continué dans un autre fichier
+
+# Rotation des segments : format de date du nom de fichier
+ROTATIONS = {
+    "jour": "%Y-%m-%d",
+    "semaine": "%G-S%V",
+    "mois": "%Y-%m",
+    "annee": "%Y",
+}
+
+EXTENSIONS = {"zstd": ".jsonl.zst", "gzip": ".jsonl.gz"}
+
+
+def default_compression():
+    """zstd si le paquet zstandard est installé, gzip sinon"""
+    return "zstd" if zstandard is not None else "gzip"
+
+
+def compress_chunk(data, compression):
+    """Compresse un bloc en un membre gzip ou une trame zstd autonome"""
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError(
+                "La compression zstd nécessite le paquet 'zstandard'")
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=6)
+    raise ValueError(f"Compression inconnue: {compression}")
+
+
+def decompress_chunk(data, compression):
+    if compression == "zstd":
+        if zstandard is None:
+            raise ImportError(
+                "La décompression zstd nécessite le paquet 'zstandard'")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if compression == "gzip":
+        return gzip.decompress(data)
+    raise ValueError(f"Compression inconnue: {compression}")
+
+
+def normalize_timestamp(value):
+    """
+    Convertit une date (datetime ou texte ISO, éventuellement partiel) en
+    horodatage ISO à la seconde, comparable par ordre lexicographique
+
+    Raises:
+        ValueError: Date invalide
+    """
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        moment = datetime.fromisoformat(str(value).strip())
+    return moment.replace(tzinfo=None, microsecond=0).isoformat()
+
+
+class CrawlArchive:
+    """Segments compressés et manifeste des crawls archivés"""
+
+    def __init__(self, directory=DEFAULT_ARCHIVE_DIR, rotation="mois",
+                 retention_days=None, max_crawls=None, compression=None):
+        """
+        Args:
+            directory: Répertoire de l'archive
+            rotation: Période couverte par un segment ("jour", "semaine",
+                      "mois", "annee")
+            retention_days: Âge maximal des crawls conservés (None : illimité)
+            max_crawls: Nombre maximal de crawls conservés (None : illimité)
+            compression: "zstd", "gzip" ou None (zstd si disponible)
+
+        Raises:
+            ValueError: Rotation ou compression inconnue
+        """
+        if rotation not in ROTATIONS:
+            raise ValueError(f"Rotation inconnue: {rotation} "
+                             f"(valeurs: {', '.join(ROTATIONS)})")
+        compression = compression or default_compression()
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Compression inconnue: {compression}")
+
+        self.directory = directory
+        self.rotation = rotation
+        self.retention_days = retention_days
+        self.max_crawls = max_crawls
+        self.compression = compression
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self.manifest = self.load_manifest()
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {"version": MANIFEST_VERSION, "segments": {}, "crawls": []}
+        if manifest.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Version de manifeste non prise en charge: "
+                             f"{manifest.get('version')}")
+        return manifest
+
+    def save_manifest(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    @property
+    def crawls(self):
+        """Entrées du manifeste, par date croissante"""
+        return self.manifest["crawls"]
+
+    def segment_for(self, timestamp, size):
+        """Nom du segment qui reçoit un crawl (nouveau fichier si le segment est plein)"""
+        period = datetime.fromisoformat(timestamp).strftime(ROTATIONS[self.rotation])
+        extension = EXTENSIONS[self.compression]
+        part = 1
+        while True:
+            suffix = "" if part == 1 else f"_{part}"
+            name = f"crawls_{period}{suffix}{extension}"
+            segment = self.manifest["segments"].get(name)
+            if segment is None or segment["octets"] + size <= MAX_SEGMENT_BYTES:
+                return name
+            part += 1
+
+    def add_crawl(self, listings, timestamp=None, source=None):
+        """
+        Archive un crawl
+
+        Args:
+            listings: Dictionnaire {clé: annonce}
+            timestamp: Date du crawl (défaut : maintenant) ; les crawls
+                       doivent être ajoutés dans l'ordre chronologique
+            source: Fichier d'origine (ex: res.json)
+
+        Returns:
+            dict: Entrée du manifeste
+
+        Raises:
+            ValueError: Crawl antérieur au dernier crawl archivé
+        """
+        timestamp = normalize_timestamp(timestamp or datetime.now())
+        if self.crawls and timestamp < self.crawls[-1]["horodatage"]:
+            raise ValueError(f"Crawl du {timestamp} antérieur au dernier crawl archivé "
+                             f"({self.crawls[-1]['horodatage']})")
+
+        items = list(listings.items())
+        chunks = []
+        for start in range(0, len(items), CHUNK_LISTINGS):
+            lines = "".join(
+                json.dumps([key, as_dict(item)], ensure_ascii=False,
+                           separators=(",", ":")) + "\n"
+                for key, item in items[start:start + CHUNK_LISTINGS])
+            chunks.append(compress_chunk(lines.encode("utf-8"), self.compression))
+
+        size = sum(len(chunk) for chunk in chunks)
+        name = self.segment_for(timestamp, size)
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        blocks = []
+        # Ajout en fin de segment : un crash avant l'écriture du manifeste ne
+        # laisse que des octets inutilisés
+        with open(path, "ab") as f:
+            offset = f.tell()
+            for chunk in chunks:
+                f.write(chunk)
+                blocks.append([offset, len(chunk)])
+                offset += len(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+
+        segment = self.manifest["segments"].setdefault(
+            name, {"compression": self.compression, "octets": 0})
+        segment["octets"] = offset
+        entry = {
+            "horodatage": timestamp,
+            "segment": name,
+            "blocs": blocks,
+            "nombre": len(items),
+            "octets": size,
+            "source": source,
+        }
+        self.crawls.append(entry)
+        self.apply_retention(save=False)
+        self.save_manifest()
+        return entry
+
+    def find(self, timestamp):
+        """
+        Crawl en vigueur à une date : le dernier crawl archivé à cette date
+        ou avant
+
+        Returns:
+            dict: Entrée du manifeste ou None
+        """
+        timestamp = normalize_timestamp(timestamp)
+        dates = [entry["horodatage"] for entry in self.crawls]
+        index = bisect.bisect_right(dates, timestamp)
+        return self.crawls[index - 1] if index else None
+
+    def between(self, start=None, end=None):
+        """Entrées des crawls entre deux dates (bornes incluses)"""
+        dates = [entry["horodatage"] for entry in self.crawls]
+        low = bisect.bisect_left(dates, normalize_timestamp(start)) if start else 0
+        high = bisect.bisect_right(dates, normalize_timestamp(end)) if end else len(dates)
+        return self.crawls[low:high]
+
+    def iter_listings(self, entry):
+        """
+        Relit un crawl bloc par bloc (mémoire bornée)
+
+        Yields:
+            tuple: (clé, annonce au format du crawl)
+        """
+        compression = self.manifest["segments"][entry["segment"]]["compression"]
+        with open(os.path.join(self.directory, entry["segment"]), "rb") as f:
+            for offset, length in entry["blocs"]:
+                f.seek(offset)
+                data = decompress_chunk(f.read(length), compression)
+                for line in data.decode("utf-8").splitlines():
+                    key, item = json.loads(line)
+                    yield key, item
+
+    def load(self, timestamp_or_entry):
+        """
+        Relit le crawl en vigueur à une date (ou une entrée du manifeste)
+
+        Returns:
+            dict: {clé: annonce}, à passer à SortScrapSearch
+
+        Raises:
+            KeyError: Aucun crawl archivé à cette date
+        """
+        entry = timestamp_or_entry
+        if not isinstance(entry, dict):
+            entry = self.find(timestamp_or_entry)
+            if entry is None:
+                raise KeyError(f"Aucun crawl archivé au {timestamp_or_entry}")
+        return dict(self.iter_listings(entry))
+
+    def replay(self, start=None, end=None):
+        """
+        Rejoue les crawls d'une période dans l'ordre chronologique
+
+        Yields:
+            tuple: (entrée du manifeste, {clé: annonce})
+        """
+        for entry in self.between(start, end):
+            yield entry, self.load(entry)
+
+    def apply_retention(self, now=None, save=True):
+        """
+        Retire les crawls au-delà de la rétention ; un segment est supprimé
+        dès qu'il ne contient plus aucun crawl conservé
+
+        Returns:
+            int: Nombre de crawls retirés
+        """
+        crawls = self.crawls
+        keep_from = 0
+        if self.retention_days is not None:
+            limit = normalize_timestamp(
+                (now or datetime.now()) - timedelta(days=self.retention_days))
+            keep_from = bisect.bisect_left([entry["horodatage"] for entry in crawls], limit)
+        if self.max_crawls is not None:
+            keep_from = max(keep_from, len(crawls) - self.max_crawls)
+        if not keep_from:
+            return 0
+
+        self.manifest["crawls"] = crawls[keep_from:]
+        used = {entry["segment"] for entry in self.manifest["crawls"]}
+        for name in list(self.manifest["segments"]):
+            if name not in used:
+                del self.manifest["segments"][name]
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+        if save:
+            self.save_manifest()
+        return keep_from
+
+    def summary(self):
+        """
+        Returns:
+            dict: Nombre de crawls, période couverte et taille sur disque
+        """
+        return {
+            "crawls": len(self.crawls),
+            "premier": self.crawls[0]["horodatage"] if self.crawls else None,
+            "dernier": self.crawls[-1]["horodatage"] if self.crawls else None,
+            "annonces": sum(entry["nombre"] for entry in self.crawls),
+            "segments": len(self.manifest["segments"]),
+            "octets": sum(segment["octets"] for segment in self.manifest["segments"].values()),
+        }
+
+
+def archive_crawl(listings, source=None, directory=DEFAULT_ARCHIVE_DIR):
+    """Archive le crawl qui vient de se terminer (appelé après le scraping)"""
+    return CrawlArchive(directory).add_crawl(listings, source=source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive compressée des crawls")
+    parser.add_argument("--dossier", default=DEFAULT_ARCHIVE_DIR,
+                        help="Répertoire de l'archive")
+    commands = parser.add_subparsers(dest="commande", required=True)
+
+    commands.add_parser("liste", help="Liste les crawls archivés")
+
+    add = commands.add_parser("ajouter", help="Archive un fichier de crawl")
+    add.add_argument("fichier")
+    add.add_argument("--date", help="Date du crawl (défaut : date du fichier)")
+
+    restore = commands.add_parser("restaurer", help="Relit le crawl en vigueur à une date")
+    restore.add_argument("date")
+    restore.add_argument("--sortie", help="Fichier JSON à écrire (défaut : tri et statistiques)")
+
+    purge = commands.add_parser("purger", help="Applique une politique de rétention")
+    purge.add_argument("--jours", type=int, help="Âge maximal des crawls")
+    purge.add_argument("--max", type=int, help="Nombre maximal de crawls")
+
+    args = parser.parse_args()
+
+    if args.commande == "purger":
+        archive = CrawlArchive(args.dossier, retention_days=args.jours,
+                               max_crawls=args.max)
+        print(f"{archive.apply_retention()} crawl(s) retiré(s)")
+        return
+    archive = CrawlArchive(args.dossier)
+
+    if args.commande == "liste":
+        for entry in archive.crawls:
+            print(f"{entry['horodatage']}  {entry['nombre']:>6} annonces  "
+                  f"{entry['octets']:>9} octets  {entry['segment']}")
+        print(json.dumps(archive.summary(), ensure_ascii=False, indent=2))
+
+    elif args.commande == "ajouter":
+        with open(args.fichier, "r", encoding="utf-8") as f:
+            listings = json.load(f)
+        date = args.date or datetime.fromtimestamp(os.path.getmtime(args.fichier))
+        try:
+            entry = archive.add_crawl(listings, timestamp=date, source=args.fichier)
+        except ValueError as e:
+            parser.exit(1, f"Crawl non archivé: {e}\n")
+        print(f"Crawl du {entry['horodatage']} archivé: {entry['nombre']} annonces, "
+              f"{entry['octets']} octets")
+
+    elif args.commande == "restaurer":
+        try:
+            entry = archive.find(args.date)
+            if entry is None:
+                raise KeyError(args.date)
+            listings = archive.load(entry)
+        except (KeyError, ValueError) as e:
+            parser.exit(1, f"Aucun crawl archivé au {args.date}: {e}\n")
+        print(f"Crawl du {entry['horodatage']}: {len(listings)} annonces")
+        if args.sortie:
+            with open(args.sortie, "w", encoding="utf-8") as f:
+                json.dump(listings, f, ensure_ascii=False, indent=2)
+        else:
+            from SortScrapSearch import SortScrapSearch
+            sorter = SortScrapSearch(listings)
+            print(f"  - Annonces valides: {len(sorter.validSearch)}")
+            print(f"  - Annonces rejetées: {len(sorter.rejectedSearch)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Crawl d'une région entière réparti sur plusieurs processus
+Les codes INSEE sont découpés en partitions ; chaque partition est crawlée
+par un processus du pool, avec son propre réacteur Twisted (un processus neuf
+par partition : le réacteur ne redémarre pas) et son propre fichier de
+résultats. Chaque processus trie son fragment, puis les fragments sont
+fusionnés par une fusion k-voies (heapq.merge) du plus récent au plus ancien,
+en ne gardant qu'une fois chaque annonce.
+
+Ordre de création : les cartes de résultats n'affichent pas de date de
+publication ; l'identifiant SeLoger, attribué dans l'ordre de publication,
+en tient lieu (une date explicite est prioritaire si elle est présente).
+
+Usage:
+    python crawl_coordinator.py --insee 210292,210231,21054,21166 --processus 4
+"""
+
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import re
+import shutil
+import time
+
+from listing import as_dict, listing_document_id
+
+
+DEFAULT_SHARD_DIR = "fragments_crawl"
+DEFAULT_OUTPUT = "res.json"
+CODES_PER_PARTITION = 1
+
+
+def partition_codes(insee_codes, size=CODES_PER_PARTITION):
+    """
+    Découpe les codes INSEE en partitions (doublons retirés, ordre conservé)
+
+    Returns:
+        list: Listes de codes
+    """
+    codes = list(dict.fromkeys(str(code).strip() for code in insee_codes
+                               if str(code).strip()))
+    return [codes[start:start + size] for start in range(0, len(codes), size)]
+
+
+def creation_key(item):
+    """
+    Clé d'ordre de création d'une annonce (plus grande = plus récente)
+
+    Returns:
+        tuple: (date de création ISO ou "", identifiant numérique ou 0)
+    """
+    date = item.get("date_creation") or ""
+    document_id = listing_document_id(None, item)
+    number = int(document_id) if document_id and document_id.isdigit() else 0
+    if not number:
+        match = re.search(r"(\d+)", document_id or "")
+        number = int(match.group(1)) if match else 0
+    return date, number
+
+
+def write_shard(listings, path):
+    """
+    Écrit un fragment trié du plus récent au plus ancien (JSON Lines)
+
+    Args:
+        listings: Dictionnaire {clé: annonce}
+        path: Fichier du fragment
+
+    Returns:
+        int: Nombre d'annonces écrites
+    """
+    entries = sorted(((creation_key(item), key, as_dict(item))
+                      for key, item in listings.items()),
+                     key=lambda entry: entry[0], reverse=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for _, key, item in entries:
+            f.write(json.dumps([key, item], ensure_ascii=False) + "\n")
+    os.replace(tmp_path, path)
+    return len(entries)
+
+
+def read_shard(path):
+    """
+    Relit un fragment ligne par ligne
+
+    Yields:
+        tuple: (clé, annonce)
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                key, item = json.loads(line)
+                yield key, item
+
+
+def merge_shards(paths):
+    """
+    Fusion k-voies des fragments triés, dédoublonnée par identifiant
+
+    Yields:
+        tuple: (identifiant, annonce), du plus récent au plus ancien
+    """
+    seen = set()
+    merged = heapq.merge(*(read_shard(path) for path in paths),
+                         key=lambda entry: creation_key(entry[1]), reverse=True)
+    for key, item in merged:
+        document_id = listing_document_id(key, item)
+        if document_id in seen:
+            continue
+        seen.add(document_id)
+        yield document_id, item
+
+
+def write_merged(paths, output_file):
+    """
+    Écrit le résultat fusionné au format de res.json, en flux
+
+    Returns:
+        int: Nombre d'annonces écrites
+    """
+    written = 0
+    tmp_path = output_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("{")
+        for document_id, item in merge_shards(paths):
+            f.write(",\n  " if written else "\n  ")
+            f.write(f"{json.dumps(document_id)}: {json.dumps(item, ensure_ascii=False)}")
+            written += 1
+        f.write("\n}\n")
+    os.replace(tmp_path, output_file)
+    return written
+
+
+def crawl_partition(task):
+    """
+    Crawle une partition dans le processus courant (cible du pool)
+
+    Args:
+        task: (numéro, codes INSEE, pages maximales, répertoire des fragments)
+
+    Returns:
+        dict: Numéro, codes, fragment, nombre d'annonces et durée
+    """
+    index, codes, max_pages, shard_dir = task
+    from scrapy.crawler import CrawlerProcess
+    from scrapImmo import ImmoScrap
+
+    started = time.time()
+    raw_file = os.path.join(shard_dir, f"brut_{index:03d}.json")
+    process = CrawlerProcess(settings={
+        'LOG_LEVEL': 'WARNING',
+        'CRAWL_METRICS_PROM_FILE': os.path.join(shard_dir, f"metriques_{index:03d}.prom"),
+        'CRAWL_METRICS_JSON_FILE': os.path.join(shard_dir, f"metriques_{index:03d}.json"),
+    })
+    process.crawl(ImmoScrap, insee_codes=codes, max_pages=max_pages,
+                  output_file=raw_file)
+    process.start()
+
+    listings = {}
+    if os.path.exists(raw_file):
+        with open(raw_file, "r", encoding="utf-8") as f:
+            listings = json.load(f)
+    shard = os.path.join(shard_dir, f"fragment_{index:03d}.jsonl")
+    count = write_shard(listings, shard)
+    return {"partition": index, "codes": codes, "fragment": shard,
+            "annonces": count, "duree_s": round(time.time() - started, 2)}
+
+
+class CrawlCoordinator:
+    """Répartit les partitions sur un pool de processus et fusionne les fragments"""
+
+    def __init__(self, insee_codes, processes=None, max_pages=5,
+                 codes_per_partition=CODES_PER_PARTITION,
+                 shard_dir=DEFAULT_SHARD_DIR):
+        """
+        Args:
+            insee_codes: Codes INSEE de la région
+            processes: Nombre de processus (défaut : nombre de cœurs)
+            max_pages: Pages maximales par partition
+            codes_per_partition: Codes INSEE par recherche
+            shard_dir: Répertoire des fragments
+
+        Raises:
+            ValueError: Aucun code INSEE
+        """
+        self.partitions = partition_codes(insee_codes, codes_per_partition)
+        if not self.partitions:
+            raise ValueError("Aucun code INSEE à crawler")
+        self.processes = max(1, min(processes or os.cpu_count() or 1,
+                                    len(self.partitions)))
+        self.max_pages = max_pages
+        self.shard_dir = shard_dir
+
+    def crawl(self):
+        """
+        Crawle toutes les partitions (un processus neuf par partition)
+
+        Returns:
+            list: Résultats par partition, dans l'ordre des partitions
+        """
+        os.makedirs(self.shard_dir, exist_ok=True)
+        tasks = [(index, codes, self.max_pages, self.shard_dir)
+                 for index, codes in enumerate(self.partitions)]
+        results = []
+        with multiprocessing.Pool(self.processes, maxtasksperchild=1) as pool:
+            for result in pool.imap_unordered(crawl_partition, tasks):
+                print(f"  Partition {result['partition'] + 1}/{len(tasks)} "
+                      f"({','.join(result['codes'])}): {result['annonces']} annonces "
+                      f"en {result['duree_s']}s")
+                results.append(result)
+        return sorted(results, key=lambda result: result["partition"])
+
+    def run(self, output_file=DEFAULT_OUTPUT, keep_shards=False):
+        """
+        Crawl complet de la région puis fusion dans output_file
+
+        Returns:
+            dict: Résumé (partitions, annonces, doublons, durée)
+        """
+        started = time.time()
+        print(f"Crawl de {len(self.partitions)} partition(s) sur "
+              f"{self.processes} processus...")
+        results = self.crawl()
+        written = write_merged([result["fragment"] for result in results], output_file)
+        duplicates = sum(result["annonces"] for result in results) - written
+
+        from data_catalog import register_file
+        register_file(output_file)
+        if not keep_shards:
+            shutil.rmtree(self.shard_dir, ignore_errors=True)
+
+        summary = {
+            "partitions": len(results),
+            "processus": self.processes,
+            "annonces": written,
+            "doublons": duplicates,
+            "duree_s": round(time.time() - started, 2),
+            "fichier": output_file,
+        }
+        print(f"Fusion terminée: {written} annonces ({duplicates} doublon(s) écarté(s)) "
+              f"dans {output_file} en {summary['duree_s']}s")
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl multi-communes réparti sur plusieurs processus")
+    parser.add_argument("--insee", required=True,
+                        help="Codes INSEE séparés par des virgules (ou @fichier, un code par ligne)")
+    parser.add_argument("--processus", type=int, default=None,
+                        help="Nombre de processus (défaut : nombre de cœurs)")
+    parser.add_argument("--pages", type=int, default=5, help="Pages maximales par partition")
+    parser.add_argument("--par-partition", type=int, default=CODES_PER_PARTITION,
+                        help="Codes INSEE par recherche")
+    parser.add_argument("--sortie", default=DEFAULT_OUTPUT, help="Fichier fusionné")
+    parser.add_argument("--garder-fragments", action="store_true",
+                        help="Conserve les fragments après la fusion")
+    args = parser.parse_args()
+
+    if args.insee.startswith("@"):
+        with open(args.insee[1:], "r", encoding="utf-8") as f:
+            codes = f.read().split()
+    else:
+        codes = args.insee.split(",")
+
+    coordinator = CrawlCoordinator(codes, processes=args.processus,
+                                   max_pages=args.pages,
+                                   codes_per_partition=args.par_partition)
+    coordinator.run(args.sortie, keep_shards=args.garder_fragments)
+
+
+if __name__ == "__main__":
+    main()
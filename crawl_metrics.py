@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Métriques de débit du crawl
+Une extension Scrapy relève, pendant le crawl, la latence des requêtes, le
+temps de parse de chaque page, les pages vides, les nouvelles tentatives et
+les octets reçus. À la fin du crawl, elle écrit :
+
+- metriques_crawl.prom : format texte Prometheus (collecteur « textfile » de
+  node_exporter), pour suivre les régressions de débit sur les tableaux de bord ;
+- metriques_crawl.json : résumé lisible (pages/s, annonces/s, quantiles).
+
+Le spider signale chaque page traitée par le signal page_parsed.
+"""
+
+import json
+import os
+import time
+
+from stats_engine import QuantileSketch
+
+
+PROMETHEUS_FILE = "metriques_crawl.prom"
+JSON_FILE = "metriques_crawl.json"
+METRIC_PREFIX = "immo_crawl"
+
+# Bornes des histogrammes Prometheus (secondes)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PARSE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# Signal envoyé par le spider après chaque page (arguments : spider, seconds, items)
+page_parsed = object()
+
+
+class BucketHistogram:
+    """Histogramme cumulatif à la manière de Prometheus (bornes « le »)"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.sketch = QuantileSketch()
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.sketch.add(value)
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+    def quantiles(self):
+        """
+        Returns:
+            dict: Médiane, p95, p99 et maximum (secondes, arrondis)
+        """
+        def rounded(value):
+            return round(value, 4) if value is not None else None
+
+        return {
+            "mediane": rounded(self.sketch.quantile(0.5)),
+            "p95": rounded(self.sketch.quantile(0.95)),
+            "p99": rounded(self.sketch.quantile(0.99)),
+            "max": rounded(self.sketch.max),
+        }
+
+    def prometheus(self, name, labels):
+        """Lignes du format texte Prometheus"""
+        lines = [f"# TYPE {name} histogram"]
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class CrawlMetrics:
+    """Compteurs et histogrammes d'un crawl (indépendants de Scrapy)"""
+
+    def __init__(self, spider_name):
+        self.spider_name = spider_name
+        self.started = time.time()
+        self.finished = None
+        self.responses = {}                 # {code HTTP: nombre}
+        self.bytes = 0
+        self.pages = 0
+        self.items = 0
+        self.empty_pages = 0
+        self.retries = 0
+        self.blocked = 0
+        self.latency = BucketHistogram(LATENCY_BUCKETS)
+        self.parse_time = BucketHistogram(PARSE_BUCKETS)
+
+    def record_response(self, status, size, latency=None):
+        self.responses[status] = self.responses.get(status, 0) + 1
+        self.bytes += size
+        if latency is not None:
+            self.latency.observe(latency)
+
+    def record_page(self, seconds, items):
+        self.pages += 1
+        self.items += items
+        if not items:
+            self.empty_pages += 1
+        self.parse_time.observe(seconds)
+
+    def finish(self, retries=0, blocked=0):
+        self.finished = time.time()
+        self.retries = retries
+        self.blocked = blocked
+
+    @property
+    def duration(self):
+        return (self.finished or time.time()) - self.started
+
+    def rate(self, count):
+        duration = self.duration
+        return count / duration if duration > 0 else 0.0
+
+    def summary(self):
+        """
+        Returns:
+            dict: Résumé du crawl (écrit dans metriques_crawl.json)
+        """
+        return {
+            "spider": self.spider_name,
+            "debut": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "duree_s": round(self.duration, 3),
+            "pages": self.pages,
+            "annonces": self.items,
+            "pages_par_seconde": round(self.rate(self.pages), 3),
+            "annonces_par_seconde": round(self.rate(self.items), 3),
+            "pages_vides": self.empty_pages,
+            "nouvelles_tentatives": self.retries,
+            "pages_bloquees": self.blocked,
+            "octets_recus": self.bytes,
+            "reponses": {str(status): count for status, count in sorted(self.responses.items())},
+            "latence_requetes_s": self.latency.quantiles(),
+            "temps_parse_s": self.parse_time.quantiles(),
+        }
+
+    def prometheus(self):
+        """
+        Returns:
+            str: Métriques au format texte Prometheus
+        """
+        labels = f'spider="{self.spider_name}"'
+        prefix = METRIC_PREFIX
+        lines = []
+
+        def metric(name, kind, value, help_text):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            lines.append(f"{prefix}_{name}{{{labels}}} {value}")
+
+        metric("pages_total", "counter", self.pages, "Pages de résultats traitées")
+        metric("items_total", "counter", self.items, "Annonces extraites")
+        metric("empty_pages_total", "counter", self.empty_pages, "Pages sans annonce")
+        metric("retries_total", "counter", self.retries, "Nouvelles tentatives de requêtes")
+        metric("blocked_pages_total", "counter", self.blocked, "Pages bloquées (captcha, 429...)")
+        metric("response_bytes_total", "counter", self.bytes, "Octets reçus")
+        metric("duration_seconds", "gauge", f"{self.duration:.3f}", "Durée du crawl")
+        metric("pages_per_second", "gauge", f"{self.rate(self.pages):.4f}", "Débit en pages")
+        metric("items_per_second", "gauge", f"{self.rate(self.items):.4f}", "Débit en annonces")
+        metric("last_run_timestamp_seconds", "gauge", f"{self.started:.0f}",
+               "Début du dernier crawl")
+
+        lines.append(f"# HELP {prefix}_responses_total Réponses par code HTTP")
+        lines.append(f"# TYPE {prefix}_responses_total counter")
+        for status, count in sorted(self.responses.items()):
+            lines.append(f'{prefix}_responses_total{{{labels},status="{status}"}} {count}')
+
+        lines.append(f"# HELP {prefix}_request_latency_seconds Latence des requêtes")
+        lines.extend(self.latency.prometheus(f"{prefix}_request_latency_seconds", labels))
+        lines.append(f"# HELP {prefix}_parse_seconds Temps de parse par page")
+        lines.extend(self.parse_time.prometheus(f"{prefix}_parse_seconds", labels))
+        return "\n".join(lines) + "\n"
+
+    def export(self, prometheus_path=PROMETHEUS_FILE, json_path=JSON_FILE):
+        """Écrit les deux fichiers (écriture atomique : le collecteur ne lit jamais un fichier partiel)"""
+        if prometheus_path:
+            _write_atomic(prometheus_path, self.prometheus())
+        if json_path:
+            _write_atomic(json_path, json.dumps(self.summary(), ensure_ascii=False, indent=2))
+
+
+def _write_atomic(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class CrawlMetricsExtension:
+    """
+    Extension Scrapy alimentant CrawlMetrics
+
+    Réglages (settings) :
+        CRAWL_METRICS_ENABLED      Active l'extension (défaut True)
+        CRAWL_METRICS_PROM_FILE    Fichier Prometheus (défaut metriques_crawl.prom)
+        CRAWL_METRICS_JSON_FILE    Résumé JSON (défaut metriques_crawl.json)
+    """
+
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.prometheus_path = crawler.settings.get("CRAWL_METRICS_PROM_FILE", PROMETHEUS_FILE)
+        self.json_path = crawler.settings.get("CRAWL_METRICS_JSON_FILE", JSON_FILE)
+        self.metrics = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        from scrapy import signals
+        from scrapy.exceptions import NotConfigured
+
+        if not crawler.settings.getbool("CRAWL_METRICS_ENABLED", True):
+            raise NotConfigured
+        extension = cls(crawler)
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        crawler.signals.connect(extension.page_parsed, signal=page_parsed)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        self.metrics = CrawlMetrics(spider.name)
+
+    def response_received(self, response, request, spider):
+        self.metrics.record_response(response.status, len(response.body),
+                                     request.meta.get("download_latency"))
+
+    def page_parsed(self, spider, seconds, items):
+        self.metrics.record_page(seconds, items)
+
+    def spider_closed(self, spider, reason):
+        stats = self.crawler.stats
+        self.metrics.finish(retries=stats.get_value("retry/count", 0),
+                            blocked=getattr(spider, "blocked_pages", 0))
+        try:
+            self.metrics.export(self.prometheus_path, self.json_path)
+        except OSError as e:
+            spider.logger.error(f"Export des métriques impossible: {e}")
+            return
+        summary = self.metrics.summary()
+        spider.logger.info(
+            f"Métriques du crawl: {summary['pages']} pages "
+            f"({summary['pages_par_seconde']}/s), {summary['annonces']} annonces "
+            f"({summary['annonces_par_seconde']}/s) -> {self.prometheus_path}")
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Catalogue des fichiers de données
+Un fichier JSON (catalogue_donnees.json) décrit chaque fichier de données :
+format détecté, nombre d'annonces, période couverte et empreinte du contenu.
+Seuls les fichiers nouveaux ou modifiés depuis leur dernière description sont
+relus ; les fichiers écrits par l'application sont enregistrés à l'écriture.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+
+from export_writers import detect_format, open_input
+from snapshot_cache import content_digest, file_digest
+
+
+DEFAULT_CATALOG_NAME = "catalogue_donnees.json"
+CATALOG_VERSION = 1
+
+# Verrou des écritures concurrentes (workers batch_cli, partitions du crawl)
+LOCK_TIMEOUT = 10.0             # Attente maximale du verrou (s)
+STALE_LOCK_SECONDS = 60.0       # Verrou laissé par un processus interrompu
+
+# Extensions des fichiers de données découverts
+DATA_EXTENSIONS = (".json", ".jsonl", ".ndjson", ".json.gz", ".jsonl.gz",
+                   ".jsonl.zst", ".msnap")
+
+# Dossiers ignorés lors de la découverte
+IGNORED_DIRS = frozenset(("__pycache__", "venv", "node_modules", "build", "dist"))
+MAX_DEPTH = 3
+
+# Formats que SortScrapSearch sait charger (proposés par le sélecteur)
+LOADABLE_FORMATS = ("scrape", "api_seloger", "scrape_detaille", "resultats",
+                    "jsonl", "instantane")
+
+DATE_FIELDS = ("date_scraping", "collected_at")
+
+
+def normalize_date(value):
+    """Date ISO comparable ("2023-09-08 09:27:37.9" -> "2023-09-08T09:27:37")"""
+    if not value:
+        return None
+    return str(value).replace(" ", "T")[:19]
+
+
+def detect_data_format(data):
+    """
+    Détecte le format d'un fichier JSON chargé
+
+    Returns:
+        tuple: (format, annonces) où annonces est une liste de dictionnaires
+    """
+    if isinstance(data, list):
+        return "scrape", [item for item in data if isinstance(item, dict)]
+    if not isinstance(data, dict):
+        return "inconnu", []
+    if "annonces_valides" in data or "annonces_rejetees" in data:
+        items = list((data.get("annonces_valides") or {}).values())
+        items += list((data.get("annonces_rejetees") or {}).values())
+        return "resultats", items
+    # Fichier détaillé du spider : annonces en dictionnaire (ou en liste)
+    if isinstance(data.get("annonces"), list):
+        return "scrape_detaille", [item for item in data["annonces"] if isinstance(item, dict)]
+    if isinstance(data.get("annonces"), dict):
+        return "scrape_detaille", [item for item in data["annonces"].values()
+                                   if isinstance(item, dict)]
+
+    items = [item for item in data.values() if isinstance(item, dict)]
+    if not items or len(items) != len(data):
+        return "inconnu", items
+    sample = items[0]
+    if "annonce_id" in sample or "price" in sample:
+        return "api_seloger", items
+    if "lien" in sample or "prix" in sample:
+        return "scrape", items
+    return "inconnu", items
+
+
+def date_range(items, extra_dates=()):
+    """
+    Période couverte par des annonces
+
+    Returns:
+        tuple: (date_min, date_max) au format ISO, ou (None, None)
+    """
+    dates = [normalize_date(date) for date in extra_dates]
+    for item in items:
+        for field in DATE_FIELDS:
+            if item.get(field):
+                dates.append(normalize_date(item[field]))
+                break
+    dates = [date for date in dates if date]
+    return (min(dates), max(dates)) if dates else (None, None)
+
+
+def describe_file(path):
+    """
+    Décrit un fichier de données (lecture complète, une seule fois)
+
+    Returns:
+        dict: {format, nombre, date_min, date_max, checksum}
+    """
+    name = path.lower()
+    if name.endswith(".msnap"):
+        # Instantané binaire : l'en-tête suffit
+        from snapshot_format import read_snapshot_header
+        header = read_snapshot_header(path)
+        return {
+            "format": "instantane",
+            "nombre": header["nombre"],
+            "date_min": header["date_min"],
+            "date_max": header["date_max"],
+            "checksum": file_digest(path),
+        }
+    if not name.endswith(DATA_EXTENSIONS):
+        # Export tabulaire ou binaire (CSV, colonnes) : non relu
+        return {
+            "format": detect_format(path)[0],
+            "nombre": None,
+            "date_min": None,
+            "date_max": None,
+            "checksum": file_digest(path),
+        }
+    if name.endswith((".jsonl", ".ndjson", ".jsonl.gz", ".jsonl.zst")):
+        items = []
+        with open_input(path) as f:
+            for line in f:
+                if line.strip():
+                    items.append(json.loads(line))
+        date_min, date_max = date_range(items)
+        return {
+            "format": "jsonl",
+            "nombre": len(items),
+            "date_min": date_min,
+            "date_max": date_max,
+            "checksum": file_digest(path),
+        }
+
+    if name.endswith(".gz"):
+        with open_input(path, binary=True) as f:
+            raw = f.read()
+        checksum = file_digest(path)
+    else:
+        with open(path, "rb") as f:
+            raw = f.read()
+        checksum = content_digest(raw)
+
+    data = json.loads(raw)
+    fmt, items = detect_data_format(data)
+    extra_dates = []
+    if isinstance(data, dict) and isinstance(data.get("metadata"), dict):
+        metadata = data["metadata"]
+        extra_dates = [metadata.get("date_scraping")]
+    date_min, date_max = date_range(items, extra_dates)
+    return {
+        "format": fmt,
+        "nombre": len(items),
+        "date_min": date_min,
+        "date_max": date_max,
+        "checksum": checksum,
+    }
+
+
+class CatalogLock:
+    """
+    Verrou inter-processus du catalogue (fichier créé de manière exclusive)
+
+    Un verrou plus ancien que STALE_LOCK_SECONDS est considéré comme abandonné.
+    """
+
+    def __init__(self, path, timeout=LOCK_TIMEOUT):
+        self.path = path + ".lock"
+        self.timeout = timeout
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                pass
+            try:
+                if time.time() - os.path.getmtime(self.path) > STALE_LOCK_SECONDS:
+                    os.remove(self.path)
+                    continue
+            except OSError:
+                # Verrou libéré entre-temps
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Catalogue verrouillé: {self.path}")
+            time.sleep(0.01)
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class DataCatalog:
+    """Catalogue persistant des fichiers de données d'un dossier"""
+
+    def __init__(self, root=".", path=None):
+        """
+        Args:
+            root: Dossier exploré (et base des chemins enregistrés)
+            path: Fichier du catalogue (par défaut root/catalogue_donnees.json)
+        """
+        self.root = root
+        self.path = path or os.path.join(root, DEFAULT_CATALOG_NAME)
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        """Charge le catalogue (vide s'il est absent ou illisible)"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("version") == CATALOG_VERSION:
+            self.entries = state.get("fichiers", {})
+
+    def save(self):
+        """Écrit le catalogue de manière atomique (appelé sous verrou)"""
+        state = {"version": CATALOG_VERSION, "fichiers": self.entries}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def update(self, changes, removed=()):
+        """
+        Applique des entrées modifiées au catalogue enregistré
+
+        Le catalogue est relu sous verrou avant l'écriture : les entrées
+        enregistrées entre-temps par d'autres processus sont conservées.
+
+        Args:
+            changes: Entrées {chemin: description} ajoutées ou modifiées
+            removed: Chemins supprimés
+        """
+        with CatalogLock(self.path):
+            self.load()
+            for relative in removed:
+                self.entries.pop(relative, None)
+            self.entries.update(changes)
+            self.save()
+
+    def relative(self, path):
+        """Chemin enregistré d'un fichier (relatif au dossier exploré si possible)"""
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root))
+        if relative.startswith(os.pardir):
+            return os.path.abspath(path)
+        return relative.replace(os.sep, "/")
+
+    def discover(self):
+        """
+        Cherche les fichiers de données sous le dossier exploré
+
+        Returns:
+            list: Chemins relatifs
+        """
+        catalog_name = os.path.basename(self.path)
+        found = []
+        root_depth = os.path.abspath(self.root).rstrip(os.sep).count(os.sep)
+        for directory, dirnames, filenames in os.walk(self.root):
+            depth = os.path.abspath(directory).rstrip(os.sep).count(os.sep) - root_depth
+            dirnames[:] = [] if depth >= MAX_DEPTH else sorted(
+                name for name in dirnames
+                if not name.startswith(".") and name not in IGNORED_DIRS)
+            for filename in filenames:
+                if filename == catalog_name or filename.startswith("."):
+                    continue
+                if filename.lower().endswith(DATA_EXTENSIONS):
+                    found.append(self.relative(os.path.join(directory, filename)))
+        return found
+
+    def is_current(self, entry, stat):
+        return entry.get("taille") == stat.st_size and \
+            entry.get("mtime_ns") == stat.st_mtime_ns
+
+    def make_entry(self, stat, description):
+        entry = {
+            "taille": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "modifie_le": datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds"),
+        }
+        entry.update(description)
+        return entry
+
+    def resolve(self, relative):
+        return relative if os.path.isabs(relative) else os.path.join(self.root, relative)
+
+    def refresh(self, discover=True):
+        """
+        Met à jour le catalogue : seuls les fichiers nouveaux ou dont la
+        taille ou la date de modification a changé sont relus
+
+        Args:
+            discover: Chercher de nouveaux fichiers (sinon seulement vérifier
+                      les fichiers déjà catalogués)
+
+        Returns:
+            dict: Entrées {chemin: description}
+        """
+        paths = set(self.entries)
+        if discover:
+            paths.update(self.discover())
+
+        changes = {}
+        removed = []
+        for relative in sorted(paths):
+            try:
+                stat = os.stat(self.resolve(relative))
+            except OSError:
+                # Fichier supprimé
+                removed.append(relative)
+                continue
+            entry = self.entries.get(relative)
+            if entry and self.is_current(entry, stat):
+                continue
+            try:
+                description = describe_file(self.resolve(relative))
+            except (OSError, ValueError, ImportError) as e:
+                description = {"format": "inconnu", "nombre": 0,
+                               "date_min": None, "date_max": None,
+                               "checksum": None, "erreur": str(e)}
+            changes[relative] = self.make_entry(stat, description)
+
+        if changes or removed:
+            self.update(changes, removed)
+        return self.entries
+
+    def register(self, path, **known):
+        """
+        Enregistre un fichier que l'on vient d'écrire
+
+        Args:
+            path: Fichier écrit
+            known: Description déjà connue de l'écrivain (format, nombre...) ;
+                   le fichier n'est relu que si elle est incomplète
+
+        Returns:
+            dict: Entrée du catalogue
+        """
+        stat = os.stat(path)
+        if {"format", "nombre"} <= set(known):
+            description = {"date_min": None, "date_max": None}
+            description.update(known)
+            description.setdefault("checksum", file_digest(path))
+        else:
+            description = describe_file(path)
+            description.update(known)
+        relative = self.relative(path)
+        entry = self.make_entry(stat, description)
+        self.update({relative: entry})
+        return entry
+
+    def data_files(self, formats=LOADABLE_FORMATS):
+        """
+        Fichiers de données disponibles, du plus récent au plus ancien
+
+        Args:
+            formats: Formats retenus (None pour tous)
+
+        Returns:
+            list: Dictionnaires {chemin, format, nombre, date_min, date_max, ...}
+        """
+        entries = self.refresh()
+        files = [dict(entry, chemin=relative) for relative, entry in entries.items()
+                 if formats is None or entry.get("format") in formats]
+        files.sort(key=lambda entry: entry["mtime_ns"], reverse=True)
+        return files
+
+
+def register_file(path, root=".", **known):
+    """
+    Enregistre un fichier écrit dans le catalogue du dossier courant
+
+    Le catalogue n'est qu'un index : une erreur ne doit pas faire échouer
+    l'écriture elle-même.
+    """
+    try:
+        return DataCatalog(root).register(path, **known)
+    except (OSError, ValueError, ImportError) as e:
+        print(f"Catalogue non mis à jour pour {path}: {e}")
+        return None
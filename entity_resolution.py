@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Rapprochement des annonces entre sources (cartes scrapées et API SeLoger)
+Les paires candidates sont générées par blocs (source, quartier, pièces,
+tranche de surface, tranche de prix) pour éviter la comparaison de toutes
+les paires, puis notées
+sur des champs approximatifs. Les doublons sont fusionnés en une annonce enrichie.
+"""
+
+import re
+import unicodedata
+from collections import defaultdict
+
+from listing import FIELDS, Listing, listing_document_id
+
+
+SCRAPED_SOURCE = "scraped"
+
+DISTRICT_PATTERN = re.compile(
+    r'/annonces/locations/[^/]+/[^/]+/([^/?]+)/\d+\.htm')
+WORD_PATTERN = re.compile(r'[a-z0-9]{3,}')
+
+
+def normalize_text(text):
+    """Minuscules sans accents"""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def listing_source(item):
+    """Source d'une annonce ("api_seloger", "scraped"...)"""
+    return item.get('source') or SCRAPED_SOURCE
+
+
+def listing_district(item):
+    """
+    Quartier d'une annonce, déduit du lien pour les cartes scrapées
+
+    Returns:
+        str: Quartier normalisé ("grangier") ou None
+    """
+    district = item.get('district')
+    if not district:
+        match = DISTRICT_PATTERN.search(item.get('lien') or '')
+        district = match.group(1) if match else None
+    return normalize_text(district).replace(' ', '-') if district else None
+
+
+class EntityResolver:
+    """Détection et fusion des annonces identiques entre sources"""
+
+    def __init__(self, surface_step=5, price_step=50, threshold=0.75,
+                 cross_source_only=True):
+        """
+        Args:
+            surface_step: Largeur des tranches de surface (m²)
+            price_step: Largeur des tranches de prix (€)
+            threshold: Score minimal pour fusionner deux annonces
+            cross_source_only: Ne comparer que des annonces de sources différentes
+        """
+        self.surface_step = surface_step
+        self.price_step = price_step
+        self.threshold = threshold
+        self.cross_source_only = cross_source_only
+        self._words = {}
+
+    def block_key(self, item):
+        """
+        Clé de bloc d'une annonce
+
+        Returns:
+            tuple: (pièces, tranche de surface, tranche de prix) ou None si
+            surface et prix sont inconnus
+        """
+        surface = item.get('surface_m2')
+        prix = item.get('prix')
+        if not surface or not prix:
+            return None
+        return (item.get('nombre_pieces') or 0,
+                int(surface // self.surface_step),
+                int(prix // self.price_step))
+
+    def candidate_pairs(self, listings):
+        """
+        Génère les paires candidates
+
+        Une annonce n'est comparée qu'aux annonces d'une autre source situées
+        dans son bloc ou un bloc voisin (tranches de surface et de prix
+        adjacentes) et dans le même quartier lorsqu'il est connu des deux côtés.
+
+        Yields:
+            tuple: (clé_a, clé_b)
+        """
+        order = {}
+        by_district = defaultdict(list)
+        by_block = defaultdict(list)
+        sources = set()
+        for key, item in listings.items():
+            block = self.block_key(item)
+            if block is None:
+                continue
+            source = listing_source(item) if self.cross_source_only else None
+            sources.add(source)
+            order[key] = len(order)
+            by_district[(source, listing_district(item)) + block].append(key)
+            by_block[(source,) + block].append(key)
+
+        sources = sorted(sources, key=str)
+        if self.cross_source_only:
+            source_pairs = [(a, b) for i, a in enumerate(sources)
+                            for b in sources[i + 1:]]
+        else:
+            source_pairs = [(None, None)]
+        offsets = [(d_surface, d_price) for d_surface in (-1, 0, 1)
+                   for d_price in (-1, 0, 1)]
+
+        for source_a, source_b in source_pairs:
+            for (source, district, rooms, surface, price), keys in by_district.items():
+                if source != source_a:
+                    continue
+                for d_surface, d_price in offsets:
+                    block = (rooms, surface + d_surface, price + d_price)
+                    if district is None:
+                        others = by_block.get((source_b,) + block, ())
+                    else:
+                        others = by_district.get((source_b, district) + block, []) + \
+                            by_district.get((source_b, None) + block, [])
+                    for key_a in keys:
+                        for key_b in others:
+                            if source_a == source_b and not self._first_visit(
+                                    order, district, key_a, key_b, listings):
+                                continue
+                            yield key_a, key_b
+
+    @staticmethod
+    def _first_visit(order, district, key_a, key_b, listings):
+        """
+        Sans distinction de source, une paire est rencontrée depuis ses deux
+        annonces : on ne la garde qu'une fois
+        """
+        district_b = listing_district(listings[key_b])
+        if (district is None) != (district_b is None):
+            # Paire quartier connu / inconnu : gardée depuis le quartier connu
+            return district is not None
+        return order[key_a] < order[key_b]
+
+    def words(self, key, item):
+        if key not in self._words:
+            text = ' '.join(str(item.get(field) or '')
+                            for field in ('description', 'titre'))
+            self._words[key] = set(WORD_PATTERN.findall(normalize_text(text)))
+        return self._words[key]
+
+    def score(self, key_a, a, key_b, b):
+        """
+        Score de similarité entre deux annonces (0 à 1)
+        """
+        if listing_document_id(key_a, a) == listing_document_id(key_b, b):
+            return 1.0
+
+        district_a, district_b = listing_district(a), listing_district(b)
+        if district_a and district_b and district_a != district_b:
+            return 0.0
+
+        prix_a, prix_b = a.get('prix'), b.get('prix')
+        surface_a, surface_b = a.get('surface_m2'), b.get('surface_m2')
+        price_score = 1 - min(abs(prix_a - prix_b) / max(prix_a, prix_b), 1)
+        surface_score = 1 - min(abs(surface_a - surface_b) /
+                                max(surface_a, surface_b), 1)
+
+        words_a, words_b = self.words(key_a, a), self.words(key_b, b)
+        union = words_a | words_b
+        text_score = len(words_a & words_b) / len(union) if union else 0.0
+
+        score = 0.3 * price_score + 0.3 * surface_score + 0.4 * text_score
+        if district_a and district_a == district_b:
+            score = min(1.0, score + 0.1)
+        return round(score, 4)
+
+    def find_matches(self, listings):
+        """
+        Associe les annonces deux à deux (au plus un partenaire par annonce)
+
+        Returns:
+            list: Tuples (clé_a, clé_b, score) par score décroissant
+        """
+        scored = []
+
+        # Identifiant SeLoger commun (extrait du lien pour les cartes scrapées)
+        by_id = defaultdict(list)
+        for key, item in listings.items():
+            by_id[listing_document_id(key, item)].append(key)
+        for keys in by_id.values():
+            for key_a, key_b in zip(keys, keys[1:]):
+                scored.append((1.0, key_a, key_b))
+
+        for key_a, key_b in self.candidate_pairs(listings):
+            score = self.score(key_a, listings[key_a], key_b, listings[key_b])
+            if score >= self.threshold:
+                scored.append((score, key_a, key_b))
+
+        scored.sort(reverse=True)
+        matched = set()
+        matches = []
+        for score, key_a, key_b in scored:
+            if key_a in matched or key_b in matched:
+                continue
+            matched.update((key_a, key_b))
+            matches.append((key_a, key_b, score))
+        return matches
+
+    def merge(self, a, b):
+        """
+        Fusionne deux annonces : la plus riche sert de base, les champs
+        manquants sont complétés par l'autre
+
+        Returns:
+            Listing: Annonce enrichie
+        """
+        a, b = Listing.from_dict(a), Listing.from_dict(b)
+        if listing_source(b) != SCRAPED_SOURCE and listing_source(a) == SCRAPED_SOURCE:
+            a, b = b, a
+
+        merged = Listing.from_dict(a.to_dict())
+        for field in FIELDS:
+            if getattr(merged, field) in (None, '', ()) and getattr(b, field) not in (None, '', ()):
+                merged[field] = getattr(b, field)
+        merged.colocation = a.colocation or b.colocation
+        merged.studio = a.studio or b.studio
+        merged['sources'] = sorted({listing_source(a), listing_source(b)})
+        merged['liens'] = [lien for lien in (a.lien, b.lien) if lien]
+        return merged
+
+    def resolve(self, listings):
+        """
+        Fusionne les doublons d'un ensemble d'annonces
+
+        Args:
+            listings: Dictionnaire {clé: annonce}
+
+        Returns:
+            tuple: (annonces dédoublonnées {clé: annonce}, correspondances)
+        """
+        self._words = {}
+        matches = self.find_matches(listings)
+        merged_into = {}
+        for key_a, key_b, _ in matches:
+            merged_into[key_b] = key_a
+
+        resolved = {}
+        partners = {key_a: key_b for key_a, key_b, _ in matches}
+        for key, item in listings.items():
+            if key in merged_into:
+                continue
+            if key in partners:
+                resolved[key] = self.merge(item, listings[partners[key]])
+            else:
+                resolved[key] = item
+        return resolved, matches
@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Écriture en flux des résultats triés
+Formats : JSON (structure historique, compacte), JSON Lines, CSV et un format
+binaire en colonnes. Chaque annonce est écrite dès qu'elle est parcourue,
+avec compression gzip ou zstd optionnelle.
+"""
+
+import csv
+import gzip
+import io
+import json
+import math
+import struct
+from datetime import datetime
+
+from listing import as_dict
+
+try:
+    import zstandard
+except ImportError:  # zstd est optionnel
+    zstandard = None
+
+
+FORMATS = ("json", "jsonl", "csv", "columnar")
+
+EXTENSIONS = {
+    ".json": "json",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".csv": "csv",
+    ".msac": "columnar",
+}
+
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+
+# Colonnes des formats tabulaires (CSV, colonnes)
+CSV_COLUMNS = ("cle", "statut", "lien", "type", "prix", "localisation",
+               "surface_m2", "nombre_pieces", "specificite", "colocation",
+               "studio", "raison", "description")
+
+COLUMNAR_MAGIC = b"MSAC"
+COLUMNAR_VERSION = 1
+COLUMNAR_ROW_GROUP = 4096
+
+# Types de colonnes du format binaire : flottant, booléen, texte
+COLUMN_TYPES = {
+    "prix": "f",
+    "surface_m2": "f",
+    "nombre_pieces": "f",
+    "colocation": "b",
+    "studio": "b",
+}
+
+
+def detect_format(filename):
+    """
+    Détermine le format et la compression d'après l'extension du fichier
+
+    Returns:
+        tuple: (format, compression ou None)
+    """
+    name = filename.lower()
+    compression = None
+    for suffix, kind in COMPRESSIONS.items():
+        if name.endswith(suffix):
+            compression = kind
+            name = name[:-len(suffix)]
+            break
+
+    for suffix, fmt in EXTENSIONS.items():
+        if name.endswith(suffix):
+            return fmt, compression
+    return "json", compression
+
+
+def open_output(filename, compression=None, binary=False):
+    """
+    Ouvre le fichier de sortie, éventuellement compressé
+
+    Args:
+        filename: Chemin du fichier
+        compression: None, "gzip" ou "zstd"
+        binary: Flux binaire plutôt que texte
+    """
+    if compression == "gzip":
+        raw = gzip.open(filename, "wb", compresslevel=6)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise ImportError(
+                "La compression zstd nécessite le paquet 'zstandard'")
+        raw = zstandard.ZstdCompressor(level=3).stream_writer(
+            open(filename, "wb"), closefd=True)
+    elif compression is None:
+        raw = open(filename, "wb")
+    else:
+        raise ValueError(f"Compression inconnue: {compression}")
+
+    if binary:
+        return raw
+    return io.TextIOWrapper(raw, encoding="utf-8", newline="")
+
+
+def open_input(filename, compression=None, binary=False):
+    """
+    Ouvre un fichier exporté en lecture (décompression transparente)
+    """
+    if compression is None:
+        compression = detect_format(filename)[1]
+
+    if compression == "gzip":
+        raw = gzip.open(filename, "rb")
+    elif compression == "zstd":
+        if zstandard is None:
+            raise ImportError(
+                "La décompression zstd nécessite le paquet 'zstandard'")
+        raw = zstandard.ZstdDecompressor().stream_reader(
+            open(filename, "rb"), closefd=True)
+    else:
+        raw = open(filename, "rb")
+
+    if binary:
+        return raw
+    return io.TextIOWrapper(raw, encoding="utf-8", newline="")
+
+
+def listing_reason(item):
+    """Raison de validation ou de rejet d'une annonce"""
+    return item.get("rejection_reason") or item.get("validation_reason") or ""
+
+
+def listing_row(key, item, statut):
+    """
+    Aplatit une annonce pour les formats tabulaires
+
+    Returns:
+        dict: {colonne: valeur}
+    """
+    return {
+        "cle": key,
+        "statut": statut,
+        "lien": item.get("lien") or "",
+        "type": item.get("type") or "",
+        "prix": item.get("prix"),
+        "localisation": item.get("localisation") or "",
+        "surface_m2": item.get("surface_m2"),
+        "nombre_pieces": item.get("nombre_pieces"),
+        "specificite": " | ".join(str(s) for s in item.get("specificite") or []),
+        "colocation": bool(item.get("colocation")),
+        "studio": bool(item.get("studio")),
+        "raison": listing_reason(item),
+        "description": item.get("description") or "",
+    }
+
+
+class JsonWriter:
+    """
+    Structure JSON historique de exportResults, écrite en flux et sans indentation
+
+    Les annonces doivent être fournies groupées par statut (valides puis rejetées).
+    """
+
+    SECTIONS = {"valide": "annonces_valides", "rejetee": "annonces_rejetees"}
+
+    def __init__(self, stream, stats=None, metadata=None):
+        self.stream = stream
+        self.metadata = metadata or {}
+        self.section = None
+        self.first = True
+        self.done_sections = []
+        stream.write('{"statistiques":')
+        stream.write(json.dumps(stats or {}, ensure_ascii=False))
+
+    def open_section(self, statut):
+        if self.section is not None:
+            self.stream.write("}")
+        self.section = statut
+        self.done_sections.append(statut)
+        self.first = True
+        self.stream.write(f',"{self.SECTIONS[statut]}":{{')
+
+    def write(self, key, item, statut):
+        if statut != self.section:
+            if statut in self.done_sections:
+                raise ValueError(
+                    "Les annonces doivent être groupées par statut")
+            self.open_section(statut)
+        if not self.first:
+            self.stream.write(",")
+        self.first = False
+        self.stream.write(json.dumps(str(key), ensure_ascii=False))
+        self.stream.write(":")
+        self.stream.write(json.dumps(as_dict(item), ensure_ascii=False))
+
+    def close(self):
+        if self.section is not None:
+            self.stream.write("}")
+        for statut, section in self.SECTIONS.items():
+            if statut not in self.done_sections:
+                self.stream.write(f',"{section}":{{}}')
+        self.stream.write(',"metadata":')
+        self.stream.write(json.dumps(self.metadata, ensure_ascii=False))
+        self.stream.write("}")
+
+
+class JsonLinesWriter:
+    """Une annonce JSON compacte par ligne"""
+
+    def __init__(self, stream, stats=None, metadata=None):
+        self.stream = stream
+
+    def write(self, key, item, statut):
+        record = {"cle": key, "statut": statut}
+        record.update(as_dict(item))
+        self.stream.write(json.dumps(
+            record, ensure_ascii=False, separators=(",", ":")))
+        self.stream.write("\n")
+
+    def close(self):
+        pass
+
+
+class CsvWriter:
+    """Export CSV à colonnes fixes (CSV_COLUMNS)"""
+
+    def __init__(self, stream, stats=None, metadata=None):
+        self.writer = csv.DictWriter(stream, fieldnames=CSV_COLUMNS)
+        self.writer.writeheader()
+
+    def write(self, key, item, statut):
+        row = listing_row(key, item, statut)
+        for column in ("prix", "surface_m2", "nombre_pieces"):
+            if row[column] is None:
+                row[column] = ""
+        self.writer.writerow(row)
+
+    def close(self):
+        pass
+
+
+class ColumnarWriter:
+    """
+    Format binaire en colonnes, écrit par groupes de lignes
+
+    Structure : en-tête (MSAC, version, schéma) puis une suite de groupes de
+    lignes. Chaque colonne d'un groupe est un bloc contigu : float64 (NaN si
+    absent), octets pour les booléens, offsets uint32 + tas UTF-8 pour le texte.
+    Seul le groupe courant est gardé en mémoire.
+    """
+
+    def __init__(self, stream, stats=None, metadata=None, row_group=COLUMNAR_ROW_GROUP):
+        self.stream = stream
+        self.row_group = row_group
+        self.buffer = {column: [] for column in CSV_COLUMNS}
+        self.rows = 0
+
+        schema = json.dumps({
+            "colonnes": [[column, COLUMN_TYPES.get(column, "s")] for column in CSV_COLUMNS],
+            "statistiques": stats or {},
+            "metadata": metadata or {},
+        }, ensure_ascii=False).encode("utf-8")
+        stream.write(COLUMNAR_MAGIC)
+        stream.write(struct.pack("<HI", COLUMNAR_VERSION, len(schema)))
+        stream.write(schema)
+
+    def write(self, key, item, statut):
+        row = listing_row(key, item, statut)
+        for column in CSV_COLUMNS:
+            self.buffer[column].append(row[column])
+        self.rows += 1
+        if self.rows >= self.row_group:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        self.stream.write(struct.pack("<I", self.rows))
+        for column in CSV_COLUMNS:
+            values = self.buffer[column]
+            kind = COLUMN_TYPES.get(column, "s")
+            if kind == "f":
+                payload = struct.pack(f"<{len(values)}d", *(
+                    float(v) if v not in (None, "") else math.nan for v in values))
+            elif kind == "b":
+                payload = bytes(1 if v else 0 for v in values)
+            else:
+                encoded = [str(v).encode("utf-8") for v in values]
+                offsets = [0]
+                for chunk in encoded:
+                    offsets.append(offsets[-1] + len(chunk))
+                payload = struct.pack(
+                    f"<{len(offsets)}I", *offsets) + b"".join(encoded)
+            self.stream.write(struct.pack("<I", len(payload)))
+            self.stream.write(payload)
+            values.clear()
+        self.rows = 0
+
+    def close(self):
+        self.flush()
+
+
+WRITERS = {
+    "json": (JsonWriter, False),
+    "jsonl": (JsonLinesWriter, False),
+    "csv": (CsvWriter, False),
+    "columnar": (ColumnarWriter, True),
+}
+
+
+def iter_sorted(valid, rejected):
+    """
+    Parcourt les annonces valides puis rejetées
+
+    Yields:
+        tuple: (clé, annonce, statut)
+    """
+    for key, item in valid.items():
+        yield key, item, "valide"
+    for key, item in rejected.items():
+        yield key, item, "rejetee"
+
+
+def export_listings(filename, listings, fmt=None, compression=None, stats=None, metadata=None,
+                    register=False):
+    """
+    Exporte en flux une suite d'annonces
+
+    Les exports JSON et JSON Lines (compressés ou non) se rechargent avec
+    SortScrapSearch ; CSV et colonnes sont des formats d'export seulement.
+
+    Args:
+        filename: Fichier de sortie (format/compression déduits de l'extension)
+        listings: Itérable de tuples (clé, annonce, statut)
+        fmt: Format forcé ("json", "jsonl", "csv", "columnar")
+        compression: Compression forcée (None, "gzip", "zstd")
+        stats: Statistiques à inclure (JSON et colonnes)
+        metadata: Métadonnées à inclure (JSON et colonnes)
+        register: Inscrire le fichier au catalogue des données
+                  (catalogue_donnees.json), pour les appelants qui
+                  présentent l'export à l'utilisateur
+
+    Returns:
+        int: Nombre d'annonces écrites
+    """
+    detected_fmt, detected_compression = detect_format(filename)
+    fmt = fmt or detected_fmt
+    compression = compression or detected_compression
+    if fmt not in WRITERS:
+        raise ValueError(f"Format d'export inconnu: {fmt}")
+
+    writer_class, binary = WRITERS[fmt]
+    count = 0
+    with open_output(filename, compression, binary=binary) as stream:
+        writer = writer_class(stream, stats=stats, metadata=metadata)
+        for key, item, statut in listings:
+            writer.write(key, item, statut)
+            count += 1
+        writer.close()
+
+    if register:
+        # Import local : data_catalog dépend de ce module
+        from data_catalog import register_file
+        register_file(filename, format="resultats" if fmt == "json" else fmt,
+                      nombre=count)
+    return count
+
+
+def export_sorted(filename, valid, rejected, stats=None, fmt=None, compression=None,
+                  register=False):
+    """
+    Exporte des résultats triés (annonces valides et rejetées)
+
+    Args:
+        register: Inscrire le fichier au catalogue des données (voir
+                  export_listings)
+
+    Returns:
+        int: Nombre d'annonces écrites
+    """
+    metadata = {
+        "date_traitement": datetime.now().isoformat(),
+        "nombre_total": len(valid) + len(rejected),
+    }
+    return export_listings(filename, iter_sorted(valid, rejected), fmt=fmt,
+                           compression=compression, stats=stats, metadata=metadata,
+                           register=register)
+
+
+def _read_exact(stream, size):
+    """Lit exactement size octets (les flux décompressés peuvent lire moins)"""
+    chunks = []
+    while size > 0:
+        chunk = stream.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_columnar(filename, compression=None):
+    """
+    Relit un fichier au format colonnes
+
+    Yields:
+        dict: Une ligne par annonce
+    """
+    with open_input(filename, compression, binary=True) as stream:
+        if _read_exact(stream, 4) != COLUMNAR_MAGIC:
+            raise ValueError(f"{filename} n'est pas un fichier MSAC")
+        version, schema_size = struct.unpack("<HI", _read_exact(stream, 6))
+        if version != COLUMNAR_VERSION:
+            raise ValueError(f"Version MSAC non supportée: {version}")
+        columns = json.loads(_read_exact(stream, schema_size))["colonnes"]
+
+        while True:
+            header = _read_exact(stream, 4)
+            if len(header) < 4:
+                return
+            rows = struct.unpack("<I", header)[0]
+            data = {}
+            for name, kind in columns:
+                size = struct.unpack("<I", _read_exact(stream, 4))[0]
+                payload = _read_exact(stream, size)
+                if kind == "f":
+                    values = [None if math.isnan(v) else v
+                              for v in struct.unpack(f"<{rows}d", payload)]
+                elif kind == "b":
+                    values = [bool(b) for b in payload]
+                else:
+                    offsets = struct.unpack_from(f"<{rows + 1}I", payload)
+                    heap = payload[4 * (rows + 1):]
+                    values = [heap[offsets[i]:offsets[i + 1]].decode("utf-8")
+                              for i in range(rows)]
+                data[name] = values
+            for i in range(rows):
+                yield {name: data[name][i] for name, _ in columns}
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Index géospatial des annonces (KD-tree)
+Permet les recherches "annonces à moins de X km" et "k plus proches" sans
+parcourir toute la liste des annonces.
+"""
+
+import heapq
+import math
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_cartesian(lat, lon):
+    """
+    Convertit des coordonnées GPS en point sur la sphère unité
+
+    Args:
+        lat: Latitude en degrés
+        lon: Longitude en degrés
+
+    Returns:
+        tuple: Coordonnées (x, y, z)
+    """
+    lat_rad = math.radians(lat)
+    lon_rad = math.radians(lon)
+    cos_lat = math.cos(lat_rad)
+    return (cos_lat * math.cos(lon_rad), cos_lat * math.sin(lon_rad), math.sin(lat_rad))
+
+
+def km_to_chord(distance_km):
+    """
+    Convertit une distance orthodromique en longueur de corde sur la sphère unité
+    """
+    angle = min(distance_km / EARTH_RADIUS_KM, math.pi)
+    return 2 * math.sin(angle / 2)
+
+
+def chord_to_km(chord):
+    """
+    Convertit une longueur de corde sur la sphère unité en distance en km
+    """
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Distance orthodromique entre deux points GPS
+
+    Returns:
+        float: Distance en km
+    """
+    p1 = to_cartesian(lat1, lon1)
+    p2 = to_cartesian(lat2, lon2)
+    return chord_to_km(math.dist(p1, p2))
+
+
+def get_coordinates(item):
+    """
+    Extrait les coordonnées d'une annonce
+
+    Args:
+        item: Annonce normalisée
+
+    Returns:
+        tuple: (latitude, longitude) ou None si absentes/invalides
+    """
+    lat = item.get('latitude')
+    lon = item.get('longitude')
+    if lat in (None, '') or lon in (None, ''):
+        return None
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+class GeoIndex:
+    """KD-tree sur la sphère unité pour les requêtes de proximité"""
+
+    def __init__(self, points=None, leaf_size=16):
+        """
+        Construit l'index
+
+        Args:
+            points: Itérable de tuples (clé, latitude, longitude)
+            leaf_size: Nombre maximal de points par feuille
+        """
+        self.leaf_size = max(1, leaf_size)
+        self.keys = []
+        self.coords = []
+
+        for key, lat, lon in points or []:
+            self.keys.append(key)
+            self.coords.append(to_cartesian(lat, lon))
+
+        self.root = self._build(list(range(len(self.coords))))
+
+    @classmethod
+    def from_listings(cls, listings, leaf_size=16):
+        """
+        Construit l'index à partir d'un dictionnaire d'annonces
+
+        Les annonces sans coordonnées sont ignorées.
+
+        Args:
+            listings: Dictionnaire {clé: annonce}
+        """
+        points = []
+        for key, item in listings.items():
+            coords = get_coordinates(item)
+            if coords:
+                points.append((key, coords[0], coords[1]))
+        return cls(points, leaf_size=leaf_size)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _build(self, indices):
+        """
+        Construit récursivement l'arbre
+
+        Une feuille est une liste d'indices, un nœud interne un tuple
+        (dimension, valeur de coupe, fils gauche, fils droit).
+        """
+        if len(indices) <= self.leaf_size:
+            return indices
+
+        # Couper selon la dimension la plus étalée
+        coords = self.coords
+        spreads = []
+        for dim in range(3):
+            values = [coords[i][dim] for i in indices]
+            spreads.append(max(values) - min(values))
+        dim = spreads.index(max(spreads))
+        if spreads[dim] == 0:
+            return indices
+
+        indices.sort(key=lambda i: coords[i][dim])
+        middle = len(indices) // 2
+        split = coords[indices[middle]][dim]
+        return (dim, split, self._build(indices[:middle]), self._build(indices[middle:]))
+
+    def within_radius(self, lat, lon, radius_km):
+        """
+        Annonces à moins de radius_km d'un point
+
+        Args:
+            lat: Latitude du point
+            lon: Longitude du point
+            radius_km: Rayon en km
+
+        Returns:
+            list: Tuples (clé, distance_km) triés par distance croissante
+        """
+        query = to_cartesian(lat, lon)
+        radius = km_to_chord(radius_km)
+        found = []
+
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                for i in node:
+                    chord = math.dist(query, self.coords[i])
+                    if chord <= radius:
+                        found.append((self.keys[i], chord_to_km(chord)))
+                continue
+
+            dim, split, left, right = node
+            delta = query[dim] - split
+            if delta <= radius:
+                stack.append(left)
+            if delta >= -radius:
+                stack.append(right)
+
+        found.sort(key=lambda entry: entry[1])
+        return found
+
+    def within_radius_of_any(self, points, radius_km):
+        """
+        Annonces à moins de radius_km d'au moins un des points
+
+        Args:
+            points: Liste de tuples (latitude, longitude)
+            radius_km: Rayon en km
+
+        Returns:
+            dict: {clé: distance_km au point le plus proche}
+        """
+        distances = {}
+        for lat, lon in points:
+            for key, distance in self.within_radius(lat, lon, radius_km):
+                if key not in distances or distance < distances[key]:
+                    distances[key] = distance
+        return distances
+
+    def nearest(self, lat, lon, k=1):
+        """
+        k annonces les plus proches d'un point
+
+        Args:
+            lat: Latitude du point
+            lon: Longitude du point
+            k: Nombre d'annonces à retourner
+
+        Returns:
+            list: Tuples (clé, distance_km) triés par distance croissante
+        """
+        if k <= 0 or not self.keys:
+            return []
+
+        query = to_cartesian(lat, lon)
+        # Tas max (distances négatives) des k meilleurs candidats
+        best = []
+
+        def visit(node):
+            if isinstance(node, list):
+                for i in node:
+                    chord = math.dist(query, self.coords[i])
+                    if len(best) < k:
+                        heapq.heappush(best, (-chord, i))
+                    elif chord < -best[0][0]:
+                        heapq.heapreplace(best, (-chord, i))
+                return
+
+            dim, split, left, right = node
+            delta = query[dim] - split
+            near, far = (left, right) if delta < 0 else (right, left)
+            visit(near)
+            if len(best) < k or abs(delta) < -best[0][0]:
+                visit(far)
+
+        visit(self.root)
+        return [(self.keys[i], chord_to_km(-neg_chord))
+                for neg_chord, i in sorted(best, reverse=True)]
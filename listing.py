@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Représentation compacte d'une annonce normalisée
+Les annonces sont stockées dans des objets à __slots__ (pas de dictionnaire
+par instance), avec des champs numériques typés, des chaînes catégorielles
+internées et un statut de tri encodé en entier.
+"""
+
+import re
+import sys
+from collections import deque
+from collections.abc import Mapping
+from enum import IntEnum, IntFlag
+
+
+class Status(IntEnum):
+    """Statut de tri d'une annonce"""
+    A_TRIER = 0
+    VALIDE = 1
+    REJETEE = 2
+
+
+class Rejet(IntFlag):
+    """Motifs de rejet (combinables)"""
+    COLOCATION = 1
+    STUDIO = 2
+    PRIX = 4
+    SURFACE = 8
+    DISTANCE = 16
+
+
+REJECTION_LABELS = {
+    Rejet.COLOCATION: "colocation",
+    Rejet.STUDIO: "studio",
+    Rejet.PRIX: "prix invalide",
+    Rejet.SURFACE: "surface invalide",
+    Rejet.DISTANCE: "trop éloigné",
+}
+
+VALIDATION_LABEL = "Critères respectés"
+
+
+class Equipement(IntFlag):
+    """Équipements d'une annonce (combinables)"""
+    BALCON = 1
+    TERRASSE = 2
+    JARDIN = 4
+    PARKING = 8
+    ASCENSEUR = 16
+    MEUBLE = 32
+
+
+# Libellés tels qu'ils apparaissent dans les spécificités et les tags
+AMENITY_LABELS = {
+    Equipement.BALCON: "Balcon",
+    Equipement.TERRASSE: "Terrasse",
+    Equipement.JARDIN: "Jardin",
+    Equipement.PARKING: "Parking",
+    Equipement.ASCENSEUR: "Ascenseur",
+    Equipement.MEUBLE: "Meublé",
+}
+
+# Champs exposés, dans l'ordre du format historique
+FIELDS = (
+    'id', 'lien', 'type', 'prix', 'localisation', 'specificite', 'description',
+    'titre', 'caracteristiques', 'charges', 'surface_m2', 'nombre_pieces',
+    'nombre_chambres', 'etage', 'etage_max', 'colocation', 'studio',
+    'annonce_id', 'latitude', 'longitude', 'insee_code', 'postal_code',
+    'district', 'dpe', 'ges', 'equipements', 'distance_km', 'source',
+    'date_scraping',
+)
+
+# Chaînes très répétées d'une annonce à l'autre : une seule copie en mémoire
+INTERNED_FIELDS = frozenset(('type', 'localisation', 'insee_code',
+                             'postal_code', 'district', 'dpe', 'ges', 'source'))
+FLOAT_FIELDS = frozenset(('latitude', 'longitude', 'distance_km'))
+NUMBER_FIELDS = frozenset(('prix', 'charges', 'surface_m2', 'nombre_pieces',
+                           'nombre_chambres', 'etage', 'etage_max'))
+BOOL_FIELDS = frozenset(('colocation', 'studio'))
+
+# Champs toujours présents dans la représentation dictionnaire
+CORE_FIELDS = frozenset(('lien', 'type', 'prix', 'localisation',
+                         'specificite', 'description', 'colocation', 'studio'))
+
+# Champs du format historique calculés à partir du statut
+DERIVED_FIELDS = ('validation_reason', 'rejection_reason')
+
+# Ancien marqueur jamais renseigné, remplacé par le statut
+IGNORED_FIELDS = frozenset(('VALIDE',))
+
+
+def _intern(value):
+    if value is None or value == '':
+        return None
+    return sys.intern(str(value))
+
+
+def _number(value):
+    """Convertit en int si la valeur est entière, sinon en float"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        return parse_number(value)
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def parse_number(text):
+    """
+    Extrait le premier nombre d'un texte ("1 200,50 €" -> 1200.5)
+
+    Utilisé une seule fois, à la normalisation des données textuelles.
+
+    Returns:
+        int, float ou None
+    """
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        return _number(text)
+    match = NUMBER_PATTERN.search(str(text))
+    if not match:
+        return None
+    digits = re.sub(r'[\s\u00a0\u202f]', '', match.group(1)).replace(',', '.')
+    return _number(float(digits))
+
+
+def parse_specificites(specificites):
+    """
+    Extrait les valeurs numériques des spécificités textuelles d'une annonce
+
+    Args:
+        specificites: Liste du type ["2 pièces", "1 chambre", "42 m²", "Étage 3/6"]
+
+    Returns:
+        dict: {surface_m2, nombre_pieces, nombre_chambres, etage, etage_max}
+    """
+    values = {}
+    for spec in specificites or ():
+        spec = str(spec)
+        for field, pattern in SPEC_PATTERNS:
+            if field in values:
+                continue
+            match = pattern.search(spec)
+            if match:
+                values[field] = parse_number(match.group(1))
+                if field == 'etage':
+                    if match.group(1).upper() == 'RDC':
+                        values[field] = 0
+                    if match.group(2):
+                        values['etage_max'] = parse_number(match.group(2))
+                break
+    return values
+
+
+def parse_amenities(specificites, type_bien=None):
+    """
+    Équipements cités dans les spécificités textuelles d'une annonce
+
+    Args:
+        specificites: Liste du type ["2 pièces", "Balcon", "Ascenseur"]
+        type_bien: Type de bien ("Appartement meublé" -> Equipement.MEUBLE)
+
+    Returns:
+        Equipement: Combinaison des équipements trouvés
+    """
+    flags = Equipement(0)
+    labels = {str(spec).strip().lower() for spec in specificites or ()}
+    for flag, label in AMENITY_LABELS.items():
+        if label.lower() in labels:
+            flags |= flag
+    if type_bien and 'meubl' in str(type_bien).lower():
+        flags |= Equipement.MEUBLE
+    return flags
+
+
+def format_price(value):
+    """Formate un prix pour l'affichage ("550 €", "N/A" si absent)"""
+    if value is None or value == '':
+        return "N/A"
+    if isinstance(value, str):
+        return value
+    return f"{int(value)} €" if float(value).is_integer() else f"{value:.2f} €"
+
+
+def format_surface(value):
+    """Formate une surface pour l'affichage ("42 m²", "N/A" si absente)"""
+    if value is None or value == '':
+        return "N/A"
+    return f"{round(value)} m²"
+
+
+NUMBER_PATTERN = re.compile(r'(\d[\d\s\u00a0\u202f]*(?:[.,]\d+)?)')
+
+SPEC_PATTERNS = (
+    ('surface_m2', re.compile(r'(\d+(?:[.,]\d+)?)\s*m²')),
+    ('nombre_pieces', re.compile(r'(\d+)\s*pièce')),
+    ('nombre_chambres', re.compile(r'(\d+)\s*chambre')),
+    ('etage', re.compile(r'Étage\s*(\d+|RDC)(?:\s*/\s*(\d+))?', re.IGNORECASE)),
+)
+
+
+def coerce_field(name, value):
+    """
+    Convertit une valeur vers le type du champ
+
+    Args:
+        name: Nom du champ
+        value: Valeur brute
+
+    Returns:
+        Valeur typée
+    """
+    if name in INTERNED_FIELDS:
+        return _intern(value)
+    if name in FLOAT_FIELDS:
+        return float(value) if value not in (None, '') else None
+    if name in NUMBER_FIELDS:
+        return _number(value)
+    if name in BOOL_FIELDS:
+        return bool(value)
+    if name == 'specificite':
+        return tuple(sys.intern(str(s)) for s in value or ())
+    if name == 'equipements':
+        return int(value) or None if value else None
+    return value
+
+
+class Listing(Mapping):
+    """
+    Annonce normalisée à empreinte mémoire réduite
+
+    Se comporte comme un dictionnaire en lecture (get, [], items...) pour rester
+    compatible avec le code existant ; to_dict() produit le format historique.
+    """
+
+    __slots__ = FIELDS + ('status', 'rejection', 'extra')
+
+    def __init__(self, **fields):
+        for name in FIELDS:
+            object.__setattr__(self, name, None)
+        self.colocation = False
+        self.studio = False
+        self.specificite = ()
+        self.status = Status.A_TRIER
+        self.rejection = 0
+        self.extra = None
+        for name, value in fields.items():
+            self[name] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Construit une annonce depuis un dictionnaire au format normalisé
+
+        Les motifs de validation/rejet éventuellement présents sont relus.
+        """
+        if isinstance(data, Listing):
+            return data
+
+        listing = cls()
+        for name, value in data.items():
+            if name == 'rejection_reason':
+                listing.mark_rejected(parse_rejection(value))
+            elif name == 'validation_reason':
+                listing.mark_valid()
+            elif name not in IGNORED_FIELDS:
+                listing[name] = value
+        return listing
+
+    def mark_valid(self):
+        """Marque l'annonce comme valide"""
+        self.status = Status.VALIDE
+        self.rejection = 0
+
+    def mark_rejected(self, reasons):
+        """
+        Marque l'annonce comme rejetée
+
+        Args:
+            reasons: Combinaison de Rejet
+        """
+        self.status = Status.REJETEE
+        self.rejection = int(reasons)
+
+    @property
+    def rejection_reasons(self):
+        """Liste des libellés des motifs de rejet"""
+        return [label for flag, label in REJECTION_LABELS.items()
+                if self.rejection & flag]
+
+    @property
+    def amenities(self):
+        """Liste des libellés des équipements"""
+        return [label for flag, label in AMENITY_LABELS.items()
+                if (self.equipements or 0) & flag]
+
+    def _derived(self, name):
+        if name == 'validation_reason' and self.status == Status.VALIDE:
+            return VALIDATION_LABEL
+        if name == 'rejection_reason' and self.status == Status.REJETEE:
+            return ", ".join(self.rejection_reasons)
+        return None
+
+    def __getitem__(self, name):
+        if name in FIELDS:
+            value = getattr(self, name)
+            if value is not None or name in CORE_FIELDS:
+                return value
+        elif name in DERIVED_FIELDS:
+            value = self._derived(name)
+            if value is not None:
+                return value
+        elif self.extra and name in self.extra:
+            return self.extra[name]
+        raise KeyError(name)
+
+    def __setitem__(self, name, value):
+        if name in FIELDS:
+            setattr(self, name, coerce_field(name, value))
+        elif name not in DERIVED_FIELDS:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[name] = value
+
+    def __iter__(self):
+        for name in FIELDS:
+            if name in CORE_FIELDS or getattr(self, name) is not None:
+                yield name
+        for name in DERIVED_FIELDS:
+            if self._derived(name) is not None:
+                yield name
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Listing({self.to_dict()!r})"
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for setter, value in zip(_SLOT_SETTERS, state):
+            setter(self, value)
+
+    def to_dict(self):
+        """
+        Représentation dictionnaire au format historique (export JSON)
+        """
+        data = dict(self.items())
+        data['specificite'] = list(self.specificite)
+        return data
+
+
+# Accès directs aux slots (sans passer par __setitem__ et sa conversion)
+_SLOT_SETTERS = tuple(Listing.__dict__[name].__set__ for name in Listing.__slots__)
+
+
+def pack_listings(listings):
+    """
+    Met un ensemble d'annonces sous forme de colonnes (une liste par slot)
+
+    Les colonnes de valeurs simples se sérialisent bien plus vite qu'un objet
+    par annonce.
+
+    Args:
+        listings: Dictionnaire {clé: Listing}
+
+    Returns:
+        tuple: (clés, {slot: valeurs})
+    """
+    items = list(listings.values())
+    columns = {name: [getattr(item, name) for item in items]
+               for name in Listing.__slots__}
+    return list(listings), columns
+
+
+def unpack_listings(keys, columns):
+    """
+    Reconstruit les annonces produites par pack_listings
+
+    Returns:
+        dict: {clé: Listing}
+    """
+    items = [Listing.__new__(Listing) for _ in keys]
+    for name, setter in zip(Listing.__slots__, _SLOT_SETTERS):
+        # map() sur un descripteur de slot : affectation sans boucle Python
+        deque(map(setter, items, columns[name]), maxlen=0)
+    return dict(zip(keys, items))
+
+
+def parse_rejection(reason):
+    """
+    Convertit un motif de rejet textuel ("colocation, studio") en Rejet
+    """
+    flags = 0
+    labels = [part.strip() for part in str(reason or '').split(',')]
+    for flag, label in REJECTION_LABELS.items():
+        if label in labels:
+            flags |= flag
+    return Rejet(flags)
+
+
+def listing_document_id(key, item):
+    """
+    Identifiant stable d'une annonce d'un crawl à l'autre
+
+    Les clés des fichiers scrapés ("0", "1", ...) ne sont pas uniques d'un
+    crawl à l'autre : on privilégie l'identifiant SeLoger, éventuellement
+    extrait du lien, puis le lien lui-même.
+    """
+    annonce_id = item.get('annonce_id')
+    if annonce_id:
+        return str(annonce_id)
+    lien = item.get('lien') or ''
+    match = re.search(r'/(\d+)\.htm', lien)
+    if match:
+        return match.group(1)
+    return lien or str(key)
+
+
+def as_dict(item):
+    """Retourne la représentation dictionnaire d'une annonce"""
+    if isinstance(item, Listing):
+        return item.to_dict()
+    return item
@@ -1,56 +1,79 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
 import os
 import sys
 import json
 import tkinter as tk
 from tkinter import messagebox, ttk
-from scrapImmo import ImmoScrap
-from SortScrapSearch import SortScrapSearch
-from gui import App
-from scrapy.crawler import CrawlerProcess
-import threading
-import time
+from listing import Listing, format_price
+
+# Scrapy (et Twisted), l'index plein texte et l'export ne sont importés que
+# sur les chemins qui les utilisent : la consultation des données existantes
+# démarre sans les charger (voir bench_startup.py)
 
 
 class MainController:
-    def __init__(self):
+    def __init__(self, max_pages=None):
+        """
+        Args:
+            max_pages: Nombre maximal de pages crawlées (None : valeur par
+                       défaut du spider)
+        """
+        self.max_pages = max_pages
         self.current_data = {}
         self.sorted_data = {}
 
-    def run_scraper(self):
-        """Lance le scraper et retourne les données"""
-        print("Démarrage du scraping...")
+    def finalize_crawl(self, sorter, source='res.json'):
+        """
+        Met à jour les données dérivées (catalogue, index plein texte,
+        historique des prix, archive, cube, instantané) avec les annonces
+        reçues par le pipeline, déjà normalisées et triées
+
+        Args:
+            sorter: SortScrapSearch alimenté par le pipeline
+            source: Fichier de résultats écrit par le spider
+
+        Returns:
+            bool: True si le crawl a été indexé
+        """
+        listings = sorter.search
+        if not listings:
+            print("Aucune annonce reçue : données dérivées inchangées")
+            return False
+
         try:
-            # Configuration du processus Scrapy
-            process = CrawlerProcess(settings={
-                'LOG_LEVEL': 'WARNING',  # Réduit les logs
-                'FEEDS': {
-                    'res.json': {
-                        'format': 'json',
-                        'encoding': 'utf8',
-                        'overwrite': True,
-                    },
-                },
-            })
-
-            process.crawl(ImmoScrap)
-            process.start()
-
-            # Charger les données scrapées
-            if os.path.exists('res.json'):
-                with open('res.json', 'r', encoding='utf-8') as f:
-                    self.current_data = json.load(f)
-                print(
-                    f"Scraping terminé. {len(self.current_data)} annonces trouvées.")
-                return True
-            else:
-                print("Erreur: Aucun fichier de résultats généré")
-                return False
+            from price_history import PriceHistory
+            from text_index import TextIndex
+            from data_catalog import register_file
+            from stats_cube import update_cube
+            from crawl_archive import archive_crawl
+
+            self.current_data = listings
+            if os.path.exists(source):
+                register_file(source)
+            print(f"Scraping terminé. {len(listings)} annonces trouvées.")
+
+            # Indexation plein texte incrémentale du nouveau crawl
+            with TextIndex() as index:
+                index.add_listings(listings, source=source)
+
+            # Historique des prix (seuls les changements sont journalisés)
+            PriceHistory().record_crawl(listings)
+
+            # Copie compressée du crawl (res.json est écrasé au suivant)
+            archive_crawl(listings, source=source)
+
+            # Agrégats par quartier / pièces / meublé / DPE du marché courant
+            update_cube(listings)
+
+            # Instantané binaire partagé par les autres consommateurs
+            sorter.saveSnapshot('res.msnap', source=source)
+            return True
 
         except Exception as e:
-            print(f"Erreur lors du scraping: {e}")
+            print(f"Erreur lors de l'indexation du crawl: {e}")
             return False
 
     def sort_data(self):
@@ -90,29 +113,52 @@ class MainController:
             print(f"Erreur lors du lancement de l'interface: {e}")
 
     def run_complete_process(self):
-        """Lance le processus complet: scraping -> tri -> interface"""
+        """
+        Lance le processus complet: scraping -> normalisation -> tri -> interface
+
+        Le crawl tourne dans un processus séparé, la normalisation et le tri
+        dans des threads (pipeline.py) : l'interface s'ouvre tout de suite et
+        affiche les annonces de la première page sans attendre la fin du
+        crawl. Les données dérivées (index, historique, archive...) sont mises
+        à jour une fois le crawl terminé.
+        """
         print("=== DÉMARRAGE DU PROCESSUS COMPLET ===")
-
-        # 1. Scraping
-        if not self.run_scraper():
-            print("Échec du scraping. Arrêt du processus.")
-            return
-
-        # 2. Tri des données
-        if not self.sort_data():
-            print("Échec du tri. Arrêt du processus.")
+        try:
+            from pipeline import ListingPipeline, crawl_batches
+            from SortScrapSearch import SortScrapSearch
+        except ImportError as e:
+            print(f"Processus complet indisponible: {e}")
             return
 
-        # 3. Lancement de l'interface
+        sorter = SortScrapSearch({})
+        pipeline = ListingPipeline(crawl_batches(max_pages=self.max_pages), sorter,
+                                   on_complete=lambda: self.finalize_crawl(sorter))
+        # Copie propre à l'interface : le tri complète ses propres
+        # dictionnaires dans un autre thread
+        self.sorted_data = {'valid': {}, 'rejected': {}}
         print("Lancement de l'interface graphique...")
-        self.launch_gui()
+        try:
+            pipeline.start()
+            app = ImmoApp(self.sorted_data, pipeline=pipeline)
+            app.mainloop()
+        except Exception as e:
+            print(f"Erreur lors du lancement de l'interface: {e}")
+        finally:
+            pipeline.stop()
+
+        summary = pipeline.summary()
+        if summary['premier_resultat_s'] is not None:
+            print(f"Premières annonces affichées après {summary['premier_resultat_s']}s")
+        if not pipeline.finished:
+            print("Interface fermée avant la fin du crawl : données dérivées inchangées")
 
 
 class SortScrapSearchModified:
     """Version modifiée de SortScrapSearch pour fonctionner avec des données en mémoire"""
 
     def __init__(self, data):
-        self.search = data
+        self.search = {key: Listing.from_dict(item)
+                       for key, item in data.items()}
         self.rejectedSearch = {}
         self.validSearch = {}
         self.sortSearch()
@@ -129,16 +175,27 @@ class SortScrapSearchModified:
 class ImmoApp(tk.Tk):
     """Interface graphique améliorée pour afficher les données immobilières"""
 
-    def __init__(self, sorted_data):
+    def __init__(self, sorted_data, pipeline=None):
+        """
+        Args:
+            sorted_data: Dictionnaire {'valid': ..., 'rejected': ...}
+            pipeline: ListingPipeline alimenté par un crawl en cours (optionnel)
+        """
         super().__init__()
 
         self.sorted_data = sorted_data
+        self.pipeline = pipeline
         self.title("Recherche d'Appartements - Dijon")
         self.geometry("1200x800")
 
         self.create_widgets()
         self.populate_data()
 
+        if self.pipeline is not None:
+            from shared_handoff import POLL_INTERVAL_MS
+            self.poll_interval = POLL_INTERVAL_MS
+            self.after(self.poll_interval, self.poll_pipeline)
+
     def create_widgets(self):
         """Crée les widgets de l'interface"""
         # Notebook pour les onglets
@@ -219,7 +276,7 @@ class ImmoApp(tk.Tk):
         """Remplit un arbre avec des données"""
         for key, item in data.items():
             # Extraction des informations
-            prix = item.get('prix', 'N/A')
+            prix = format_price(item.get('prix'))
             type_bien = item.get('type', 'N/A')
 
             # Extraction de la surface et pièces depuis specificite
@@ -244,6 +301,30 @@ class ImmoApp(tk.Tk):
                 prix, type_bien, surface, pieces, etage, equipements_str, description_short
             ), tags=(item.get('lien', ''),))
 
+    def update_tab_titles(self):
+        """Met à jour les compteurs des onglets"""
+        self.notebook.tab(
+            self.valid_frame, text=f"Annonces Valides ({len(self.sorted_data['valid'])})")
+        self.notebook.tab(
+            self.rejected_frame, text=f"Annonces Rejetées ({len(self.sorted_data['rejected'])})")
+
+    def poll_pipeline(self):
+        """Affiche les annonces triées par le pipeline depuis le dernier passage"""
+        # Quelques pages par passage : l'interface reste réactive
+        for valid, rejected in self.pipeline.poll(max_batches=4):
+            self.sorted_data['valid'].update(valid)
+            self.sorted_data['rejected'].update(rejected)
+            self.populate_tree(self.valid_tree, valid)
+            self.populate_tree(self.rejected_tree, rejected)
+            self.update_tab_titles()
+
+        if self.pipeline.errors:
+            self.title("Recherche d'Appartements - Dijon (crawl interrompu)")
+        elif self.pipeline.finished:
+            self.title("Recherche d'Appartements - Dijon (crawl terminé)")
+        if not self.pipeline.finished:
+            self.after(self.poll_interval, self.poll_pipeline)
+
     def open_link(self, tree):
         """Ouvre le lien de l'annonce sélectionnée"""
         selection = tree.selection()
@@ -262,8 +343,9 @@ class ImmoApp(tk.Tk):
     def export_results(self):
         """Exporte les résultats"""
         try:
-            with open('resultats_tries.json', 'w', encoding='utf-8') as f:
-                json.dump(self.sorted_data, f, ensure_ascii=False, indent=2)
+            from export_writers import export_sorted
+            export_sorted('resultats_tries.json', self.sorted_data['valid'],
+                          self.sorted_data['rejected'], register=True)
             messagebox.showinfo(
                 "Succès", "Résultats exportés dans 'resultats_tries.json'")
         except Exception as e:
@@ -272,14 +354,19 @@ class ImmoApp(tk.Tk):
 
 def main():
     """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Recherche d'appartements")
+    parser.add_argument("--pages", type=int, default=None,
+                        help="Nombre maximal de pages crawlées (défaut : celui du spider)")
+    args = parser.parse_args()
+
     print("=== APPLICATION DE RECHERCHE D'APPARTEMENTS ===")
-    print("1. Lancement du processus complet (scraping + tri + interface)")
+    print("1. Lancement du processus complet (scraping + tri + interface, au fil du crawl)")
     print("2. Utiliser les données existantes (si disponibles)")
 
     try:
         choice = input("\nVotre choix (1 ou 2): ").strip()
 
-        controller = MainController()
+        controller = MainController(max_pages=args.pages)
 
         if choice == "1":
             controller.run_complete_process()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Serveur local imitant les pages de résultats SeLoger
+Sert des pages d'annonces avec les mêmes sélecteurs que le site, une latence
+qui croît avec la charge, des 429 au-delà d'un débit donné et, sur demande,
+des pages captcha : de quoi vérifier la régulation du crawl (throttling.py)
+sans solliciter le vrai site.
+
+Usage:
+    python mock_server.py --port 8765 --pages 5 --debit 5 --captcha 0
+    scrapy runspider scrapImmo.py -a start_url=http://127.0.0.1:8765/list.htm
+"""
+
+import argparse
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+CARD_TEMPLATE = """
+<div data-testid="sl.explore.card-container">
+  <a data-testid="sl.explore.coveringLink" href="/annonces/locations/appartement/dijon-21/{id}.htm"></a>
+  <div data-test="sl.title">Appartement</div>
+  <div data-test="sl.price-label">{prix} €</div>
+  <div data-testid="sl.explore.card-description">{description}</div>
+  <div data-testid="sl.address">Dijon ({quartier})</div>
+  <ul><li>{pieces} pièces</li><li>{chambres} chambre</li><li>{surface} m²</li><li>Étage {etage}/5</li>{extra}</ul>
+</div>"""
+
+CAPTCHA_PAGE = """<html><head><title>seloger.com</title></head><body>
+<p>Vérifiez que vous êtes humain.</p>
+<iframe src="https://geo.captcha-delivery.com/captcha/?initialCid=mock"></iframe>
+</body></html>"""
+
+# En-tête des pages ordinaires : comme sur le site, le script DataDome et un
+# formulaire reCAPTCHA sont présents sans qu'il s'agisse d'une vérification
+PAGE_HEAD = """<head><title>Location appartement Dijon (21) - SeLoger</title>
+<script src="https://js.datadome.co/tags.js" async></script>
+<script>window.ddjskey = "mock"; window.ddoptions = {endpoint: "https://api-js.datadome.co/js/"};</script>
+</head>"""
+CONTACT_FORM = '<form id="contact"><div class="g-recaptcha" data-sitekey="mock"></div></form>'
+
+QUARTIERS = ("Centre", "Montchapet", "Grésilles", "Port du Canal", "Université")
+EXTRAS = ("<li>Balcon</li>", "<li>Parking</li>", "<li>Ascenseur</li>", "")
+
+
+class MockSeLogerServer:
+    """Serveur de test (dans un thread) avec charge et blocages simulés"""
+
+    def __init__(self, port=0, pages=5, listings_per_page=20, latency=0.05,
+                 rate_limit=None, captcha_every=0, seed=0):
+        """
+        Args:
+            port: Port d'écoute (0 : choisi par le système)
+            pages: Nombre de pages de résultats
+            listings_per_page: Annonces par page
+            latency: Latence de base d'une réponse (s), multipliée par la charge
+            rate_limit: Requêtes par seconde au-delà desquelles le serveur
+                        répond 429 (None : illimité)
+            captcha_every: Une requête sur N reçoit une page captcha (0 : jamais)
+            seed: Graine des annonces générées
+        """
+        self.pages = pages
+        self.listings_per_page = listings_per_page
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.captcha_every = captcha_every
+        self.seed = seed
+
+        self.lock = threading.Lock()
+        self.arrivals = deque()             # Horodatages de la dernière seconde
+        self.in_flight = 0
+        self.stats = {"requetes": 0, "pages": 0, "http_429": 0, "captcha": 0}
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        """URL de la première page de résultats"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/list.htm"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def admit(self):
+        """
+        Enregistre une requête entrante
+
+        Returns:
+            str: "ok", "http_429" ou "captcha"
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.stats["requetes"] += 1
+            while self.arrivals and now - self.arrivals[0] > 1.0:
+                self.arrivals.popleft()
+            self.arrivals.append(now)
+            if self.rate_limit and len(self.arrivals) > self.rate_limit:
+                self.stats["http_429"] += 1
+                return "http_429"
+            if self.captcha_every and self.stats["requetes"] % self.captcha_every == 0:
+                self.stats["captcha"] += 1
+                return "captcha"
+            self.in_flight += 1
+            self.stats["pages"] += 1
+            return "ok"
+
+    def render_page(self, page):
+        rng = random.Random(self.seed * 100003 + page)
+        cards = []
+        for index in range(self.listings_per_page):
+            pieces = rng.choice((2, 2, 3, 3, 4))
+            cards.append(CARD_TEMPLATE.format(
+                id=page * 1000 + index,
+                prix=rng.randrange(400, 900, 10),
+                description=rng.choice(("Bel appartement lumineux",
+                                        "Proche tram, calme",
+                                        "Idéal colocation", "Refait à neuf")),
+                quartier=rng.choice(QUARTIERS),
+                pieces=pieces,
+                chambres=pieces - 1,
+                surface=rng.randrange(35, 95),
+                etage=rng.randrange(0, 6),
+                extra=rng.choice(EXTRAS)))
+        next_link = (f'<a class="next" href="/list.htm?page={page + 1}">Suivant</a>'
+                     if page < self.pages else "")
+        return (f"<html>{PAGE_HEAD}<body>{''.join(cards)}{next_link}"
+                f"{CONTACT_FORM}</body></html>")
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                outcome = server.admit()
+                if outcome == "http_429":
+                    self.send_response(429)
+                    self.send_header("Retry-After", "1")
+                    self.end_headers()
+                    return
+                if outcome == "captcha":
+                    self.reply(200, CAPTCHA_PAGE)
+                    return
+
+                try:
+                    with server.lock:
+                        load = server.in_flight
+                    # Plus de requêtes simultanées : réponses plus lentes
+                    time.sleep(server.latency * load)
+                    query = parse_qs(urlparse(self.path).query)
+                    try:
+                        page = int(query.get("page", ["1"])[0])
+                    except ValueError:
+                        page = 1
+                    if 1 <= page <= server.pages:
+                        self.reply(200, server.render_page(page))
+                    else:
+                        self.reply(404, "<html><body>Page introuvable</body></html>")
+                finally:
+                    with server.lock:
+                        server.in_flight -= 1
+
+            def reply(self, status, body):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur local imitant SeLoger")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--annonces", type=int, default=20,
+                        help="Annonces par page")
+    parser.add_argument("--latence", type=float, default=0.05,
+                        help="Latence de base par requête (s)")
+    parser.add_argument("--debit", type=float, default=None,
+                        help="Requêtes par seconde avant réponse 429")
+    parser.add_argument("--captcha", type=int, default=0,
+                        help="Une requête sur N reçoit une page captcha")
+    args = parser.parse_args()
+
+    server = MockSeLogerServer(port=args.port, pages=args.pages,
+                               listings_per_page=args.annonces,
+                               latency=args.latence, rate_limit=args.debit,
+                               captcha_every=args.captcha)
+    print(f"Serveur de test sur {server.url} (Ctrl+C pour arrêter)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nStatistiques: {server.stats}")
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Pipeline du crawl à l'affichage
+Le processus complet n'est plus séquentiel (tout crawler, puis tout trier,
+puis ouvrir l'interface) mais découpé en étages reliés par des files bornées :
+
+    crawl (processus séparé, tampon partagé) -> normalisation -> tri -> affichage
+
+Chaque étage est un thread qui traite une page d'annonces à la fois. Les files
+sont bornées : si l'interface ou le tri prend du retard, les étages amont se
+bloquent, le tampon partagé se remplit et le crawler attend à son tour. Les
+annonces valides s'affichent dès la première page.
+
+L'affichage reste dans le thread de Tk : l'interface vide la dernière file à
+intervalle court (poll).
+"""
+
+import queue
+import threading
+import time
+
+
+QUEUE_SIZE = 4                  # Pages en attente entre deux étages
+PUT_TIMEOUT = 0.1               # Attente d'une file pleine avant de revérifier l'arrêt
+
+# Fin du flux, transmise d'étage en étage
+END = object()
+
+
+class Stage(threading.Thread):
+    """Étage du pipeline : lit une file, applique une fonction, écrit la suivante"""
+
+    def __init__(self, pipeline, name, function, inbox, outbox):
+        super().__init__(name=f"pipeline-{name}", daemon=True)
+        self.pipeline = pipeline
+        self.stage_name = name
+        self.function = function
+        self.inbox = inbox
+        self.outbox = outbox
+        self.batches = 0
+        self.seconds = 0.0
+
+    def run(self):
+        try:
+            while True:
+                batch = self.pipeline.get(self.inbox)
+                if batch is END:
+                    break
+                started = time.perf_counter()
+                result = self.function(batch)
+                self.seconds += time.perf_counter() - started
+                self.batches += 1
+                if result and not self.pipeline.put(self.outbox, result):
+                    break
+        except Exception as e:
+            self.pipeline.fail(self.stage_name, e)
+        finally:
+            self.pipeline.put(self.outbox, END, force=True)
+
+
+class SourceStage(Stage):
+    """Premier étage : parcourt une source de pages (générateur)"""
+
+    def __init__(self, pipeline, source, outbox):
+        super().__init__(pipeline, "crawl", None, None, outbox)
+        self.source = source
+
+    def run(self):
+        batches = iter(self.source)
+        try:
+            while not self.pipeline.stopping.is_set():
+                started = time.perf_counter()
+                try:
+                    batch = next(batches)
+                except StopIteration:
+                    break
+                self.seconds += time.perf_counter() - started
+                self.batches += 1
+                if batch and not self.pipeline.put(self.outbox, batch):
+                    break
+        except Exception as e:
+            self.pipeline.fail(self.stage_name, e)
+        finally:
+            # Arrêt de la source dans son propre thread (ex: fin du crawler)
+            close = getattr(batches, "close", None)
+            if close is not None:
+                close()
+            self.pipeline.put(self.outbox, END, force=True)
+
+
+class ListingPipeline:
+    """Étages crawl -> normalisation -> tri, résultats lus par l'interface"""
+
+    def __init__(self, source, sorter, queue_size=QUEUE_SIZE, on_complete=None):
+        """
+        Args:
+            source: Itérable de pages {clé: annonce brute} (ex: crawl_batches())
+            sorter: SortScrapSearch qui classe les annonces (utilisé par le
+                    seul étage de tri)
+            queue_size: Pages en attente au plus entre deux étages
+            on_complete: Fonction appelée (dans un thread à part) quand le
+                         flux est entièrement affiché, ex: indexation du crawl
+        """
+        self.sorter = sorter
+        self.on_complete = on_complete
+        self.stopping = threading.Event()
+        self.errors = []
+        self.started = None
+        self.first_result = None
+        self.finished = False
+        self.completion = None
+
+        raw = queue.Queue(queue_size)
+        normalized = queue.Queue(queue_size)
+        self.results = queue.Queue(queue_size)
+        self.stages = [
+            SourceStage(self, source, raw),
+            Stage(self, "normalisation", sorter.normalizeDataFormat, raw, normalized),
+            Stage(self, "tri", self.classify, normalized, self.results),
+        ]
+
+    def start(self):
+        self.started = time.perf_counter()
+        for stage in self.stages:
+            stage.start()
+        return self
+
+    def get(self, inbox):
+        """Lecture bloquante d'une file, interrompue par l'arrêt du pipeline"""
+        while True:
+            try:
+                return inbox.get(timeout=PUT_TIMEOUT)
+            except queue.Empty:
+                if self.stopping.is_set():
+                    return END
+
+    def put(self, outbox, item, force=False):
+        """
+        Écriture bloquante (contre-pression) ; abandonnée si le pipeline
+        s'arrête
+
+        Returns:
+            bool: True si l'élément a été transmis
+        """
+        while True:
+            try:
+                outbox.put(item, timeout=PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                if self.stopping.is_set():
+                    if force:
+                        # Fin de flux : on fait de la place pour que l'aval s'arrête
+                        try:
+                            outbox.get_nowait()
+                        except queue.Empty:
+                            pass
+                        continue
+                    return False
+
+    def classify(self, listings):
+        """Étage de tri : classe les nouvelles annonces"""
+        valid, rejected = self.sorter.addListings(listings)
+        if not valid and not rejected:
+            return None
+        return valid, rejected
+
+    def fail(self, stage, error):
+        self.errors.append((stage, error))
+        print(f"Erreur dans l'étage {stage} du pipeline: {error}")
+        self.stopping.set()
+
+    def poll(self, max_batches=None):
+        """
+        Résultats disponibles sans attendre (appelé par l'interface)
+
+        Returns:
+            list: [(valides, rejetées)] dans l'ordre d'arrivée
+        """
+        batches = []
+        while max_batches is None or len(batches) < max_batches:
+            try:
+                batch = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if batch is END:
+                self.complete()
+                break
+            if self.first_result is None:
+                self.first_result = time.perf_counter() - self.started
+            batches.append(batch)
+        return batches
+
+    def complete(self):
+        """Fin du flux : dernière étape (indexation...) hors du thread de l'interface"""
+        self.finished = True
+        if self.on_complete is not None and not self.errors and not self.stopping.is_set():
+            self.completion = threading.Thread(target=self.on_complete, name="pipeline-fin")
+            self.completion.start()
+
+    def stop(self, timeout=5.0):
+        """
+        Arrête tous les étages (fermeture de l'interface avant la fin du
+        crawl) ; une dernière étape déjà lancée est menée à son terme
+        """
+        self.stopping.set()
+        for stage in self.stages:
+            stage.join(timeout)
+        if self.completion is not None:
+            self.completion.join()
+
+    def summary(self):
+        """
+        Returns:
+            dict: Délai avant le premier résultat et temps passé par étage
+        """
+        return {
+            "premier_resultat_s": round(self.first_result, 3) if self.first_result is not None else None,
+            "etages": {stage.stage_name: {"pages": stage.batches,
+                                          "duree_s": round(stage.seconds, 3)}
+                       for stage in self.stages},
+        }
+
+
+def crawl_batches(max_pages=None, poll_interval=0.02):
+    """
+    Source du pipeline : lance le crawl dans un processus séparé et produit
+    chaque page publiée dans le tampon partagé
+
+    Args:
+        max_pages: Nombre maximal de pages (None : valeur par défaut du spider)
+        poll_interval: Attente entre deux consultations du tampon vide (s)
+
+    Yields:
+        dict: Annonces brutes d'une page {clé: annonce}
+
+    Raises:
+        RuntimeError: Mémoire partagée indisponible, ou crawler arrêté sans
+                      avoir signalé la fin du crawl
+    """
+    from shared_handoff import ListingSubscriber, start_crawler
+
+    subscriber = ListingSubscriber()
+    crawler = start_crawler(subscriber.name, max_pages=max_pages)
+    try:
+        while True:
+            listings = subscriber.poll(max_batches=1)
+            if listings:
+                yield listings
+                continue
+            if subscriber.finished:
+                break
+            if not crawler.is_alive() and not subscriber.finished \
+                    and not subscriber.ring.pending():
+                raise RuntimeError(
+                    f"Crawl interrompu (code de sortie {crawler.exitcode})")
+            time.sleep(poll_interval)
+    finally:
+        if crawler.is_alive():
+            crawler.terminate()
+        crawler.join()
+        subscriber.close()
@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Historique des prix des annonces d'un crawl à l'autre
+Journal binaire en ajout seul, encodé en deltas : seuls les changements
+(nouvelle annonce, variation de prix ou de statut, disparition) sont écrits.
+Un index (état courant par annonce, position de chaque crawl) permet de
+relire seulement la partie utile du journal.
+"""
+
+import bisect
+import json
+import os
+from datetime import datetime, timedelta
+
+from listing import listing_document_id, parse_number
+
+
+DEFAULT_HISTORY_PATH = "historique_prix.log"
+
+# Types d'enregistrements du journal
+RECORD_CRAWL = 1      # Début de crawl : delta de date (secondes)
+RECORD_NEW_ID = 2     # Déclaration d'un identifiant d'annonce (ordinal implicite)
+RECORD_OBSERVED = 3   # Annonce (ré)apparue ou modifiée : delta de prix, statut
+RECORD_GONE = 4       # Annonce absente du crawl
+
+LOG_MAGIC = b"MSAH\x01"
+# Format de l'index (.idx) ; un index d'un autre format est reconstruit
+INDEX_VERSION = 2
+
+
+def encode_varint(value):
+    """Encode un entier positif en varint (7 bits par octet)"""
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def decode_varint(data, pos):
+    """
+    Décode un varint
+
+    Returns:
+        tuple: (valeur, position suivante)
+
+    Raises:
+        IndexError: Si l'enregistrement est tronqué
+    """
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def zigzag(value):
+    """Entier signé -> entier positif (0, -1, 1, -2... -> 0, 1, 2, 3...)"""
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value):
+    return value // 2 if not value & 1 else -(value + 1) // 2
+
+
+def to_timestamp(value):
+    """Convertit une date (datetime, ISO, timestamp) en secondes epoch"""
+    if value is None:
+        return int(datetime.now().timestamp())
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp())
+
+
+def listing_price(item):
+    """Prix d'une annonce normalisée (prix) ou brute de l'API (price), 0 si inconnu"""
+    price = item.get('prix')
+    if price is None:
+        price = item.get('price')
+    return parse_number(price) or 0
+
+
+def latest_collection_date(listings):
+    """
+    Date de collecte la plus récente des annonces (date_scraping ou
+    collected_at de l'API)
+
+    Returns:
+        datetime ou None si aucune annonce n'est datée
+    """
+    latest = None
+    for item in listings.values():
+        value = item.get('date_scraping') or item.get('collected_at')
+        if not value:
+            continue
+        try:
+            date = datetime.fromisoformat(str(value))
+        except ValueError:
+            continue
+        if latest is None or date > latest:
+            latest = date
+    return latest
+
+
+def read_record(data, pos):
+    """
+    Décode un enregistrement du journal
+
+    Returns:
+        tuple: (type, valeurs, position suivante) ; valeurs vaut (delta de
+               date,), (identifiant,), (ordinal, delta de prix, statut) ou
+               (ordinal,) selon le type
+
+    Raises:
+        IndexError: Si l'enregistrement est tronqué
+        ValueError: Type d'enregistrement inconnu
+    """
+    kind = data[pos]
+    pos += 1
+    if kind == RECORD_CRAWL:
+        delta, pos = decode_varint(data, pos)
+        return kind, (delta,), pos
+    if kind == RECORD_NEW_ID:
+        size, pos = decode_varint(data, pos)
+        if pos + size > len(data):
+            raise IndexError(pos)
+        return kind, (data[pos:pos + size].decode("utf-8"),), pos + size
+    if kind == RECORD_OBSERVED:
+        ordinal, pos = decode_varint(data, pos)
+        delta, pos = decode_varint(data, pos)
+        status = data[pos]
+        return kind, (ordinal, unzigzag(delta), status), pos + 1
+    if kind == RECORD_GONE:
+        ordinal, pos = decode_varint(data, pos)
+        return kind, (ordinal,), pos
+    raise ValueError(f"Enregistrement inconnu {kind} à l'octet {pos - 1}")
+
+
+class PriceHistory:
+    """
+    Journal des prix avec index de l'état courant par annonce
+
+    L'index ne contient que l'état courant de chaque annonce et la position
+    de chaque crawl dans le journal : sa taille suit le nombre d'annonces,
+    pas le nombre de crawls. Les historiques et les baisses de prix sont
+    relus dans le journal à partir de ces positions.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        """
+        Ouvre le journal et son index (reconstruit si absent ou en retard)
+
+        Args:
+            path: Chemin du journal ; l'index est stocké dans path + ".idx"
+        """
+        self.path = path
+        self.index_path = path + ".idx"
+        self.reset_state()
+        self.load_index()
+        self.replay()
+
+    def reset_state(self):
+        self.offset = 0
+        self.ids = []
+        self.ordinals = {}
+        self.last_crawl = 0
+        self.previous_crawl = 0
+        # Par crawl : [date, position de l'enregistrement de début de crawl]
+        self.crawls = []
+        # Par ordinal : [position de la déclaration, first_seen, last_seen,
+        #                prix_centimes, statut, actif]
+        self.listings = []
+
+    @property
+    def crawl_count(self):
+        return len(self.crawls)
+
+    def load_index(self):
+        """Charge l'index s'il est cohérent avec le journal"""
+        if not os.path.exists(self.index_path) or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        # Index d'une version précédente : reconstruit depuis le journal
+        if state.get("version") != INDEX_VERSION or \
+                state.get("offset", 0) > os.path.getsize(self.path):
+            return
+
+        self.offset = state["offset"]
+        self.ids = state["ids"]
+        self.ordinals = {listing_id: i for i, listing_id in enumerate(self.ids)}
+        self.last_crawl = state["last_crawl"]
+        self.previous_crawl = state["previous_crawl"]
+        self.crawls = state["crawls"]
+        self.listings = state["listings"]
+
+    def save_index(self):
+        """Écrit l'index de manière atomique"""
+        state = {
+            "version": INDEX_VERSION,
+            "offset": self.offset,
+            "ids": self.ids,
+            "last_crawl": self.last_crawl,
+            "previous_crawl": self.previous_crawl,
+            "crawls": self.crawls,
+            "listings": self.listings,
+        }
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+
+    def replay(self):
+        """
+        Rejoue la fin du journal non couverte par l'index
+
+        Un enregistrement tronqué (crawl interrompu) est supprimé.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            if self.offset == 0:
+                magic = f.read(len(LOG_MAGIC))
+                if magic != LOG_MAGIC:
+                    if magic:
+                        raise ValueError(
+                            f"{self.path} n'est pas un journal de prix")
+                    return
+                self.offset = len(LOG_MAGIC)
+            f.seek(self.offset)
+            data = f.read()
+
+        base = self.offset
+        pos = 0
+        while pos < len(data):
+            try:
+                kind, values, end = read_record(data, pos)
+            except IndexError:
+                with open(self.path, "r+b") as f:
+                    f.truncate(base + pos)
+                break
+            self.apply_record(kind, values, base + pos)
+            pos = end
+            self.offset = base + pos
+
+    def apply_record(self, kind, values, offset):
+        """
+        Applique un enregistrement du journal à l'état en mémoire
+
+        Args:
+            kind, values: Enregistrement décodé (read_record)
+            offset: Position de l'enregistrement dans le journal
+        """
+        if kind == RECORD_CRAWL:
+            self.previous_crawl = self.last_crawl
+            self.last_crawl += values[0]
+            self.crawls.append([self.last_crawl, offset])
+        elif kind == RECORD_NEW_ID:
+            self.ordinals[values[0]] = len(self.ids)
+            self.ids.append(values[0])
+            self.listings.append(
+                [offset, self.last_crawl, self.last_crawl, 0, 0, 0])
+        elif kind == RECORD_OBSERVED:
+            ordinal, delta, status = values
+            state = self.listings[ordinal]
+            state[3] += delta
+            state[4] = status
+            state[5] = 1
+        elif kind == RECORD_GONE:
+            state = self.listings[values[0]]
+            state[2] = self.previous_crawl
+            state[5] = 0
+
+    def read_log(self, offset):
+        """Octets du journal de offset à la fin couverte par l'index"""
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(self.offset - offset)
+
+    def record_crawl(self, listings, collected_at=None):
+        """
+        Ajoute un crawl au journal
+
+        Les annonces sont de préférence normalisées et triées (Listing) : le
+        statut de tri n'est connu que pour elles. Les dictionnaires bruts de
+        l'API SeLoger (price, collected_at) sont aussi acceptés.
+
+        Une baisse de prix signalée par SeLoger (baisse_prix_pct ou
+        price_decrease_percent) sur une annonce jamais vue est journalisée
+        comme un changement de prix à la date de sa première observation.
+
+        Args:
+            listings: Dictionnaire {clé: annonce}
+            collected_at: Date du crawl (par défaut la date de collecte la
+                          plus récente des annonces, sinon maintenant)
+
+        Returns:
+            int: Nombre d'enregistrements d'annonces écrits
+        """
+        if collected_at is None:
+            collected_at = latest_collection_date(listings)
+        timestamp = max(to_timestamp(collected_at), self.last_crawl)
+        records = bytearray()
+        if self.offset == 0:
+            records += LOG_MAGIC
+
+        records.append(RECORD_CRAWL)
+        records += encode_varint(timestamp - self.last_crawl)
+
+        seen = set()
+        new_ids = 0
+        for key, item in listings.items():
+            listing_id = listing_document_id(key, item)
+            if listing_id in seen:
+                continue
+            seen.add(listing_id)
+
+            if listing_id not in self.ordinals:
+                encoded = listing_id.encode("utf-8")
+                records.append(RECORD_NEW_ID)
+                records += encode_varint(len(encoded)) + encoded
+                ordinal = len(self.ids) + new_ids
+                new_ids += 1
+                state = None
+            else:
+                ordinal = self.ordinals[listing_id]
+                state = self.listings[ordinal]
+
+            cents = int(round(listing_price(item) * 100))
+            status = int(item.status) if hasattr(item, 'status') else 0
+            old_cents = state[3] if state else 0
+            if state is None:
+                decrease = parse_number(item.get('baisse_prix_pct',
+                                                 item.get('price_decrease_percent')))
+                if cents and decrease and 0 < decrease < 100:
+                    # Prix avant la baisse annoncée, observé en premier
+                    before = int(round(cents / (1 - decrease / 100)))
+                    records.append(RECORD_OBSERVED)
+                    records += encode_varint(ordinal)
+                    records += encode_varint(zigzag(before))
+                    records.append(status)
+                    old_cents = before
+            if state is None or not state[5] or state[3] != cents or state[4] != status:
+                records.append(RECORD_OBSERVED)
+                records += encode_varint(ordinal)
+                records += encode_varint(zigzag(cents - old_cents))
+                records.append(status)
+
+        # Annonces actives absentes de ce crawl
+        for ordinal, state in enumerate(self.listings):
+            if state[5] and self.ids[ordinal] not in seen:
+                records.append(RECORD_GONE)
+                records += encode_varint(ordinal)
+
+        with open(self.path, "ab") as f:
+            f.write(records)
+        self.replay()
+        self.save_index()
+        return len(seen)
+
+    def price_drops(self, days=7, now=None):
+        """
+        Baisses de prix sur une période récente
+
+        Seuls les crawls de la période sont relus ; les anciens prix sont
+        retrouvés en remontant les deltas depuis le prix courant.
+
+        Args:
+            days: Taille de la fenêtre en jours
+            now: Date de référence (par défaut le dernier crawl)
+
+        Returns:
+            list: Dictionnaires {listing_id, date, ancien_prix, nouveau_prix, baisse_pct}
+        """
+        reference = to_timestamp(now) if now is not None else self.last_crawl
+        cutoff = reference - int(timedelta(days=days).total_seconds())
+        first = bisect.bisect_left(self.crawls, [cutoff])
+        if first == len(self.crawls):
+            return []
+
+        # Variations de prix de la fin du journal, par annonce
+        data = self.read_log(self.crawls[first][1])
+        timestamp = self.crawls[first - 1][0] if first else 0
+        deltas = {}
+        declared = 0
+        pos = sequence = 0
+        while pos < len(data):
+            kind, values, pos = read_record(data, pos)
+            if kind == RECORD_CRAWL:
+                timestamp += values[0]
+            elif kind == RECORD_NEW_ID:
+                declared += 1
+            elif kind == RECORD_OBSERVED:
+                deltas.setdefault(values[0], []).append((sequence, timestamp, values[1]))
+                sequence += 1
+        # La première observation d'une annonce déclarée ici n'est pas un changement
+        first_new = len(self.ids) - declared
+
+        changes = []
+        for ordinal, observed in deltas.items():
+            new = self.listings[ordinal][3]
+            for i in range(len(observed) - 1, -1, -1):
+                sequence, timestamp, delta = observed[i]
+                old = new - delta
+                if delta and (i or ordinal < first_new):
+                    changes.append((sequence, timestamp, ordinal, old, new))
+                new = old
+
+        drops = []
+        for _, timestamp, ordinal, old, new in sorted(changes):
+            if timestamp > reference or new >= old:
+                continue
+            drops.append({
+                "listing_id": self.ids[ordinal],
+                "date": datetime.fromtimestamp(timestamp).isoformat(),
+                "ancien_prix": old / 100,
+                "nouveau_prix": new / 100,
+                "baisse_pct": round((old - new) / old * 100, 2) if old else None,
+            })
+        return drops
+
+    def time_on_market(self, listing_id):
+        """
+        Durée de présence d'une annonce en jours
+
+        Returns:
+            float: Jours entre première et dernière observation, None si inconnue
+        """
+        ordinal = self.ordinals.get(str(listing_id))
+        if ordinal is None:
+            return None
+        _, first_seen, last_seen, _, _, active = self.listings[ordinal]
+        end = self.last_crawl if active else last_seen
+        return round((end - first_seen) / 86400, 2)
+
+    def history(self, listing_id):
+        """
+        Évolution du prix d'une annonce, relue dans le journal à partir de
+        sa déclaration
+
+        Returns:
+            list: Tuples (date ISO, prix)
+        """
+        ordinal = self.ordinals.get(str(listing_id))
+        if ordinal is None:
+            return []
+        offset, timestamp = self.listings[ordinal][:2]
+        data = self.read_log(offset)
+        points = []
+        cents = 0
+        pos = 0
+        while pos < len(data):
+            kind, values, pos = read_record(data, pos)
+            if kind == RECORD_CRAWL:
+                timestamp += values[0]
+            elif kind == RECORD_OBSERVED and values[0] == ordinal:
+                if not points or values[1]:
+                    cents += values[1]
+                    points.append((datetime.fromtimestamp(timestamp).isoformat(),
+                                   cents / 100))
+        return points
+
+    def summary(self, listing_id):
+        """
+        Résumé d'une annonce (prix, statut, première/dernière observation)
+        """
+        ordinal = self.ordinals.get(str(listing_id))
+        if ordinal is None:
+            return None
+        _, first_seen, last_seen, cents, status, active = self.listings[ordinal]
+        return {
+            "prix": cents / 100,
+            "statut": status,
+            "active": bool(active),
+            "first_seen": datetime.fromtimestamp(first_seen).isoformat(),
+            "last_seen": datetime.fromtimestamp(self.last_crawl if active else last_seen).isoformat(),
+            "jours_en_ligne": self.time_on_market(listing_id),
+        }
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Recherches enregistrées (profils) évaluées ensemble en un seul passage
+Chaque profil occupe un bit d'un entier Python. Pour chaque critère, les
+seuils de tous les profils sont triés une fois : une recherche dichotomique
+donne, pour une annonce, le masque des profils satisfaits (masques préfixes
+précalculés). L'intersection des masques donne les profils retenus.
+
+Les règles sont celles de SortScrapSearch.sortSearch : un prix absent (ou
+nul) rejette l'annonce, une surface ou un nombre de pièces absent ne la
+rejette pas. Les mots exclus (mots isolés de toute longueur ou expressions)
+sont cherchés comme mots entiers, sans tenir compte des accents, de la casse
+ni de la ponctuation.
+"""
+
+import bisect
+import json
+import os
+import re
+
+from entity_resolution import listing_district, normalize_text
+from listing import Rejet
+
+
+DEFAULT_PROFILES_PATH = "profils.json"
+
+# Critères numériques : (attribut du profil, champ de l'annonce, motif de rejet)
+MIN_CRITERIA = (
+    ("prix_min", "prix", Rejet.PRIX),
+    ("surface_min", "surface_m2", Rejet.SURFACE),
+    ("pieces_min", "nombre_pieces", Rejet.SURFACE),
+)
+MAX_CRITERIA = (
+    ("prix_max", "prix", Rejet.PRIX),
+    ("surface_max", "surface_m2", Rejet.SURFACE),
+)
+# Champs dont l'absence ne rejette pas l'annonce (comme validateSurfaceFromItem)
+OPTIONAL_FIELDS = frozenset(("surface_m2", "nombre_pieces"))
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_words(text):
+    """Mots en minuscules sans accents, séparés par une espace"""
+    return " ".join(TOKEN_PATTERN.findall(normalize_text(text)))
+
+
+def listing_text(item):
+    """
+    Titre et description normalisés, bordés d'espaces : un mot exclu m y
+    figure comme mot entier si " m " en est une sous-chaîne
+    """
+    text = normalize_words(f"{item.get('titre') or ''} {item.get('description') or ''}")
+    return f" {text} "
+
+
+def criterion_value(item, field):
+    """
+    Valeur d'un critère numérique
+
+    Returns:
+        Valeur, None si elle est absente ou nulle
+    """
+    return item.get(field) or None
+
+
+class SearchProfile:
+    """Recherche enregistrée (bornes de prix et de surface, exclusions)"""
+
+    __slots__ = ("nom", "prix_min", "prix_max", "surface_min", "surface_max",
+                 "pieces_min", "exclure_colocation", "exclure_studio",
+                 "quartiers", "mots_exclus")
+
+    def __init__(self, nom, prix_min=None, prix_max=None, surface_min=None,
+                 surface_max=None, pieces_min=None, exclure_colocation=True,
+                 exclure_studio=True, quartiers=None, mots_exclus=()):
+        """
+        Args:
+            nom: Nom unique du profil
+            prix_min, prix_max: Bornes de loyer (€), None pour ne pas filtrer
+            surface_min, surface_max: Bornes de surface (m²)
+            pieces_min: Nombre minimal de pièces
+            exclure_colocation: Rejeter les colocations
+            exclure_studio: Rejeter les studios
+            quartiers: Quartiers acceptés (None pour tous)
+            mots_exclus: Mots ou expressions rejetant l'annonce s'ils
+                         figurent dans son titre ou sa description
+        """
+        self.nom = nom
+        self.prix_min = prix_min
+        self.prix_max = prix_max
+        self.surface_min = surface_min
+        self.surface_max = surface_max
+        self.pieces_min = pieces_min
+        self.exclure_colocation = exclure_colocation
+        self.exclure_studio = exclure_studio
+        self.quartiers = frozenset(normalize_text(q).replace(" ", "-")
+                                   for q in quartiers) if quartiers else None
+        # Un mot vide (ou sans lettre ni chiffre) rejetterait toutes les annonces
+        self.mots_exclus = frozenset(word for word in (
+            normalize_words(m) for m in mots_exclus or ()) if word)
+
+    @classmethod
+    def from_criteria(cls, nom, criteria):
+        """
+        Profil équivalent aux critères de prix et de surface de
+        SortScrapSearch (la distance aux points de référence n'est pas
+        prise en compte)
+        """
+        return cls(nom, prix_min=criteria.get("prix_min"),
+                   prix_max=criteria.get("prix_max"),
+                   surface_min=criteria.get("surface_min"))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def to_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["quartiers"] = sorted(self.quartiers) if self.quartiers else None
+        data["mots_exclus"] = sorted(self.mots_exclus)
+        return data
+
+    def __repr__(self):
+        return f"SearchProfile({self.nom!r})"
+
+
+def load_profiles(path=DEFAULT_PROFILES_PATH):
+    """
+    Charge les profils enregistrés
+
+    Returns:
+        list: Profils (liste vide si le fichier n'existe pas)
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [SearchProfile.from_dict(data) for data in json.load(f)]
+
+
+def save_profiles(profiles, path=DEFAULT_PROFILES_PATH):
+    """Enregistre les profils"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([profile.to_dict() for profile in profiles], f,
+                  ensure_ascii=False, indent=2)
+
+
+class ThresholdIndex:
+    """
+    Seuils d'un critère pour tous les profils
+
+    Pour un minimum, les profils sont triés par seuil croissant : ceux dont le
+    seuil est <= valeur forment un préfixe, dont le masque est précalculé.
+    Pour un maximum, ce sont les suffixes.
+    """
+
+    def __init__(self, thresholds, is_max=False):
+        """
+        Args:
+            thresholds: Liste de tuples (seuil, bit du profil)
+            is_max: Seuils maximaux (sinon minimaux)
+        """
+        thresholds = sorted(thresholds)
+        self.values = [value for value, _ in thresholds]
+        self.is_max = is_max
+        self.constrained = 0
+        for _, bit in thresholds:
+            self.constrained |= bit
+
+        if is_max:
+            # suffixes[i] = profils d'indice >= i
+            self.masks = [0] * (len(thresholds) + 1)
+            for i in range(len(thresholds) - 1, -1, -1):
+                self.masks[i] = self.masks[i + 1] | thresholds[i][1]
+        else:
+            # prefixes[i] = profils d'indice < i
+            self.masks = [0]
+            for _, bit in thresholds:
+                self.masks.append(self.masks[-1] | bit)
+
+    def passing(self, value):
+        """
+        Masque des profils contraints par ce critère et satisfaits par la valeur
+        (une valeur absente ne satisfait aucun profil contraint)
+        """
+        if value is None:
+            return 0
+        if self.is_max:
+            return self.masks[bisect.bisect_left(self.values, value)]
+        return self.masks[bisect.bisect_right(self.values, value)]
+
+
+class ProfileResults:
+    """Résultat d'une évaluation : masque des profils retenus par annonce"""
+
+    def __init__(self, profiles, masks):
+        self.profiles = profiles
+        self.masks = masks
+        self._valid = None
+
+    def _partition(self):
+        if self._valid is None:
+            valid = [[] for _ in self.profiles]
+            for key, mask in self.masks.items():
+                # Parcours des seuls bits à 1
+                while mask:
+                    low = mask & -mask
+                    valid[low.bit_length() - 1].append(key)
+                    mask ^= low
+            self._valid = {profile.nom: keys
+                           for profile, keys in zip(self.profiles, valid)}
+        return self._valid
+
+    def valid(self, nom):
+        """Clés des annonces retenues par un profil"""
+        return self._partition()[nom]
+
+    def rejected(self, nom):
+        """Clés des annonces rejetées par un profil"""
+        bit = 1 << self.index(nom)
+        return [key for key, mask in self.masks.items() if not mask & bit]
+
+    def index(self, nom):
+        for i, profile in enumerate(self.profiles):
+            if profile.nom == nom:
+                return i
+        raise KeyError(nom)
+
+    def counts(self):
+        """Nombre d'annonces retenues par profil"""
+        return {nom: len(keys) for nom, keys in self._partition().items()}
+
+    def profiles_for(self, key):
+        """Noms des profils retenant une annonce"""
+        mask = self.masks[key]
+        return [profile.nom for i, profile in enumerate(self.profiles)
+                if mask >> i & 1]
+
+    def partition(self):
+        """
+        Partition complète valides / rejetées de chaque profil
+
+        Returns:
+            dict: {nom: {"valides": [clés], "rejetees": [clés]}}
+        """
+        valid = self._partition()
+        result = {}
+        for profile in self.profiles:
+            kept = set(valid[profile.nom])
+            result[profile.nom] = {
+                "valides": valid[profile.nom],
+                "rejetees": [key for key in self.masks if key not in kept],
+            }
+        return result
+
+
+class ProfileMatcher:
+    """Évalue un ensemble de profils sur des annonces en un seul passage"""
+
+    def __init__(self, profiles):
+        """
+        Args:
+            profiles: Liste de SearchProfile (noms uniques)
+        """
+        names = [profile.nom for profile in profiles]
+        if len(set(names)) != len(names):
+            raise ValueError("Les noms de profils doivent être uniques")
+
+        self.profiles = list(profiles)
+        self.all = (1 << len(self.profiles)) - 1
+
+        self.indexes = []
+        for attribute, field, _ in MIN_CRITERIA + MAX_CRITERIA:
+            is_max = attribute.endswith("_max")
+            thresholds = [(getattr(profile, attribute), 1 << i)
+                          for i, profile in enumerate(self.profiles)
+                          if getattr(profile, attribute) is not None]
+            if thresholds:
+                self.indexes.append((field, ThresholdIndex(thresholds, is_max)))
+
+        self.colocation_excluded = 0
+        self.studio_excluded = 0
+        self.any_district = 0
+        self.by_district = {}
+        self.by_word = {}
+        for i, profile in enumerate(self.profiles):
+            bit = 1 << i
+            if profile.exclure_colocation:
+                self.colocation_excluded |= bit
+            if profile.exclure_studio:
+                self.studio_excluded |= bit
+            if profile.quartiers is None:
+                self.any_district |= bit
+            else:
+                for district in profile.quartiers:
+                    self.by_district[district] = self.by_district.get(district, 0) | bit
+            for word in profile.mots_exclus:
+                # Recherche de mot entier dans listing_text
+                word = f" {word} "
+                self.by_word[word] = self.by_word.get(word, 0) | bit
+
+    def match_one(self, item):
+        """
+        Masque des profils retenant une annonce
+
+        Returns:
+            int: Bit i à 1 si le profil i retient l'annonce
+        """
+        mask = self.all
+        if item.get("colocation"):
+            mask &= ~self.colocation_excluded
+        if item.get("studio"):
+            mask &= ~self.studio_excluded
+        for field, index in self.indexes:
+            value = criterion_value(item, field)
+            if value is None and field in OPTIONAL_FIELDS:
+                continue
+            mask &= index.passing(value) | ~index.constrained
+            if not mask:
+                return 0
+
+        if self.by_district:
+            district = listing_district(item)
+            mask &= self.any_district | self.by_district.get(district, 0)
+        if self.by_word and mask:
+            text = listing_text(item)
+            for word, excluded in self.by_word.items():
+                if mask & excluded and word in text:
+                    mask &= ~excluded
+        return mask & self.all
+
+    def match(self, listings):
+        """
+        Évalue tous les profils sur les annonces
+
+        Args:
+            listings: Dictionnaire {clé: annonce}
+
+        Returns:
+            ProfileResults
+        """
+        return ProfileResults(self.profiles, {key: self.match_one(item)
+                                              for key, item in listings.items()})
+
+    def explain(self, nom, item):
+        """
+        Motifs de rejet d'une annonce pour un profil
+
+        Returns:
+            list: Libellés (vide si l'annonce est retenue)
+        """
+        profile = next(p for p in self.profiles if p.nom == nom)
+        reasons = []
+        if item.get("colocation") and profile.exclure_colocation:
+            reasons.append("colocation")
+        if item.get("studio") and profile.exclure_studio:
+            reasons.append("studio")
+        for attribute, field, _ in MIN_CRITERIA + MAX_CRITERIA:
+            limit = getattr(profile, attribute)
+            value = criterion_value(item, field)
+            if limit is None or (value is None and field in OPTIONAL_FIELDS):
+                continue
+            if value is None or (value > limit if attribute.endswith("_max")
+                                 else value < limit):
+                reasons.append(f"{field} hors de {attribute}={limit}")
+        if profile.quartiers is not None and \
+                listing_district(item) not in profile.quartiers:
+            reasons.append("quartier non retenu")
+        if profile.mots_exclus:
+            text = listing_text(item)
+            found = [word for word in profile.mots_exclus if f" {word} " in text]
+            if found:
+                reasons.append("mots exclus: " + ", ".join(sorted(found)))
+        return reasons
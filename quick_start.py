@@ -8,10 +8,8 @@ Ce fichier permet de tester l'application sans avoir besoin d'installer Scrapy
 
 import os
 import sys
-import json
 import tkinter as tk
 from tkinter import messagebox, ttk
-import webbrowser
 from datetime import datetime
 
 # Ajouter le répertoire courant au path pour les imports
@@ -19,6 +17,10 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
     from SortScrapSearch import SortScrapSearch
+    from data_catalog import DataCatalog
+    from geo_index import GeoIndex
+    from export_writers import export_sorted
+    from listing import format_price, format_surface
 except ImportError as e:
     print(f"Erreur d'import: {e}")
     sys.exit(1)
@@ -32,28 +34,24 @@ class QuickStartApp:
         self.sorted_data = None
 
     def find_data_files(self):
-        """Trouve les fichiers de données disponibles"""
-        possible_files = [
-            "res.json",
-            "res_detailed.json",
-            "files/seLoger1.json",
-            "resultats_tries.json"
-        ]
+        """
+        Trouve les fichiers de données disponibles
 
+        Le catalogue (catalogue_donnees.json) évite de relire les fichiers
+        inchangés : seuls les fichiers nouveaux ou modifiés sont analysés.
+        """
         found_files = []
-        for file_path in possible_files:
-            if os.path.exists(file_path):
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        file_size = len(data) if isinstance(data, dict) else 0
-                        found_files.append({
-                            'path': file_path,
-                            'size': file_size,
-                            'modified': datetime.fromtimestamp(os.path.getmtime(file_path))
-                        })
-                except Exception as e:
-                    print(f"Erreur lors de la lecture de {file_path}: {e}")
+        try:
+            for entry in DataCatalog().data_files():
+                found_files.append({
+                    'path': entry['chemin'],
+                    'size': entry['nombre'],
+                    'format': entry['format'],
+                    'period': (entry['date_min'], entry['date_max']),
+                    'modified': datetime.fromtimestamp(entry['mtime_ns'] / 1e9)
+                })
+        except Exception as e:
+            print(f"Erreur lors de la lecture du catalogue: {e}")
 
         return found_files
 
@@ -69,7 +67,10 @@ class QuickStartApp:
         print("-" * 60)
         for i, file_info in enumerate(self.data_files, 1):
             print(f"{i}. {file_info['path']}")
-            print(f"   Nombre d'entrées: {file_info['size']}")
+            print(f"   Nombre d'entrées: {file_info['size']} ({file_info['format']})")
+            date_min, date_max = file_info['period']
+            if date_min:
+                print(f"   Période: {date_min[:10]} au {date_max[:10]}")
             print(
                 f"   Modifié le: {file_info['modified'].strftime('%Y-%m-%d %H:%M:%S')}")
             print()
@@ -109,11 +110,16 @@ class QuickStartApp:
             # Afficher les statistiques
             sorter.printStats()
 
+            # Classer les annonces valides par score décroissant
+            valid = sorter.getValidAnnouncements()
+            ranking = sorter.rankValid(k=None)
+
             # Préparer les données pour l'interface
             self.sorted_data = {
-                'valid': sorter.getValidAnnouncements(),
+                'valid': {key: valid[key] for key, _ in ranking},
                 'rejected': sorter.getRejectedAnnouncements(),
-                'stats': sorter.stats
+                'stats': sorter.stats,
+                'scores': dict(ranking)
             }
 
             return True
@@ -161,6 +167,8 @@ class QuickImmoApp(tk.Tk):
         super().__init__()
 
         self.sorted_data = sorted_data
+        self.geo_index = None
+        self.similarity_index = None
         self.title("Recherche d'Appartements - Dijon (Données existantes)")
         self.geometry("1400x900")
         self.configure(bg='#f0f0f0')
@@ -229,7 +237,7 @@ class QuickImmoApp(tk.Tk):
 
         # Colonnes
         columns = ("Prix", "Type", "Localisation", "Surface",
-                   "Pièces", "Équipements", "Colocation", "Studio")
+                   "Pièces", "Équipements", "Colocation", "Studio", "Distance", "Score")
 
         # Treeview
         tree = ttk.Treeview(tree_frame, columns=columns,
@@ -239,7 +247,7 @@ class QuickImmoApp(tk.Tk):
         tree.column("#0", width=80, minwidth=80)
         tree.heading("#0", text="ID")
 
-        column_widths = [100, 150, 200, 80, 80, 200, 80, 80]
+        column_widths = [100, 150, 200, 80, 80, 200, 80, 80, 80, 60]
         for i, (col, width) in enumerate(zip(columns, column_widths)):
             tree.column(col, width=width, minwidth=width)
             tree.heading(col, text=col, anchor='w')
@@ -277,6 +285,9 @@ class QuickImmoApp(tk.Tk):
         ttk.Button(parent, text="Statistiques détaillées",
                    command=self.show_detailed_stats).pack(side='left', padx=5)
 
+        ttk.Button(parent, text="Recherche géographique",
+                   command=self.show_geo_search).pack(side='left', padx=5)
+
     def populate_data(self):
         """Remplit les tableaux avec les données"""
         self.populate_tree(self.valid_tree, self.sorted_data.get('valid', {}))
@@ -289,16 +300,17 @@ class QuickImmoApp(tk.Tk):
         for item in tree.get_children():
             tree.delete(item)
 
+        scores = self.sorted_data.get('scores', {})
+
         # Remplir avec les nouvelles données
         for key, item in data.items():
             # Extraction des informations
-            prix = item.get('prix', 'N/A')
+            prix = format_price(item.get('prix'))
             type_bien = item.get('type', 'N/A')
             localisation = item.get('localisation', 'N/A')
 
             # Surface et pièces
-            surface = f"{item.get('surface_m2', 'N/A')} m²" if item.get(
-                'surface_m2') else 'N/A'
+            surface = format_surface(item.get('surface_m2'))
             pieces = f"{item.get('nombre_pieces', 'N/A')}" if item.get(
                 'nombre_pieces') else 'N/A'
 
@@ -310,10 +322,14 @@ class QuickImmoApp(tk.Tk):
             # Indicateurs
             colocation = "Oui" if item.get('colocation', False) else "Non"
             studio = "Oui" if item.get('studio', False) else "Non"
+            distance = f"{item['distance_km']} km" if item.get(
+                'distance_km') is not None else ''
+
+            score = scores.get(key, '')
 
             # Insertion
             tree.insert('', 'end', text=key, values=(
-                prix, type_bien, localisation, surface, pieces, equipements, colocation, studio
+                prix, type_bien, localisation, surface, pieces, equipements, colocation, studio, distance, score
             ), tags=(item.get('lien', ''),))
 
     def on_double_click(self, tree):
@@ -324,6 +340,7 @@ class QuickImmoApp(tk.Tk):
             if item['tags'] and item['tags'][0]:
                 link = item['tags'][0]
                 try:
+                    import webbrowser
                     webbrowser.open(link)
                 except Exception as e:
                     messagebox.showerror(
@@ -331,15 +348,60 @@ class QuickImmoApp(tk.Tk):
 
     def show_context_menu(self, event, tree):
         """Affiche un menu contextuel"""
-        # À implémenter si nécessaire
-        pass
+        row = tree.identify_row(event.y)
+        if not row:
+            return
+        tree.selection_set(row)
+        key = tree.item(row, 'text')
+
+        menu = tk.Menu(self, tearoff=0)
+        menu.add_command(label="Ouvrir l'annonce",
+                         command=lambda: self.on_double_click(tree))
+        menu.add_command(label="Annonces similaires",
+                         command=lambda: self.show_similar(key))
+        try:
+            menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            menu.grab_release()
+
+    def show_similar(self, key, limit=20):
+        """Affiche les annonces valides les plus proches d'une annonce dans un onglet dédié"""
+        valid = self.sorted_data.get('valid', {})
+        listings = {**valid, **self.sorted_data.get('rejected', {})}
+        if self.similarity_index is None:
+            try:
+                from similarity import SimilarityIndex
+                self.similarity_index = SimilarityIndex(listings)
+            except RuntimeError as e:
+                messagebox.showerror("Erreur", str(e))
+                return
+
+        index = self.similarity_index
+        try:
+            neighbours = index.similar(key, limit, mask=index.mask_for(valid))
+        except KeyError:
+            messagebox.showerror("Erreur", f"Annonce inconnue: {key}")
+            return
+        results = {neighbour: valid[neighbour] for neighbour, _ in neighbours}
+
+        if not hasattr(self, 'similar_tree'):
+            frame = ttk.Frame(self.notebook)
+            self.notebook.add(frame, text="Similaires")
+            self.similar_frame = frame
+            self.similar_tree = self.create_treeview(frame)
+
+        self.populate_tree(self.similar_tree, results)
+        self.notebook.tab(self.similar_frame,
+                          text=f"Similaires à {key} ({len(results)})")
+        self.notebook.select(self.similar_frame)
 
     def export_results(self):
         """Exporte les résultats"""
         try:
             filename = f"export_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(self.sorted_data, f, ensure_ascii=False, indent=2)
+            export_sorted(filename, self.sorted_data.get('valid', {}),
+                          self.sorted_data.get('rejected', {}),
+                          stats=self.sorted_data.get('stats'), register=True)
             messagebox.showinfo("Succès", f"Données exportées dans {filename}")
         except Exception as e:
             messagebox.showerror("Erreur", f"Erreur lors de l'export: {e}")
@@ -349,6 +411,65 @@ class QuickImmoApp(tk.Tk):
         self.populate_data()
         messagebox.showinfo("Info", "Affichage rafraîchi")
 
+    def show_geo_search(self):
+        """Affiche la fenêtre de recherche par proximité"""
+        search_window = tk.Toplevel(self)
+        search_window.title("Recherche géographique")
+
+        fields = [("Latitude", "47.3220"), ("Longitude", "5.0415"),
+                  ("Rayon (km)", "2"), ("Nombre max", "20")]
+        entries = {}
+        for row, (label, default) in enumerate(fields):
+            ttk.Label(search_window, text=label).grid(
+                row=row, column=0, sticky='w', padx=5, pady=2)
+            entry = ttk.Entry(search_window)
+            entry.insert(0, default)
+            entry.grid(row=row, column=1, padx=5, pady=2)
+            entries[label] = entry
+
+        def run_search():
+            try:
+                lat = float(entries["Latitude"].get().replace(',', '.'))
+                lon = float(entries["Longitude"].get().replace(',', '.'))
+                radius = float(entries["Rayon (km)"].get().replace(',', '.'))
+                limit = int(entries["Nombre max"].get())
+            except ValueError:
+                messagebox.showerror("Erreur", "Valeurs numériques invalides")
+                return
+            self.show_nearby_results(lat, lon, radius, limit)
+            search_window.destroy()
+
+        ttk.Button(search_window, text="Rechercher", command=run_search).grid(
+            row=len(fields), column=0, columnspan=2, pady=5)
+
+    def show_nearby_results(self, lat, lon, radius_km, limit):
+        """Affiche les annonces valides les plus proches dans un onglet dédié"""
+        valid = self.sorted_data.get('valid', {})
+        if self.geo_index is None:
+            self.geo_index = GeoIndex.from_listings(valid)
+
+        if not len(self.geo_index):
+            messagebox.showinfo(
+                "Info", "Aucune annonce valide ne possède de coordonnées")
+            return
+
+        results = {}
+        for key, distance in self.geo_index.nearest(lat, lon, limit):
+            if distance > radius_km:
+                break
+            results[key] = dict(valid[key], distance_km=round(distance, 2))
+
+        if not hasattr(self, 'nearby_tree'):
+            frame = ttk.Frame(self.notebook)
+            self.notebook.add(frame, text="Proximité")
+            self.nearby_frame = frame
+            self.nearby_tree = self.create_treeview(frame)
+
+        self.populate_tree(self.nearby_tree, results)
+        self.notebook.tab(self.nearby_frame,
+                          text=f"Proximité ({len(results)})")
+        self.notebook.select(self.nearby_frame)
+
     def show_detailed_stats(self):
         """Affiche des statistiques détaillées"""
         stats = self.sorted_data.get('stats', {})
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Score pondéré et classement top-k des annonces
+Les caractéristiques sont extraites une seule fois en colonnes, puis le score
+est calculé par lots (vectorisé avec NumPy s'il est installé).
+"""
+
+import heapq
+import math
+from operator import attrgetter
+
+from geo_index import EARTH_RADIUS_KM, get_coordinates, haversine_km
+from listing import Equipement
+
+try:
+    import numpy as np
+except ImportError:  # NumPy est optionnel : repli en Python pur
+    np = None
+
+
+# Poids par défaut de chaque critère (0 pour l'ignorer)
+DEFAULT_WEIGHTS = {
+    "prix": 3.0,
+    "surface": 2.0,
+    "prix_m2": 2.0,
+    "pieces": 1.0,
+    "etage": 0.5,
+    "balcon": 0.5,
+    "parking": 0.5,
+    "ascenseur": 0.5,
+    "dpe": 1.0,
+    "distance": 2.0,
+}
+
+# Bornes de normalisation et sens de préférence ("plus" ou "moins")
+FEATURE_RANGES = {
+    "prix": (200, 1000, "moins"),
+    "surface": (20, 100, "plus"),
+    "prix_m2": (5, 25, "moins"),
+    "pieces": (1, 5, "plus"),
+    "etage": (0, 6, "plus"),
+    "balcon": (0, 1, "plus"),
+    "parking": (0, 1, "plus"),
+    "ascenseur": (0, 1, "plus"),
+    "dpe": (0, 6, "moins"),
+    "distance": (0, 10, "moins"),
+}
+
+FEATURES = tuple(FEATURE_RANGES)
+
+DPE_CLASSES = "ABCDEFG"
+DPE_INDEX = {letter: float(index) for index, letter in enumerate(DPE_CLASSES)}
+DPE_INDEX.update({letter.lower(): index for letter, index in DPE_INDEX.items()})
+
+# Critères lus dans le masque des équipements
+AMENITY_FEATURES = (
+    ("balcon", Equipement.BALCON),
+    ("parking", Equipement.PARKING),
+    ("ascenseur", Equipement.ASCENSEUR),
+)
+
+# Valeur normalisée attribuée à une donnée manquante (ni bonus ni malus)
+MISSING_SCORE = 0.5
+
+
+def extract_features(item, reference_points=None):
+    """
+    Extrait les caractéristiques numériques d'une annonce
+
+    Args:
+        item: Annonce normalisée (champs numériques typés)
+        reference_points: Points (latitude, longitude) pour la distance
+
+    Returns:
+        dict: {caractéristique: valeur ou None}
+    """
+    prix = item.get('prix')
+    surface = item.get('surface_m2')
+    pieces = item.get('nombre_pieces')
+    etage = item.get('etage')
+    equipements = int(item.get('equipements') or 0)
+
+    dpe = item.get('dpe')
+    dpe = DPE_INDEX.get(dpe) if isinstance(dpe, str) else None
+
+    distance = item.get('distance_km')
+    if distance is None and reference_points:
+        coords = get_coordinates(item)
+        if coords:
+            distance = min(haversine_km(coords[0], coords[1], lat, lon)
+                           for lat, lon in reference_points)
+
+    features = {
+        "prix": float(prix) if prix else None,
+        "surface": float(surface) if surface else None,
+        "prix_m2": prix / surface if prix and surface else None,
+        "pieces": float(pieces) if pieces else None,
+        "etage": float(etage) if etage is not None else None,
+        "dpe": dpe,
+        "distance": distance,
+    }
+    for feature, flag in AMENITY_FEATURES:
+        features[feature] = 1.0 if equipements & flag else 0.0
+    return features
+
+
+def typed_column(listings, field):
+    """
+    Valeurs d'un champ typé de Listing (NaN si absent)
+
+    Raises:
+        AttributeError: Annonce qui n'est pas un Listing
+    """
+    nan = float('nan')
+    return np.fromiter((nan if value is None else value
+                        for value in map(attrgetter(field), listings)),
+                       dtype=np.float64, count=len(listings))
+
+
+def nearest_distance_km(latitude, longitude, reference_points):
+    """
+    Distance au point de référence le plus proche, vectorisée
+
+    Returns:
+        numpy.ndarray: Distances en km (NaN sans coordonnées valides)
+    """
+    valid = (np.abs(latitude) <= 90) & (np.abs(longitude) <= 180)
+    lat = np.radians(np.where(valid, latitude, 0.0))
+    lon = np.radians(np.where(valid, longitude, 0.0))
+    points = np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+    best = np.full(len(latitude), np.inf)
+    for ref_lat, ref_lon in reference_points:
+        ref_lat, ref_lon = math.radians(ref_lat), math.radians(ref_lon)
+        reference = np.array((math.cos(ref_lat) * math.cos(ref_lon),
+                              math.cos(ref_lat) * math.sin(ref_lon), math.sin(ref_lat)))
+        chord = np.linalg.norm(points - reference, axis=1)
+        best = np.minimum(best, 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1.0)))
+    return np.where(valid, best, np.nan)
+
+
+class FeatureMatrix:
+    """Colonnes de caractéristiques (NaN pour les valeurs manquantes)"""
+
+    def __init__(self, listings, reference_points=None):
+        """
+        Args:
+            listings: Dictionnaire {clé: annonce}
+            reference_points: Points (latitude, longitude) pour la distance
+        """
+        self.keys = list(listings)
+        items = [listings[key] for key in self.keys]
+        if np is not None:
+            # Annonces typées (Listing) : une colonne par champ, sans
+            # dictionnaire intermédiaire par annonce
+            try:
+                self.columns = self.typed_columns(items, reference_points)
+                return
+            except AttributeError:
+                pass
+
+        rows = [extract_features(item, reference_points) for item in items]
+        nan = float('nan')
+        self.columns = {}
+        for feature in FEATURES:
+            values = [row[feature] if row[feature]
+                      is not None else nan for row in rows]
+            self.columns[feature] = np.array(
+                values, dtype=np.float64) if np is not None else values
+
+    @staticmethod
+    def typed_columns(items, reference_points=None):
+        """Colonnes construites à partir des champs typés de Listing"""
+        prix = typed_column(items, 'prix')
+        surface = typed_column(items, 'surface_m2')
+        pieces = typed_column(items, 'nombre_pieces')
+        # Une valeur nulle vaut donnée manquante (comme extract_features)
+        for column in (prix, surface, pieces):
+            column[column == 0] = np.nan
+        equipements = np.nan_to_num(typed_column(items, 'equipements')).astype(np.int64)
+        dpe = np.array([DPE_INDEX.get(value, np.nan) for value in map(attrgetter('dpe'), items)],
+                       dtype=np.float64)
+
+        distance = typed_column(items, 'distance_km')
+        if reference_points:
+            missing = np.isnan(distance)
+            if missing.any():
+                computed = nearest_distance_km(typed_column(items, 'latitude'),
+                                               typed_column(items, 'longitude'),
+                                               reference_points)
+                distance = np.where(missing, computed, distance)
+
+        columns = {
+            "prix": prix,
+            "surface": surface,
+            "prix_m2": prix / surface,
+            "pieces": pieces,
+            "etage": typed_column(items, 'etage'),
+            "dpe": dpe,
+            "distance": distance,
+        }
+        for feature, flag in AMENITY_FEATURES:
+            columns[feature] = ((equipements & int(flag)) > 0).astype(np.float64)
+        return columns
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class ScoringModel:
+    """Modèle de score pondéré configurable (score entre 0 et 100)"""
+
+    def __init__(self, weights=None, ranges=None, reference_points=None):
+        """
+        Args:
+            weights: Poids surchargeant DEFAULT_WEIGHTS
+            ranges: Bornes surchargeant FEATURE_RANGES
+            reference_points: Points (latitude, longitude) pour la distance
+        """
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights:
+            self.weights.update(weights)
+        self.ranges = dict(FEATURE_RANGES)
+        if ranges:
+            self.ranges.update(ranges)
+        self.reference_points = reference_points
+
+        total = sum(abs(w) for w in self.weights.values())
+        self.total_weight = total or 1.0
+
+    def normalize(self, feature, value):
+        """
+        Ramène une valeur entre 0 (défavorable) et 1 (favorable)
+        """
+        if value is None or value != value:
+            return MISSING_SCORE
+        low, high, direction = self.ranges[feature]
+        ratio = (value - low) / (high - low) if high != low else 0.0
+        ratio = min(max(ratio, 0.0), 1.0)
+        return ratio if direction == "plus" else 1.0 - ratio
+
+    def features(self, listings):
+        """Construit la matrice de caractéristiques des annonces"""
+        return FeatureMatrix(listings, self.reference_points)
+
+    def score_matrix(self, matrix):
+        """
+        Calcule les scores de toutes les annonces d'une matrice
+
+        Returns:
+            list ou numpy.ndarray: Scores dans l'ordre de matrix.keys
+        """
+        if np is not None:
+            scores = np.zeros(len(matrix), dtype=np.float64)
+            for feature in FEATURES:
+                weight = self.weights.get(feature, 0)
+                if not weight:
+                    continue
+                low, high, direction = self.ranges[feature]
+                column = matrix.columns[feature]
+                ratio = np.clip((column - low) / ((high - low) or 1.0), 0.0, 1.0)
+                if direction != "plus":
+                    ratio = 1.0 - ratio
+                scores += weight * np.where(np.isnan(column), MISSING_SCORE, ratio)
+            return scores * (100.0 / self.total_weight)
+
+        scores = [0.0] * len(matrix)
+        for feature in FEATURES:
+            weight = self.weights.get(feature, 0)
+            if not weight:
+                continue
+            for i, value in enumerate(matrix.columns[feature]):
+                scores[i] += weight * self.normalize(feature, value)
+        return [score * 100.0 / self.total_weight for score in scores]
+
+    def score(self, listings):
+        """
+        Calcule le score de chaque annonce
+
+        Returns:
+            dict: {clé: score}
+        """
+        matrix = self.features(listings)
+        scores = self.score_matrix(matrix)
+        return {key: round(float(s), 2) for key, s in zip(matrix.keys, scores)}
+
+    def top_k(self, listings, k=20, matrix=None):
+        """
+        Retourne les k meilleures annonces
+
+        Args:
+            listings: Dictionnaire {clé: annonce}
+            k: Nombre d'annonces (None pour toutes)
+            matrix: Matrice déjà calculée (évite une nouvelle extraction)
+
+        Returns:
+            list: Tuples (clé, score) par score décroissant
+        """
+        if matrix is None:
+            matrix = self.features(listings)
+        scores = self.score_matrix(matrix)
+        n = len(matrix)
+        if k is None or k >= n:
+            k = n
+        if k <= 0:
+            return []
+
+        if np is not None:
+            best = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+            best = best[np.argsort(-scores[best], kind='stable')]
+            return [(matrix.keys[i], round(float(scores[i]), 2)) for i in best]
+
+        best = heapq.nlargest(k, range(n), key=scores.__getitem__)
+        return [(matrix.keys[i], round(scores[i], 2)) for i in best]
+
+    def explain(self, item):
+        """
+        Détaille la contribution de chaque critère au score d'une annonce
+
+        Returns:
+            dict: {"score": score, "details": {critère: {valeur, note, contribution}}}
+        """
+        values = extract_features(item, self.reference_points)
+        details = {}
+        total = 0.0
+        for feature in FEATURES:
+            weight = self.weights.get(feature, 0)
+            if not weight:
+                continue
+            note = self.normalize(feature, values[feature])
+            contribution = weight * note * 100.0 / self.total_weight
+            total += contribution
+            value = values[feature]
+            details[feature] = {
+                "valeur": round(value, 2) if value is not None else None,
+                "note": round(note, 3),
+                "contribution": round(contribution, 2),
+            }
+        return {"score": round(total, 2), "details": details}
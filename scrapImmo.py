@@ -1,32 +1,96 @@
 import scrapy
 from scrapy.crawler import CrawlerProcess
 import json
-import re
 import os
+import time
 from datetime import datetime
 
+# Modules de l'extension et du middleware déclarés dans custom_settings ;
+# les traitements d'après crawl sont importés par les fonctions qui les utilisent
+from crawl_metrics import page_parsed
+from listing import parse_amenities, parse_number, parse_specificites
+from throttling import block_reason
+
+
+# Recherche SeLoger : les zones sont des codes INSEE, les autres critères fixes
+SEARCH_URL = ('https://www.seloger.com/list.htm?projects=1&types=2,1&places={places}'
+              '&price=NaN/550&surface=40/NaN&rooms=2,3&mandatorycommodities=0'
+              '&enterprise=0&qsVersion=1.0&sort=d_dt_crea&m=search_hp_last')
+DEFAULT_INSEE_CODES = (210292, 210231)
+
+
+def search_url(insee_codes):
+    """
+    URL de recherche SeLoger sur une ou plusieurs zones
+
+    Args:
+        insee_codes: Codes INSEE (entiers ou chaînes)
+
+    Returns:
+        str: URL de la première page de résultats
+    """
+    places = ','.join('{"inseeCodes":[%d]}' % int(code) for code in insee_codes)
+    return SEARCH_URL.format(places=f'[{places}]')
+
 
 class ImmoScrap(scrapy.Spider):
     name = "ImmoScrap"
-    start_urls = [
-        'https://www.seloger.com/list.htm?projects=1&types=2,1&places=[{"inseeCodes":[210292]},{"inseeCodes":[210231]}]&price=NaN/550&surface=40/NaN&rooms=2,3&mandatorycommodities=0&enterprise=0&qsVersion=1.0&sort=d_dt_crea&m=search_hp_last'
-    ]
+    start_urls = [search_url(DEFAULT_INSEE_CODES)]
 
     custom_settings = {
         'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/109.0.0.0 Safari/537.36',
         'FEED_EXPORT_ENCODING': 'utf-8',
         'ROBOTSTXT_OBEY': False,
-        'DOWNLOAD_DELAY': 1,  # Délai entre les requêtes
-        'RANDOMIZE_DOWNLOAD_DELAY': 0.5,
-        'CONCURRENT_REQUESTS': 1,
+        'DOWNLOAD_DELAY': 1,  # Délai initial, ajusté ensuite (throttling.py)
+        'RANDOMIZE_DOWNLOAD_DELAY': True,
+        'CONCURRENT_REQUESTS': 8,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 8,
         'COOKIES_ENABLED': True,
+        'AUTOTHROTTLE_ENABLED': False,
+        'DOWNLOADER_MIDDLEWARES': {
+            'throttling.AdaptiveThrottleMiddleware': 585,
+        },
+        'EXTENSIONS': {
+            'crawl_metrics.CrawlMetricsExtension': 500,
+        },
+        'ADAPTIVE_THROTTLE_TARGET_LATENCY': 1.0,
+        'ADAPTIVE_THROTTLE_MAX_CONCURRENCY': 4,
     }
 
-    def __init__(self, *args, **kwargs):
+    # Nouvelles tentatives d'une page captcha avant abandon
+    max_block_retries = 3
+
+    def __init__(self, ring_name=None, max_pages=None, start_url=None,
+                 insee_codes=None, output_file="res.json", *args, **kwargs):
+        """
+        Args:
+            ring_name: Segment de mémoire partagée où publier chaque page
+                       (affichage en direct par l'interface)
+            max_pages: Nombre maximal de pages (défaut : 5)
+            start_url: Première page de résultats (ex: serveur de test local)
+            insee_codes: Zones à rechercher (liste ou "210292,210231")
+            output_file: Fichier des résultats (le fichier détaillé est
+                         nommé d'après lui : res.json -> res_detailed.json)
+        """
         super(ImmoScrap, self).__init__(*args, **kwargs)
+        if insee_codes:
+            if isinstance(insee_codes, str):
+                insee_codes = [code for code in insee_codes.split(',') if code.strip()]
+            self.start_urls = [search_url(insee_codes)]
+        if start_url:
+            self.start_urls = [start_url]
+        self.output_file = output_file
+        self.detailed_file = os.path.splitext(output_file)[0] + "_detailed.json"
         self.results = {}
         self.page_count = 0
-        self.max_pages = 5  # Limiter le nombre de pages
+        self.blocked_pages = 0
+        # Limiter le nombre de pages (run_scraper le fixe sur la classe)
+        self.max_pages = int(max_pages or getattr(type(self), 'max_pages', 5))
+
+        self.publisher = None
+        if ring_name:
+            from shared_handoff import ListingPublisher
+            self.publisher = ListingPublisher(ring_name)
 
     def contains_word(self, s, words):
         """
@@ -55,12 +119,7 @@ class ImmoScrap(scrapy.Spider):
         Returns:
             int: Surface en m² ou None
         """
-        for spec in specificites:
-            if "m²" in spec:
-                match = re.search(r'(\d+)\s*m²', spec)
-                if match:
-                    return int(match.group(1))
-        return None
+        return parse_specificites(specificites).get('surface_m2')
 
     def extract_rooms(self, specificites):
         """
@@ -72,37 +131,34 @@ class ImmoScrap(scrapy.Spider):
         Returns:
             int: Nombre de pièces ou None
         """
-        for spec in specificites:
-            if "pièce" in spec:
-                match = re.search(r'(\d+)\s*pièce', spec)
-                if match:
-                    return int(match.group(1))
-        return None
+        return parse_specificites(specificites).get('nombre_pieces')
 
     def clean_price(self, prix_str):
         """
-        Nettoie et standardise le prix
+        Convertit le prix affiché en nombre
 
         Args:
-            prix_str: Chaîne contenant le prix
+            prix_str: Chaîne contenant le prix (ex: "1 200 €")
 
         Returns:
-            str: Prix nettoyé
+            int/float: Prix en euros ou None
         """
-        if not prix_str:
-            return "N/A"
+        if not prix_str or not prix_str.strip():
+            return None
 
-        # Supprimer les espaces en trop et standardiser
-        prix_clean = prix_str.strip()
-        if not prix_clean or prix_clean == "":
-            return "N/A"
-
-        return prix_clean
+        return parse_number(prix_str)
 
     def parse(self, response):
         """
         Parse la page de résultats SeLoger
         """
+        # Page de vérification : ce n'est pas une page sans résultats
+        reason = block_reason(response)
+        if reason:
+            yield from self.retry_blocked(response, reason)
+            return
+
+        started = time.perf_counter()
         self.page_count += 1
         self.logger.info(f"Scraping page {self.page_count}")
 
@@ -111,8 +167,10 @@ class ImmoScrap(scrapy.Spider):
         if not articles:
             self.logger.warning(
                 f"Aucun article trouvé sur la page {self.page_count}")
+            self.page_done(started, 0)
             return
 
+        page_results = {}
         for i, article in enumerate(articles):
             # Extraction des données de base
             lien_relatif = article.css(
@@ -155,9 +213,8 @@ class ImmoScrap(scrapy.Spider):
             studio = self.contains_word(description, studio_keywords) or self.contains_word(
                 type_bien, studio_keywords)
 
-            # Extraction de données numériques
-            surface = self.extract_surface(specificite)
-            nombre_pieces = self.extract_rooms(specificite)
+            # Extraction des données numériques (une seule fois, au scraping)
+            valeurs = parse_specificites(specificite)
 
             # Génération d'un ID unique
             article_id = f"page{self.page_count}_item{i}"
@@ -171,8 +228,12 @@ class ImmoScrap(scrapy.Spider):
                 'localisation': localisation or "N/A",
                 'specificite': specificite,
                 'description': description,
-                'surface_m2': surface,
-                'nombre_pieces': nombre_pieces,
+                'surface_m2': valeurs.get('surface_m2'),
+                'nombre_pieces': valeurs.get('nombre_pieces'),
+                'nombre_chambres': valeurs.get('nombre_chambres'),
+                'etage': valeurs.get('etage'),
+                'etage_max': valeurs.get('etage_max'),
+                'equipements': int(parse_amenities(specificite, type_bien)),
                 'colocation': colocation,
                 'studio': studio,
                 'date_scraping': datetime.now().isoformat(),
@@ -180,9 +241,17 @@ class ImmoScrap(scrapy.Spider):
             }
 
             self.results[article_id] = annonce
+            page_results[article_id] = annonce
 
-        # Sauvegarde intermédiaire
-        self.save_results()
+        self.page_done(started, len(page_results))
+
+        if self.publisher is not None:
+            # Affichage en direct : la page part en mémoire partagée, sans
+            # réécrire res.json à chaque page
+            self.publisher.publish(page_results)
+        else:
+            # Sauvegarde intermédiaire
+            self.save_results()
 
         # Gestion de la pagination
         next_page = response.css('a.next::attr(href)').get()
@@ -196,8 +265,40 @@ class ImmoScrap(scrapy.Spider):
             else:
                 self.logger.info("Aucune page suivante trouvée")
 
-            # Sauvegarde finale
-            self.save_results(final=True)
+    def page_done(self, started, items):
+        """Signale le temps de parse et le nombre d'annonces d'une page (crawl_metrics.py)"""
+        self.crawler.signals.send_catch_log(
+            page_parsed, spider=self,
+            seconds=time.perf_counter() - started, items=items)
+
+    def retry_blocked(self, response, reason):
+        """
+        Replanifie une page bloquée (captcha, 429...) ; le middleware de
+        régulation a déjà ralenti le crawl
+        """
+        self.blocked_pages += 1
+        retries = response.meta.get('block_retries', 0)
+        if retries >= self.max_block_retries:
+            self.logger.error(
+                f"Page abandonnée après {retries} blocages ({reason}): {response.url}")
+            return
+        self.logger.warning(
+            f"Page bloquée ({reason}), nouvelle tentative {retries + 1}/"
+            f"{self.max_block_retries}: {response.url}")
+        yield response.request.replace(
+            dont_filter=True,
+            meta={**response.meta, 'block_retries': retries + 1})
+
+    def closed(self, reason):
+        """
+        Fin du crawl (appelée par Scrapy) : sauvegarde finale, quelle que soit
+        la façon dont le crawl s'arrête (dernière page, page vide, blocage),
+        puis prévient l'interface
+        """
+        self.save_results(final=True)
+        if self.publisher is not None:
+            self.publisher.close()
+            self.publisher = None
 
     def save_results(self, final=False):
         """
@@ -207,6 +308,8 @@ class ImmoScrap(scrapy.Spider):
             final: Si True, sauvegarde finale avec métadonnées
         """
         if final:
+            from data_catalog import register_file
+
             # Sauvegarde avec métadonnées
             final_results = {
                 'metadata': {
@@ -218,14 +321,15 @@ class ImmoScrap(scrapy.Spider):
                 'annonces': self.results
             }
 
-            with open("res_detailed.json", "w", encoding="utf-8") as f:
+            with open(self.detailed_file, "w", encoding="utf-8") as f:
                 json.dump(final_results, f, ensure_ascii=False, indent=2)
+            register_file(self.detailed_file)
 
             self.logger.info(
-                f"Sauvegarde finale: {len(self.results)} annonces dans res_detailed.json")
+                f"Sauvegarde finale: {len(self.results)} annonces dans {self.detailed_file}")
 
         # Sauvegarde simple pour compatibilité
-        with open("res.json", "w", encoding="utf-8") as f:
+        with open(self.output_file, "w", encoding="utf-8") as f:
             json.dump(self.results, f, ensure_ascii=False, indent=2)
 
         self.logger.info(f"Sauvegarde: {len(self.results)} annonces")
@@ -242,6 +346,13 @@ def run_scraper(max_pages=5, output_file="res.json"):
     Returns:
         dict: Données scrapées ou None en cas d'erreur
     """
+    from crawl_archive import archive_crawl
+    from data_catalog import register_file
+    from price_history import PriceHistory
+    from SortScrapSearch import SortScrapSearch
+    from stats_cube import update_cube
+    from text_index import TextIndex
+
     try:
         # Configuration du processus
         process = CrawlerProcess(settings={
@@ -259,13 +370,30 @@ def run_scraper(max_pages=5, output_file="res.json"):
         spider = ImmoScrap
         spider.max_pages = max_pages
 
-        process.crawl(spider)
+        process.crawl(spider, output_file=output_file)
         process.start()
 
         # Retourner les données si le fichier existe
         if os.path.exists(output_file):
             with open(output_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                data = json.load(f)
+            register_file(output_file)
+
+            # Indexation plein texte incrémentale du nouveau crawl
+            with TextIndex() as index:
+                index.add_listings(data, source=output_file)
+
+            # Historique des prix (seuls les changements sont journalisés),
+            # à partir des annonces triées : le statut y est enregistré
+            listings = SortScrapSearch(output_file).search
+            PriceHistory().record_crawl(listings)
+
+            # Agrégats par quartier / pièces / meublé / DPE du marché courant
+            update_cube(listings)
+
+            # Copie compressée du crawl (le fichier est écrasé au suivant)
+            archive_crawl(data, source=output_file)
+            return data
 
         return None
 
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Transmission des annonces du processus de crawl à l'interface, en mémoire
+partagée
+Le crawler publie chaque page d'annonces brutes dans un tampon circulaire
+(multiprocessing.shared_memory) ; l'interface le consulte à intervalle court
+et normalise puis affiche les annonces sans attendre l'écriture puis la
+relecture de res.json (voir pipeline.py).
+
+Un seul producteur (le crawler) et un seul consommateur (l'interface) :
+chacun ne modifie que sa propre position, ce qui évite tout verrou.
+
+Structure du segment :
+    MSRB | réservé | capacité | position d'écriture | position de lecture | fin
+    puis la zone de données : enregistrements [taille uint32][lot sérialisé]
+"""
+
+import multiprocessing
+import pickle
+import struct
+import time
+
+try:
+    from multiprocessing import shared_memory
+    SHARED_MEMORY_AVAILABLE = True
+except ImportError:
+    # Python < 3.8
+    SHARED_MEMORY_AVAILABLE = False
+
+from listing import as_dict
+
+
+RING_MAGIC = b"MSRB"
+DEFAULT_CAPACITY = 8 * 1024 * 1024      # 8 Mo : plusieurs pages d'annonces
+DEFAULT_TIMEOUT = 30.0                  # Attente maximale d'un tampon plein (s)
+POLL_INTERVAL_MS = 20                   # Consultation du tampon par l'interface
+
+# En-tête : magie, réservé, capacité, écriture, lecture, fin de publication
+HEADER = struct.Struct("<4sIQQQQ")
+CAPACITY_OFFSET = 8
+HEAD_OFFSET = 16
+TAIL_OFFSET = 24
+CLOSED_OFFSET = 32
+
+LENGTH = struct.Struct("<I")
+POSITION = struct.Struct("<Q")
+# Marqueur de fin de zone : l'enregistrement suivant reprend au début
+WRAP_MARKER = 0xFFFFFFFF
+
+
+class ListingRing:
+    """
+    Tampon circulaire à un producteur et un consommateur en mémoire partagée
+
+    Les positions d'écriture et de lecture croissent indéfiniment ; leur
+    différence donne le volume en attente. Un enregistrement est toujours
+    contigu : s'il ne tient pas avant la fin de la zone, un marqueur renvoie
+    au début.
+    """
+
+    def __init__(self, name=None, capacity=DEFAULT_CAPACITY):
+        """
+        Args:
+            name: Segment existant à rejoindre (None pour en créer un)
+            capacity: Taille de la zone de données (création uniquement)
+
+        Raises:
+            RuntimeError: multiprocessing.shared_memory indisponible
+            ValueError: Segment qui n'est pas un tampon d'annonces
+        """
+        if not SHARED_MEMORY_AVAILABLE:
+            raise RuntimeError("Mémoire partagée indisponible (Python 3.8+ requis)")
+
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True,
+                                                  size=HEADER.size + capacity)
+            HEADER.pack_into(self.shm.buf, 0, RING_MAGIC, 0, capacity, 0, 0, 0)
+        else:
+            # Le processus de crawl est un enfant de l'interface : il partage
+            # son suivi des ressources, seul le créateur supprime le segment
+            self.shm = shared_memory.SharedMemory(name=name)
+            if bytes(self.shm.buf[:4]) != RING_MAGIC:
+                self.shm.close()
+                raise ValueError(f"Segment {name} invalide")
+
+        self.name = self.shm.name
+        self.capacity = POSITION.unpack_from(self.shm.buf, CAPACITY_OFFSET)[0]
+        self.data = self.shm.buf[HEADER.size:HEADER.size + self.capacity]
+
+    def _get(self, offset):
+        return POSITION.unpack_from(self.shm.buf, offset)[0]
+
+    def _set(self, offset, value):
+        POSITION.pack_into(self.shm.buf, offset, value)
+
+    @property
+    def closed(self):
+        """Le producteur a terminé sa publication"""
+        return bool(self._get(CLOSED_OFFSET))
+
+    def pending(self):
+        """Octets écrits et pas encore lus"""
+        return self._get(HEAD_OFFSET) - self._get(TAIL_OFFSET)
+
+    def write(self, payload, timeout=DEFAULT_TIMEOUT):
+        """
+        Ajoute un enregistrement (côté producteur), en attendant si le tampon
+        est plein
+
+        Raises:
+            ValueError: Enregistrement plus grand que le tampon
+            TimeoutError: Le consommateur ne libère pas de place
+        """
+        size = LENGTH.size + len(payload)
+        if size > self.capacity // 2:
+            raise ValueError(f"Lot trop volumineux pour le tampon: {len(payload)} octets")
+
+        head = self._get(HEAD_OFFSET)
+        start = head % self.capacity
+        skip = self.capacity - start if start + size > self.capacity else 0
+
+        deadline = time.monotonic() + timeout
+        while self.capacity - (head - self._get(TAIL_OFFSET)) < skip + size:
+            if time.monotonic() > deadline:
+                raise TimeoutError("Tampon plein : l'interface ne consomme plus")
+            time.sleep(0.001)
+
+        if skip:
+            if skip >= LENGTH.size:
+                LENGTH.pack_into(self.data, start, WRAP_MARKER)
+            head += skip
+            start = 0
+        LENGTH.pack_into(self.data, start, len(payload))
+        self.data[start + LENGTH.size:start + size] = payload
+        # Publication : la position n'avance qu'une fois les données en place
+        self._set(HEAD_OFFSET, head + size)
+
+    def read(self):
+        """
+        Retire l'enregistrement suivant (côté consommateur)
+
+        Returns:
+            bytes ou None si le tampon est vide
+        """
+        tail = self._get(TAIL_OFFSET)
+        head = self._get(HEAD_OFFSET)
+        if tail == head:
+            return None
+        start = tail % self.capacity
+        remaining = self.capacity - start
+        if remaining < LENGTH.size or \
+                LENGTH.unpack_from(self.data, start)[0] == WRAP_MARKER:
+            tail += remaining
+            start = 0
+        length = LENGTH.unpack_from(self.data, start)[0]
+        payload = bytes(self.data[start + LENGTH.size:start + LENGTH.size + length])
+        self._set(TAIL_OFFSET, tail + LENGTH.size + length)
+        return payload
+
+    def mark_closed(self):
+        """Signale la fin de la publication (côté producteur)"""
+        self._set(CLOSED_OFFSET, 1)
+
+    def close(self):
+        """Détache le segment (et le supprime côté créateur)"""
+        self.data.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class ListingPublisher:
+    """Côté crawler : publie des lots d'annonces brutes"""
+
+    def __init__(self, name, timeout=DEFAULT_TIMEOUT):
+        """
+        Args:
+            name: Nom du segment créé par l'interface
+            timeout: Attente maximale si l'interface ne consomme plus
+        """
+        self.ring = ListingRing(name)
+        self.timeout = timeout
+        self.published = 0
+
+    def publish(self, listings):
+        """
+        Publie un lot
+
+        Args:
+            listings: Dictionnaire {clé: annonce} (dictionnaires ou Listing)
+        """
+        if not listings:
+            return
+        # Normalisation côté interface : le crawler ne fait que transmettre
+        batch = [(key, as_dict(item)) for key, item in listings.items()]
+        self.ring.write(pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL),
+                        timeout=self.timeout)
+        self.published += len(batch)
+
+    def close(self):
+        """Signale la fin du crawl et détache le segment"""
+        self.ring.mark_closed()
+        self.ring.close()
+
+
+class ListingSubscriber:
+    """Côté interface : crée le segment et récupère les lots publiés"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.ring = ListingRing(capacity=capacity)
+        self.name = self.ring.name
+        self.received = 0
+
+    def poll(self, max_batches=None):
+        """
+        Récupère les lots disponibles sans attendre
+
+        Args:
+            max_batches: Nombre maximal de lots lus (None pour tous)
+
+        Returns:
+            dict: Annonces brutes {clé: annonce} reçues (vide si rien de nouveau)
+        """
+        listings = {}
+        count = 0
+        while max_batches is None or count < max_batches:
+            payload = self.ring.read()
+            if payload is None:
+                break
+            listings.update(pickle.loads(payload))
+            count += 1
+        self.received += len(listings)
+        return listings
+
+    @property
+    def finished(self):
+        """Crawl terminé et tous les lots lus"""
+        return self.ring.closed and not self.ring.pending()
+
+    def close(self):
+        self.ring.close()
+
+
+def crawl_to_ring(ring_name, max_pages=None):
+    """
+    Exécute le spider en publiant chaque page dans le segment partagé
+    (cible du processus de crawl)
+
+    Args:
+        ring_name: Segment créé par l'interface
+        max_pages: Nombre maximal de pages (None : valeur par défaut du spider)
+    """
+    from scrapy.crawler import CrawlerProcess
+    from scrapImmo import ImmoScrap
+
+    process = CrawlerProcess(settings={'LOG_LEVEL': 'WARNING'})
+    process.crawl(ImmoScrap, ring_name=ring_name, max_pages=max_pages)
+    process.start()
+
+
+def start_crawler(ring_name, max_pages=None):
+    """
+    Lance le crawl dans un processus séparé
+
+    Returns:
+        multiprocessing.Process: Processus démarré
+    """
+    process = multiprocessing.Process(target=crawl_to_ring,
+                                      args=(ring_name, max_pages), daemon=True)
+    process.start()
+    return process
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cache des données normalisées, indexé par l'empreinte du fichier source
+Le résultat de la normalisation (annonces Listing typées) est sérialisé en
+binaire (pickle) dans un dossier .cache_annonces/ à côté du fichier source.
+Une entrée est valide si le chemin, la taille, la date de modification, le
+contenu et la version de la normalisation correspondent ; les entrées les
+moins récemment utilisées sont supprimées au-delà d'une taille maximale.
+"""
+
+import gc
+import hashlib
+import json
+import os
+import pickle
+import struct
+
+from listing import Listing, pack_listings, unpack_listings
+
+
+CACHE_DIRNAME = ".cache_annonces"
+CACHE_SUFFIX = ".snap"
+CACHE_MAGIC = b"MSAS"
+CACHE_VERSION = 1
+
+# Taille maximale d'un dossier de cache (octets)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+HASH_CHUNK = 1024 * 1024
+HEADER_LENGTH = struct.Struct("<I")
+
+
+def content_digest(raw):
+    """Empreinte d'un contenu déjà lu (identique à file_digest)"""
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def file_digest(path):
+    """Empreinte du contenu d'un fichier (BLAKE2b, lecture par blocs)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SnapshotCache:
+    """Cache disque des jeux de données normalisés"""
+
+    def __init__(self, version, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES,
+                 verify_content=False):
+        """
+        Args:
+            version: Version de la normalisation (toute modification invalide le cache)
+            cache_dir: Dossier du cache (par défaut .cache_annonces/ à côté de chaque source)
+            max_bytes: Taille maximale du dossier de cache avant éviction
+            verify_content: Recalculer l'empreinte du contenu même si taille et
+                            date de modification sont inchangées
+        """
+        self.version = version
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.verify_content = verify_content
+
+    def entry_path(self, source_path):
+        """Chemin de l'entrée de cache d'un fichier source"""
+        source_path = os.path.abspath(source_path)
+        directory = self.cache_dir or os.path.join(
+            os.path.dirname(source_path), CACHE_DIRNAME)
+        name = hashlib.blake2b(source_path.encode("utf-8"),
+                               digest_size=8).hexdigest()
+        base = os.path.splitext(os.path.basename(source_path))[0]
+        return os.path.join(directory, f"{base}-{name}{CACHE_SUFFIX}")
+
+    def read_header(self, entry_path, f):
+        """
+        Lit l'en-tête JSON d'une entrée (sans désérialiser les annonces)
+
+        Returns:
+            dict ou None si l'entrée est illisible
+        """
+        if f.read(len(CACHE_MAGIC)) != CACHE_MAGIC:
+            return None
+        raw = f.read(HEADER_LENGTH.size)
+        if len(raw) != HEADER_LENGTH.size:
+            return None
+        (length,) = HEADER_LENGTH.unpack(raw)
+        try:
+            header = json.loads(f.read(length).decode("utf-8"))
+        except ValueError:
+            return None
+        if header.get("format") != CACHE_VERSION:
+            return None
+        return header
+
+    def lookup(self, source_path):
+        """
+        Cherche une entrée valide pour un fichier source
+
+        Returns:
+            tuple: (chemin de l'entrée, en-tête, position des données) ou None
+        """
+        entry_path = self.entry_path(source_path)
+        try:
+            stat = os.stat(source_path)
+            with open(entry_path, "rb") as f:
+                header = self.read_header(entry_path, f)
+                offset = f.tell()
+        except OSError:
+            return None
+        if header is None:
+            self.discard(entry_path)
+            return None
+
+        if header["path"] != os.path.abspath(source_path) or \
+                header["version"] != self.version or header["size"] != stat.st_size:
+            return None
+        if header["mtime_ns"] != stat.st_mtime_ns or self.verify_content:
+            # Fichier touché ou copié : seul le contenu fait foi
+            if file_digest(source_path) != header["digest"]:
+                return None
+            if header["mtime_ns"] != stat.st_mtime_ns:
+                header["mtime_ns"] = stat.st_mtime_ns
+                offset = self.rewrite_header(entry_path, header, offset)
+        return entry_path, header, offset
+
+    def describe(self, source_path):
+        """
+        Métadonnées d'un fichier déjà en cache (nombre d'annonces...) sans
+        relire le JSON ni désérialiser les annonces
+
+        Returns:
+            dict ou None si le fichier n'est pas en cache
+        """
+        found = self.lookup(source_path)
+        return found[1] if found else None
+
+    def load(self, source_path):
+        """
+        Charge les annonces normalisées d'un fichier source
+
+        Returns:
+            dict: {clé: Listing} ou None si le cache est absent ou périmé
+        """
+        found = self.lookup(source_path)
+        if found is None:
+            return None
+        entry_path, _, offset = found
+        # Des centaines de milliers d'objets créés d'un coup déclencheraient
+        # le ramasse-miettes sans rien à libérer
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(entry_path, "rb") as f:
+                f.seek(offset)
+                kind, payload = pickle.load(f)
+            data = unpack_listings(*payload) if kind == "colonnes" else payload
+        except Exception:
+            self.discard(entry_path)
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        # Dernière utilisation, pour l'éviction LRU
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return data
+
+    def store(self, source_path, data, stat=None, digest=None):
+        """
+        Enregistre les annonces normalisées d'un fichier source
+
+        Args:
+            source_path: Fichier JSON d'origine
+            data: Dictionnaire {clé: Listing}
+            stat: os.stat du fichier au moment de sa lecture
+            digest: Empreinte du contenu lu (calculée si absente)
+
+        Returns:
+            str: Chemin de l'entrée, ou None si l'écriture a échoué
+        """
+        stat = stat or os.stat(source_path)
+        header = {
+            "format": CACHE_VERSION,
+            "path": os.path.abspath(source_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "digest": digest or file_digest(source_path),
+            "version": self.version,
+            "count": len(data),
+        }
+        entry_path = self.entry_path(source_path)
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+            # Annonces stockées en colonnes : relecture beaucoup plus rapide
+            if all(isinstance(item, Listing) for item in data.values()):
+                payload = ("colonnes", pack_listings(data))
+            else:
+                payload = ("brut", data)
+            with open(tmp_path, "wb") as f:
+                self.write_header(f, header)
+                pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            print(f"Cache non écrit pour {source_path}: {e}")
+            self.discard(tmp_path)
+            return None
+
+        self.evict(os.path.dirname(entry_path), keep=entry_path)
+        return entry_path
+
+    def write_header(self, f, header):
+        encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        f.write(CACHE_MAGIC)
+        f.write(HEADER_LENGTH.pack(len(encoded)))
+        f.write(encoded)
+
+    def rewrite_header(self, entry_path, header, offset):
+        """
+        Met à jour l'en-tête d'une entrée en conservant ses données
+
+        Returns:
+            int: Nouvelle position des données (inchangée en cas d'échec)
+        """
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        try:
+            with open(entry_path, "rb") as src, open(tmp_path, "wb") as dst:
+                self.write_header(dst, header)
+                new_offset = dst.tell()
+                src.seek(offset)
+                for chunk in iter(lambda: src.read(HASH_CHUNK), b""):
+                    dst.write(chunk)
+            os.replace(tmp_path, entry_path)
+            return new_offset
+        except OSError:
+            self.discard(tmp_path)
+            return offset
+
+    def evict(self, directory, keep=None):
+        """
+        Supprime les entrées les moins récemment utilisées au-delà de max_bytes
+
+        Returns:
+            int: Nombre d'entrées supprimées
+        """
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return 0
+
+        entries = []
+        for name in names:
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            if self.discard(path):
+                total -= size
+                removed += 1
+        return removed
+
+    @staticmethod
+    def discard(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
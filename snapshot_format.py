@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Instantané binaire des annonces, ouvert par mmap
+Format versionné (.msnap) : colonnes numériques à largeur fixe et tas de
+chaînes indexés par offsets, alignés sur 8 octets. À l'ouverture, seul
+l'en-tête est lu : les colonnes sont des vues memoryview sur le fichier
+projeté en mémoire (aucune copie) et un champ texte n'est décodé que
+lorsqu'il est lu. Plusieurs processus partagent les mêmes pages du cache
+système.
+
+Structure :
+    MSNP | version (uint16) | réservé (uint16) | taille de l'en-tête (uint32)
+    en-tête JSON (nombre d'annonces, colonnes : type, offset, taille)
+    blocs de colonnes, chacun aligné sur 8 octets
+"""
+
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+
+from listing import (BOOL_FIELDS, FIELDS, FLOAT_FIELDS, INTERNED_FIELDS,
+                     NUMBER_FIELDS, Listing, Status)
+
+
+SNAPSHOT_MAGIC = b"MSNP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_EXTENSION = ".msnap"
+
+HEADER_STRUCT = struct.Struct("<4sHHI")
+ALIGNMENT = 8
+
+# Séparateur des éléments d'une liste de chaînes (spécificités)
+LIST_SEPARATOR = "\x1f"
+
+# Colonnes d'état du tri, à côté des champs de l'annonce
+STATE_COLUMNS = (("status", "B"), ("rejection", "I"))
+_STATUSES = tuple(Status)
+
+
+def column_kind(name, values):
+    """
+    Type de stockage d'une colonne
+
+    Returns:
+        str: "d" (float64, NaN si absent), "B" (octet), "I" (uint32),
+             "liste", "texte" ou "json" (valeurs non textuelles)
+    """
+    if name in NUMBER_FIELDS or name in FLOAT_FIELDS:
+        return "d"
+    if name in BOOL_FIELDS:
+        return "B"
+    if name == "equipements":
+        return "I"
+    if name == "specificite":
+        return "liste"
+    if all(value is None or isinstance(value, str) for value in values):
+        return "texte"
+    return "json"
+
+
+def _encode_strings(values):
+    """
+    Tas de chaînes : offsets uint64 (n + 1), marqueurs d'absence, octets UTF-8
+    """
+    offsets = array("Q", [0])
+    nulls = bytearray(len(values))
+    chunks = []
+    position = 0
+    for i, value in enumerate(values):
+        if value is None:
+            nulls[i] = 1
+        else:
+            encoded = value.encode("utf-8")
+            chunks.append(encoded)
+            position += len(encoded)
+        offsets.append(position)
+    return offsets.tobytes(), bytes(nulls), b"".join(chunks)
+
+
+def write_snapshot(listings, path, metadata=None):
+    """
+    Écrit un instantané (écriture atomique)
+
+    Args:
+        listings: Dictionnaire {clé: annonce} (Listing ou dictionnaire normalisé)
+        path: Fichier .msnap
+        metadata: Informations libres enregistrées dans l'en-tête
+
+    Returns:
+        int: Nombre d'annonces écrites
+    """
+    keys = [str(key) for key in listings]
+    items = [Listing.from_dict(item) for item in listings.values()]
+    count = len(items)
+
+    blocks = []
+    columns = {}
+
+    def add_block(data):
+        blocks.append(data)
+        return len(blocks) - 1
+
+    for name in FIELDS + ("extra",):
+        values = [getattr(item, name) for item in items]
+        kind = "json" if name == "extra" else column_kind(name, values)
+        column = {"type": kind}
+        if kind == "d":
+            column["bloc"] = add_block(array("d", [
+                math.nan if value is None else value for value in values]).tobytes())
+        elif kind in ("B", "I"):
+            column["bloc"] = add_block(array(kind, [
+                int(value or 0) for value in values]).tobytes())
+        else:
+            if kind == "liste":
+                values = [LIST_SEPARATOR.join(value) for value in values]
+            elif kind == "json":
+                values = [None if value is None else
+                          json.dumps(value, ensure_ascii=False) for value in values]
+            offsets, nulls, heap = _encode_strings(values)
+            column["offsets"] = add_block(offsets)
+            column["absents"] = add_block(nulls)
+            column["bloc"] = add_block(heap)
+        columns[name] = column
+
+    for name, kind in STATE_COLUMNS:
+        columns[name] = {"type": kind, "bloc": add_block(array(kind, [
+            int(getattr(item, name)) for item in items]).tobytes())}
+
+    offsets, nulls, heap = _encode_strings(keys)
+    columns["__cle"] = {"type": "texte", "offsets": add_block(offsets),
+                        "absents": add_block(nulls), "bloc": add_block(heap)}
+
+    # Positions des blocs relatives au début des données (aligné après l'en-tête)
+    layout = []
+    position = 0
+    for block in blocks:
+        layout.append([position, len(block)])
+        position = _align(position + len(block))
+    dates = [str(item.date_scraping).replace(" ", "T")[:19]
+             for item in items if item.date_scraping]
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "nombre": count,
+        "date_min": min(dates) if dates else None,
+        "date_max": max(dates) if dates else None,
+        "ordre_octets": sys.byteorder,
+        "cree_le": datetime.now().isoformat(timespec="seconds"),
+        "metadata": metadata or {},
+        "colonnes": columns,
+        "blocs": layout,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False,
+                              separators=(",", ":")).encode("utf-8")
+    data_start = _align(HEADER_STRUCT.size + len(header_bytes))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER_STRUCT.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0,
+                                   len(header_bytes)))
+        f.write(header_bytes)
+        for block, (offset, _) in zip(blocks, layout):
+            f.write(b"\0" * (data_start + offset - f.tell()))
+            f.write(block)
+    os.replace(tmp_path, path)
+    return count
+
+
+def _align(position):
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def read_snapshot_header(path):
+    """
+    Lit seulement l'en-tête d'un instantané (catalogue, vérifications)
+
+    Returns:
+        dict: En-tête, avec "debut_donnees" (offset du premier bloc)
+
+    Raises:
+        ValueError: Fichier qui n'est pas un instantané de version connue
+    """
+    with open(path, "rb") as f:
+        prefix = f.read(HEADER_STRUCT.size)
+        if len(prefix) < HEADER_STRUCT.size:
+            raise ValueError(f"{path} n'est pas un instantané MSNP")
+        magic, version, _, header_size = HEADER_STRUCT.unpack(prefix)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} n'est pas un instantané MSNP")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Version d'instantané non supportée: {version}")
+        header = json.loads(f.read(header_size))
+    header["debut_donnees"] = _align(HEADER_STRUCT.size + header_size)
+    return header
+
+
+class Snapshot:
+    """
+    Instantané ouvert en lecture seule par mmap
+
+    Les colonnes sont exposées sans copie (memoryview) ; les annonces
+    (SnapshotListing) décodent leurs champs à la première lecture.
+    Le fichier reste projeté tant que des annonces y font référence.
+    """
+
+    def __init__(self, path):
+        """
+        Raises:
+            ValueError: Fichier invalide ou écrit sur une machine d'ordre
+                        d'octets différent
+        """
+        self.path = path
+        self.header = read_snapshot_header(path)
+        if self.header["ordre_octets"] != sys.byteorder:
+            raise ValueError("Instantané écrit avec un autre ordre d'octets")
+        self.count = self.header["nombre"]
+        self.metadata = self.header["metadata"]
+        self.columns = self.header["colonnes"]
+
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.map)
+        self.views = {}
+        self.readers = {}
+        self._keys = None
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Libère la projection (les annonces non décodées deviennent illisibles)"""
+        self.readers.clear()
+        for view in self.views.values():
+            view.release()
+        self.views.clear()
+        self.buffer.release()
+        self.map.close()
+
+    def block(self, index, fmt="B"):
+        """Vue sans copie d'un bloc, typée selon fmt ("d", "I", "Q", "B")"""
+        cache_key = (index, fmt)
+        view = self.views.get(cache_key)
+        if view is None:
+            offset, size = self.header["blocs"][index]
+            offset += self.header["debut_donnees"]
+            view = self.buffer[offset:offset + size]
+            if fmt != "B":
+                view = view.cast("B").cast(fmt)
+            self.views[cache_key] = view
+        return view
+
+    def column(self, name):
+        """
+        Colonne numérique sans copie (utilisable par numpy.frombuffer)
+
+        Returns:
+            memoryview: float64 ("d"), uint8 ("B") ou uint32 ("I")
+        """
+        column = self.columns[name]
+        if column["type"] not in ("d", "B", "I"):
+            raise ValueError(f"La colonne {name} n'est pas numérique")
+        return self.block(column["bloc"], column["type"])
+
+    def text(self, name, row):
+        """Décode une seule valeur d'une colonne de chaînes (None si absente)"""
+        column = self.columns[name]
+        if self.block(column["absents"])[row]:
+            return None
+        offsets = self.block(column["offsets"], "Q")
+        heap = self.block(column["bloc"])
+        return str(heap[offsets[row]:offsets[row + 1]], "utf-8")
+
+    def value(self, name, row):
+        """
+        Valeur typée d'un champ, décodée à la demande
+
+        Returns:
+            Valeur au format de Listing (int/float, bool, tuple, str...)
+        """
+        reader = self.readers.get(name)
+        if reader is None:
+            reader = self.readers[name] = self.make_reader(name)
+        return reader(row)
+
+    def make_reader(self, name):
+        """Fonction de lecture d'une colonne (vues résolues une seule fois)"""
+        kind = self.columns[name]["type"]
+        if kind == "d":
+            view = self.column(name)
+            integral = name in NUMBER_FIELDS
+
+            def read(row):
+                value = view[row]
+                if value != value:
+                    return None
+                if integral and value.is_integer():
+                    return int(value)
+                return value
+            return read
+        if kind == "B":
+            view = self.column(name)
+            if name in BOOL_FIELDS:
+                return lambda row: bool(view[row])
+            return view.__getitem__
+        if kind == "I":
+            view = self.column(name)
+            return lambda row: view[row] or None
+
+        column = self.columns[name]
+        nulls = self.block(column["absents"])
+        offsets = self.block(column["offsets"], "Q")
+        heap = self.block(column["bloc"])
+
+        def text(row):
+            if nulls[row]:
+                return None
+            return str(heap[offsets[row]:offsets[row + 1]], "utf-8")
+
+        if kind == "liste":
+            def read(row):
+                value = text(row)
+                return tuple(sys.intern(part) for part in value.split(LIST_SEPARATOR)) \
+                    if value else ()
+            return read
+        if kind == "json":
+            def read(row):
+                value = text(row)
+                return None if value is None else json.loads(value)
+            return read
+        if name in INTERNED_FIELDS:
+            def read(row):
+                value = text(row)
+                return None if value is None else sys.intern(value)
+            return read
+        return text
+
+    def keys(self):
+        """Clés des annonces (décodées une fois)"""
+        if self._keys is None:
+            column = self.columns["__cle"]
+            offsets = self.block(column["offsets"], "Q").tolist()
+            heap = self.block(column["bloc"]).tobytes()
+            text = heap.decode("utf-8")
+            if len(text) == len(heap):
+                # Clés ASCII : offsets d'octets = offsets de caractères
+                self._keys = [text[offsets[row]:offsets[row + 1]]
+                              for row in range(self.count)]
+            else:
+                self._keys = [str(heap[offsets[row]:offsets[row + 1]], "utf-8")
+                              for row in range(self.count)]
+        return self._keys
+
+    def listing(self, row):
+        """Annonce paresseuse d'une ligne"""
+        listing = SnapshotListing.__new__(SnapshotListing)
+        listing._snapshot = self
+        listing._row = row
+        listing.status = _STATUSES[self.column("status")[row]]
+        listing.rejection = self.column("rejection")[row]
+        return listing
+
+    def listings(self):
+        """
+        Toutes les annonces, sans décoder leurs champs
+
+        Returns:
+            dict: {clé: SnapshotListing}
+        """
+        statuses = self.column("status").tolist()
+        rejections = self.column("rejection").tolist()
+        new = SnapshotListing.__new__
+        listings = {}
+        for row, key in enumerate(self.keys()):
+            listing = new(SnapshotListing)
+            listing._snapshot = self
+            listing._row = row
+            listing.status = _STATUSES[statuses[row]]
+            listing.rejection = rejections[row]
+            listings[key] = listing
+        return listings
+
+
+def _lazy_field(name, slot):
+    """Propriété lisant un champ dans l'instantané à la première lecture"""
+    def getter(self):
+        try:
+            return slot.__get__(self, Listing)
+        except AttributeError:
+            value = self._snapshot.value(name, self._row)
+            slot.__set__(self, value)
+            return value
+
+    def setter(self, value):
+        slot.__set__(self, value)
+
+    return property(getter, setter)
+
+
+class SnapshotListing(Listing):
+    """
+    Annonce adossée à un instantané : chaque champ est décodé à sa première
+    lecture puis conservé ; le statut de tri et les champs modifiés
+    (distance...) restent propres à l'objet.
+    """
+
+    __slots__ = ("_snapshot", "_row")
+
+    def __reduce__(self):
+        # Une copie (cache, processus) ne dépend plus du fichier projeté
+        return (Listing.from_dict, (self.to_dict(),))
+
+
+for _name in FIELDS + ("extra",):
+    setattr(SnapshotListing, _name, _lazy_field(_name, Listing.__dict__[_name]))
+del _name
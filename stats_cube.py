@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cube d'agrégats précalculés par quartier, code postal, pièces, meublé et DPE
+Chaque annonce alimente, en un seul passage, toutes les combinaisons de
+dimensions (2^5 cellules, "*" désignant "tous") : effectif, sommes et sketch de
+quantiles. Une question du type « loyer médian au m² des 3 pièces à Grangier
+contre Parc » se lit alors directement dans le cube, sans relire les annonces.
+
+Le cube enregistré décrit le marché du dernier crawl : à chaque crawl, une
+annonce nouvelle est ajoutée, une annonce dont le prix, la surface ou les
+modalités ont changé voit son ancienne contribution retirée puis remplacée, et
+une annonce absente du crawl est retirée.
+"""
+
+import json
+import os
+from itertools import product
+
+from entity_resolution import listing_district, normalize_text
+from listing import (Equipement, listing_document_id, parse_number,
+                     parse_specificites)
+from stats_engine import DEFAULT_ALPHA, QUANTILES, QuantileSketch
+
+
+DEFAULT_CUBE_PATH = "cube_statistiques.json"
+CUBE_VERSION = 2
+
+ALL = "*"
+UNKNOWN = "inconnu"
+MAX_ROOMS = 5               # 5 pièces et plus regroupées ("5+")
+
+DIMENSIONS = ("quartier", "code_postal", "pieces", "meuble", "dpe")
+
+
+def rooms_value(rooms):
+    """Modalité "pieces" ("1" à "4", "5+", "inconnu")"""
+    rooms = parse_number(rooms)
+    if not rooms:
+        return UNKNOWN
+    if rooms >= MAX_ROOMS:
+        return f"{MAX_ROOMS}+"
+    return str(int(rooms))
+
+
+def dimension_value(dimension, value):
+    """
+    Normalise une valeur de dimension fournie par l'utilisateur
+    ("Grangier" -> "grangier", 3 -> "3", True -> "oui")
+    """
+    if value is None or value == ALL:
+        return ALL
+    if dimension == "quartier":
+        return normalize_text(str(value)).replace(" ", "-")
+    if dimension == "pieces":
+        return value if value in (UNKNOWN, f"{MAX_ROOMS}+") else rooms_value(value)
+    if dimension == "meuble":
+        if isinstance(value, bool):
+            return "oui" if value else "non"
+        return str(value).lower()
+    if dimension == "dpe":
+        return str(value).upper() if value != UNKNOWN else UNKNOWN
+    return str(value)
+
+
+def listing_dimensions(item):
+    """
+    Modalités d'une annonce (Listing ou dictionnaire brut d'un crawl)
+
+    Returns:
+        tuple: Valeurs dans l'ordre de DIMENSIONS
+    """
+    rooms = item.get("nombre_pieces")
+    if rooms is None:
+        rooms = parse_specificites(item.get("specificite")).get("nombre_pieces")
+    postal_code = item.get("postal_code")
+    amenities = item.get("equipements")
+    if amenities is not None:
+        furnished = bool(amenities & Equipement.MEUBLE)
+    else:
+        furnished = "meubl" in (item.get("type") or "").lower()
+    return (
+        listing_district(item) or UNKNOWN,
+        str(postal_code) if postal_code else UNKNOWN,
+        rooms_value(rooms),
+        "oui" if furnished else "non",
+        str(item.get("dpe")).upper() if item.get("dpe") else UNKNOWN,
+    )
+
+
+def listing_measures(item):
+    """
+    Loyer et surface d'une annonce
+
+    Returns:
+        tuple: (prix, surface) ; None pour une valeur absente
+    """
+    price = parse_number(item.get("prix")) or None
+    surface = parse_number(item.get("surface_m2"))
+    if surface is None:
+        surface = parse_specificites(item.get("specificite")).get("surface_m2")
+    return price, surface or None
+
+
+class CubeCell:
+    """Agrégats d'une cellule du cube (fusionnables)"""
+
+    __slots__ = ("count", "price_sum", "surface_sum", "surface_price_sum",
+                 "price", "price_m2")
+
+    def __init__(self, alpha=DEFAULT_ALPHA):
+        self.count = 0
+        self.price_sum = 0.0
+        self.surface_sum = 0.0
+        self.surface_price_sum = 0.0    # Loyers des annonces dont la surface est connue
+        self.price = QuantileSketch(alpha)
+        self.price_m2 = QuantileSketch(alpha)
+
+    def add(self, price, surface):
+        self.count += 1
+        if price:
+            self.price_sum += price
+            self.price.add(price)
+        if price and surface:
+            self.surface_sum += surface
+            self.surface_price_sum += price
+            self.price_m2.add(price / surface)
+
+    def subtract(self, other):
+        """Retire les agrégats d'une cellule déjà fusionnée dans celle-ci"""
+        self.count -= other.count
+        self.price_sum -= other.price_sum
+        self.surface_sum -= other.surface_sum
+        self.surface_price_sum -= other.surface_price_sum
+        self.price.subtract(other.price)
+        self.price_m2.subtract(other.price_m2)
+        return self
+
+    def merge(self, other):
+        self.count += other.count
+        self.price_sum += other.price_sum
+        self.surface_sum += other.surface_sum
+        self.surface_price_sum += other.surface_price_sum
+        self.price.merge(other.price)
+        self.price_m2.merge(other.price_m2)
+        return self
+
+    def summary(self):
+        """
+        Returns:
+            dict: {nombre, prix_moyen, prix_median, prix_m2_moyen,
+                   prix_m2_p10, prix_m2_mediane, prix_m2_p90}
+        """
+        def rounded(value):
+            return round(value, 2) if value is not None else None
+
+        summary = {
+            "nombre": self.count,
+            "prix_moyen": rounded(self.price.mean()),
+            "prix_median": rounded(self.price.quantile(0.5)),
+            # Moyenne pondérée par la surface (loyer total / surface totale)
+            "prix_m2_moyen": rounded(self.surface_price_sum / self.surface_sum
+                                     if self.surface_sum else None),
+        }
+        for label, q in QUANTILES.items():
+            summary[f"prix_m2_{label}"] = rounded(self.price_m2.quantile(q))
+        return summary
+
+    def to_dict(self):
+        return {
+            "nombre": self.count,
+            "somme_prix": self.price_sum,
+            "somme_surface": self.surface_sum,
+            "somme_prix_surface": self.surface_price_sum,
+            "prix": self.price.to_dict(),
+            "prix_m2": self.price_m2.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        cell = cls()
+        cell.count = data["nombre"]
+        cell.price_sum = data["somme_prix"]
+        cell.surface_sum = data["somme_surface"]
+        cell.surface_price_sum = data["somme_prix_surface"]
+        cell.price = QuantileSketch.from_dict(data["prix"])
+        cell.price_m2 = QuantileSketch.from_dict(data["prix_m2"])
+        return cell
+
+
+class StatsCube:
+    """
+    Cube d'agrégats sur DIMENSIONS, avec tous les regroupements précalculés
+
+    Les cellules sont indexées par un tuple de modalités où ALL ("*")
+    remplace les dimensions regroupées : ("grangier", "*", "3", "*", "*")
+    agrège les 3 pièces de Grangier, tous codes postaux, meublés et DPE.
+    """
+
+    def __init__(self, alpha=DEFAULT_ALPHA):
+        """
+        Args:
+            alpha: Erreur relative des quantiles
+        """
+        self.alpha = alpha
+        self.cells = {}
+        self.values = {dimension: set() for dimension in DIMENSIONS}
+        # Contribution de chaque annonce comptée : (modalités, prix, surface)
+        self.listings = {}
+
+    def add(self, key, item):
+        """
+        Ajoute une annonce (voir add_all)
+
+        Returns:
+            bool: True si l'annonce a été ajoutée ou mise à jour
+        """
+        return self.add_all({key: item}) == 1
+
+    def add_all(self, listings, status=None):
+        """
+        Ajoute ou met à jour des annonces
+
+        Les annonces sont d'abord agrégées au niveau le plus fin (une cellule
+        par combinaison complète de modalités), puis chaque cellule fine est
+        fusionnée dans ses 2^5 regroupements : le coût des regroupements
+        dépend du nombre de combinaisons, pas du nombre d'annonces.
+
+        Une annonce déjà comptée n'est reprise que si son prix, sa surface ou
+        ses modalités ont changé ; son ancienne contribution est alors retirée.
+
+        Args:
+            listings: Dictionnaire {clé: annonce}
+            status: Ne retenir que les annonces de ce statut (None pour toutes)
+
+        Returns:
+            int: Nombre d'annonces ajoutées ou mises à jour
+        """
+        added = {}
+        removed = {}
+        changed = 0
+        for key, item in listings.items():
+            if status is not None and getattr(item, "status", None) != status:
+                continue
+            price, surface = listing_measures(item)
+            if price is None:
+                continue
+            listing_id = listing_document_id(key, item)
+            contribution = (listing_dimensions(item), price, surface)
+            previous = self.listings.get(listing_id)
+            if previous == contribution:
+                continue
+            if previous is not None:
+                self.accumulate(removed, previous)
+            self.accumulate(added, contribution)
+            self.listings[listing_id] = contribution
+            changed += 1
+        self.apply(added, removed)
+        return changed
+
+    def remove(self, listing_ids):
+        """
+        Retire des annonces comptées (disparues du marché)
+
+        Returns:
+            int: Nombre d'annonces retirées
+        """
+        removed = {}
+        count = 0
+        for listing_id in listing_ids:
+            previous = self.listings.pop(listing_id, None)
+            if previous is not None:
+                self.accumulate(removed, previous)
+                count += 1
+        self.apply({}, removed)
+        return count
+
+    def update(self, listings):
+        """
+        Met le cube à l'état d'un crawl : annonces nouvelles ou modifiées
+        (re)comptées, annonces absentes du crawl retirées
+
+        Args:
+            listings: Dictionnaire {clé: annonce} du crawl complet
+
+        Returns:
+            tuple: (annonces ajoutées ou mises à jour, annonces retirées)
+        """
+        current = {listing_document_id(key, item) for key, item in listings.items()}
+        changed = self.add_all(listings)
+        gone = self.remove([listing_id for listing_id in self.listings
+                            if listing_id not in current])
+        return changed, gone
+
+    def accumulate(self, base, contribution):
+        """Ajoute une contribution à sa cellule fine"""
+        dimensions, price, surface = contribution
+        cell = base.get(dimensions)
+        if cell is None:
+            cell = base[dimensions] = CubeCell(self.alpha)
+        cell.add(price, surface)
+
+    def apply(self, added, removed):
+        """Reporte des cellules fines ajoutées et retirées sur leurs regroupements"""
+        for dimensions, cell in added.items():
+            for dimension, value in zip(DIMENSIONS, dimensions):
+                self.values[dimension].add(value)
+            for cell_key in product(*((value, ALL) for value in dimensions)):
+                target = self.cells.get(cell_key)
+                if target is None:
+                    target = self.cells[cell_key] = CubeCell(self.alpha)
+                target.merge(cell)
+        for dimensions, cell in removed.items():
+            for cell_key in product(*((value, ALL) for value in dimensions)):
+                target = self.cells[cell_key].subtract(cell)
+                if not target.count:
+                    del self.cells[cell_key]
+
+    def merge(self, other):
+        """Ajoute les agrégats d'un autre cube (annonces non déjà comptées)"""
+        if self.listings.keys() & other.listings.keys():
+            raise ValueError("Les cubes partagent des annonces : fusion impossible")
+        for cell_key, cell in other.cells.items():
+            if cell_key in self.cells:
+                self.cells[cell_key].merge(cell)
+            else:
+                self.cells[cell_key] = CubeCell.from_dict(cell.to_dict())
+        for dimension, values in other.values.items():
+            self.values[dimension].update(values)
+        self.listings.update(other.listings)
+        return self
+
+    def cell_key(self, filters):
+        unknown = set(filters) - set(DIMENSIONS)
+        if unknown:
+            raise KeyError(f"Dimensions inconnues: {', '.join(sorted(unknown))}")
+        return tuple(dimension_value(dimension, filters.get(dimension))
+                     for dimension in DIMENSIONS)
+
+    def query(self, **filters):
+        """
+        Agrégats d'une combinaison de modalités, les autres étant regroupées
+
+        Les agrégats portent sur les annonces actuellement comptées : celles
+        du dernier crawl pour un cube tenu par update() (update_cube), avec
+        leur dernier prix connu.
+
+        Exemple : cube.query(quartier="Grangier", pieces=3)
+
+        Returns:
+            dict: Résumé de la cellule (nombre nul si elle est vide)
+        """
+        cell = self.cells.get(self.cell_key(filters))
+        return cell.summary() if cell else CubeCell(self.alpha).summary()
+
+    def drill_down(self, dimension, **filters):
+        """
+        Détail d'une dimension à filtres fixés
+
+        Exemple : cube.drill_down("quartier", pieces=3)
+
+        Returns:
+            dict: {modalité: résumé}, modalités triées
+        """
+        if dimension not in DIMENSIONS or dimension in filters:
+            raise KeyError(f"Dimension de détail invalide: {dimension}")
+        base = self.cell_key(filters)
+        position = DIMENSIONS.index(dimension)
+        result = {}
+        for value in sorted(self.values[dimension]):
+            cell_key = base[:position] + (value,) + base[position + 1:]
+            cell = self.cells.get(cell_key)
+            if cell:
+                result[value] = cell.summary()
+        return result
+
+    def compare(self, dimension, values, **filters):
+        """
+        Compare quelques modalités d'une dimension
+
+        Exemple : cube.compare("quartier", ["Grangier", "Parc"], pieces=3)
+
+        Returns:
+            dict: {modalité demandée: résumé}
+        """
+        return {value: self.query(**dict(filters, **{dimension: value}))
+                for value in values}
+
+    def to_dict(self):
+        return {
+            "version": CUBE_VERSION,
+            "alpha": self.alpha,
+            "dimensions": list(DIMENSIONS),
+            "annonces": {listing_id: [list(dimensions), price, surface]
+                         for listing_id, (dimensions, price, surface)
+                         in self.listings.items()},
+            "cellules": [[list(cell_key), cell.to_dict()]
+                         for cell_key, cell in self.cells.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Raises:
+            ValueError: Si le cube a été enregistré avec d'autres dimensions
+        """
+        if data.get("version") != CUBE_VERSION or \
+                tuple(data.get("dimensions", ())) != DIMENSIONS:
+            raise ValueError("Cube enregistré incompatible")
+        cube = cls(data["alpha"])
+        cube.listings = {listing_id: (tuple(dimensions), price, surface)
+                         for listing_id, (dimensions, price, surface)
+                         in data["annonces"].items()}
+        for cell_key, cell in data["cellules"]:
+            cell_key = tuple(cell_key)
+            cube.cells[cell_key] = CubeCell.from_dict(cell)
+            for dimension, value in zip(DIMENSIONS, cell_key):
+                if value != ALL:
+                    cube.values[dimension].add(value)
+        return cube
+
+    def save(self, path=DEFAULT_CUBE_PATH):
+        """Enregistre le cube de manière atomique"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_CUBE_PATH):
+        """
+        Recharge un cube enregistré
+
+        Returns:
+            StatsCube: Cube vide si le fichier est absent ou incompatible
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return cls()
+
+
+def update_cube(listings, path=DEFAULT_CUBE_PATH):
+    """
+    Met le cube enregistré à l'état d'un crawl complet (voir StatsCube.update)
+
+    Returns:
+        tuple: (annonces ajoutées ou mises à jour, annonces retirées)
+    """
+    cube = StatsCube.load(path)
+    changes = cube.update(listings)
+    cube.save(path)
+    return changes
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Statistiques en flux et fusionnables
+Les quantiles (médiane, p10, p90) sont estimés par un sketch à erreur relative
+bornée (type DDSketch : compteurs par tranche logarithmique), les distributions
+par des histogrammes à bornes fixes. Tout se met à jour annonce par annonce,
+en mémoire bornée, et se fusionne entre fichiers ou entre crawls.
+"""
+
+import json
+import math
+import os
+
+from listing import REJECTION_LABELS, Status
+
+
+DEFAULT_ALPHA = 0.01        # Erreur relative des quantiles (1 %)
+DEFAULT_MAX_BINS = 2048     # Nombre maximal de tranches d'un sketch
+
+# Histogrammes par défaut : (borne basse, borne haute, largeur de classe)
+HISTOGRAMS = {
+    "prix": (0, 3000, 100),
+    "surface": (0, 200, 10),
+    "prix_m2": (0, 50, 2),
+}
+
+QUANTILES = {"p10": 0.1, "mediane": 0.5, "p90": 0.9}
+
+
+class QuantileSketch:
+    """
+    Sketch de quantiles à erreur relative bornée
+
+    Une valeur x > 0 est comptée dans la tranche ceil(log(x) / log(gamma)) ;
+    tout quantile est alors estimé à alpha près (en relatif).
+    """
+
+    def __init__(self, alpha=DEFAULT_ALPHA, max_bins=DEFAULT_MAX_BINS):
+        self.alpha = alpha
+        self.max_bins = max_bins
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value, weight=1):
+        """Ajoute une valeur (les valeurs <= 0 sont comptées à part)"""
+        if value is None:
+            return
+        self.count += weight
+        self.sum += value * weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if value <= 0:
+            self.zero += weight
+            return
+        key = math.ceil(math.log(value) / self.log_gamma)
+        self.bins[key] = self.bins.get(key, 0) + weight
+        if len(self.bins) > self.max_bins:
+            self.collapse()
+
+    def collapse(self):
+        """Fusionne les plus petites tranches pour borner la mémoire"""
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_bins + 1
+        merged = sum(self.bins.pop(key) for key in keys[:excess])
+        target = keys[excess]
+        self.bins[target] = self.bins.get(target, 0) + merged
+
+    def merge(self, other):
+        """
+        Ajoute le contenu d'un autre sketch (même précision)
+
+        Raises:
+            ValueError: Si les précisions diffèrent
+        """
+        if other.alpha != self.alpha:
+            raise ValueError("Sketches de précisions différentes")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero += other.zero
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        while len(self.bins) > self.max_bins:
+            self.collapse()
+        return self
+
+    def subtract(self, other):
+        """
+        Retire le contenu d'un sketch déjà fusionné dans celui-ci (annonce
+        retirée ou modifiée)
+
+        Une tranche regroupée par collapse() est retirée de la tranche qui
+        l'a absorbée. min et max restent des bornes (non resserrées) tant que
+        le sketch n'est pas vide.
+
+        Raises:
+            ValueError: Si les précisions diffèrent
+        """
+        if other.alpha != self.alpha:
+            raise ValueError("Sketches de précisions différentes")
+        for key, count in other.bins.items():
+            if key not in self.bins:
+                # Tranche absorbée par la plus petite tranche supérieure
+                key = min((k for k in self.bins if k > key), default=None)
+                if key is None:
+                    continue
+            remaining = self.bins[key] - count
+            if remaining > 0:
+                self.bins[key] = remaining
+            else:
+                del self.bins[key]
+        self.zero = max(self.zero - other.zero, 0)
+        self.count = max(self.count - other.count, 0)
+        self.sum -= other.sum
+        if not self.count:
+            self.bins = {}
+            self.zero = 0
+            self.sum = 0.0
+            self.min = None
+            self.max = None
+        return self
+
+    def quantile(self, q):
+        """
+        Estime le quantile q (0 à 1)
+
+        Returns:
+            float ou None si le sketch est vide
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                estimate = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(estimate, self.min), self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self):
+        return {
+            "alpha": self.alpha,
+            "max_bins": self.max_bins,
+            "bins": {str(key): count for key, count in self.bins.items()},
+            "zero": self.zero,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["alpha"], data["max_bins"])
+        sketch.bins = {int(key): count for key, count in data["bins"].items()}
+        sketch.zero = data["zero"]
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        sketch.min = data["min"]
+        sketch.max = data["max"]
+        return sketch
+
+
+class Histogram:
+    """Histogramme à classes fixes (fusionnable), avec sous- et dépassements"""
+
+    def __init__(self, low, high, width):
+        self.low = low
+        self.high = high
+        self.width = width
+        self.counts = [0] * math.ceil((high - low) / width)
+        self.under = 0
+        self.over = 0
+
+    def add(self, value, weight=1):
+        if value is None:
+            return
+        if value < self.low:
+            self.under += weight
+        elif value >= self.high:
+            self.over += weight
+        else:
+            self.counts[int((value - self.low) // self.width)] += weight
+
+    def merge(self, other):
+        if (other.low, other.high, other.width) != (self.low, self.high, self.width):
+            raise ValueError("Histogrammes de classes différentes")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.under += other.under
+        self.over += other.over
+        return self
+
+    def classes(self):
+        """
+        Returns:
+            list: Tuples (borne basse, borne haute, effectif) non vides
+        """
+        return [(self.low + i * self.width, self.low + (i + 1) * self.width, count)
+                for i, count in enumerate(self.counts) if count]
+
+    def to_dict(self):
+        return {"low": self.low, "high": self.high, "width": self.width,
+                "counts": self.counts, "under": self.under, "over": self.over}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data["low"], data["high"], data["width"])
+        histogram.counts = list(data["counts"])
+        histogram.under = data["under"]
+        histogram.over = data["over"]
+        return histogram
+
+
+class StatsAccumulator:
+    """
+    Statistiques de tri cumulées : effectifs, motifs de rejet, quantiles et
+    histogrammes des annonces valides
+    """
+
+    def __init__(self, alpha=DEFAULT_ALPHA, histograms=None):
+        """
+        Args:
+            alpha: Erreur relative des quantiles
+            histograms: Classes surchargeant HISTOGRAMS
+        """
+        self.total = 0
+        self.valid = 0
+        self.rejected = 0
+        self.reasons = {label: 0 for label in REJECTION_LABELS.values()}
+        self.sketches = {name: QuantileSketch(alpha) for name in HISTOGRAMS}
+        bounds = dict(HISTOGRAMS)
+        if histograms:
+            bounds.update(histograms)
+        self.histograms = {name: Histogram(*bounds[name]) for name in HISTOGRAMS}
+
+    def add(self, item):
+        """
+        Ajoute une annonce triée (Listing avec statut)
+        """
+        self.total += 1
+        if item.status == Status.REJETEE:
+            self.rejected += 1
+            for flag, label in REJECTION_LABELS.items():
+                if item.rejection & flag:
+                    self.reasons[label] += 1
+            return
+        if item.status != Status.VALIDE:
+            return
+
+        self.valid += 1
+        prix = item.prix or None
+        surface = item.surface_m2 or None
+        values = {
+            "prix": prix,
+            "surface": surface,
+            "prix_m2": prix / surface if prix and surface else None,
+        }
+        for name, value in values.items():
+            self.sketches[name].add(value)
+            self.histograms[name].add(value)
+
+    def add_all(self, listings):
+        """Ajoute toutes les annonces d'un dictionnaire {clé: annonce}"""
+        for item in listings.values():
+            self.add(item)
+        return self
+
+    def merge(self, other):
+        """Ajoute les statistiques d'un autre accumulateur (autre fichier, autre crawl)"""
+        self.total += other.total
+        self.valid += other.valid
+        self.rejected += other.rejected
+        for label, count in other.reasons.items():
+            self.reasons[label] = self.reasons.get(label, 0) + count
+        for name, sketch in other.sketches.items():
+            self.sketches[name].merge(sketch)
+        for name, histogram in other.histograms.items():
+            self.histograms[name].merge(histogram)
+        return self
+
+    def summary(self):
+        """
+        Statistiques lisibles (clés historiques de SortScrapSearch.stats
+        complétées des quantiles, histogrammes et motifs de rejet)
+        """
+        def rounded(value):
+            return round(value, 2) if value is not None else None
+
+        prix, surface = self.sketches["prix"], self.sketches["surface"]
+        stats = {
+            "total_annonces": self.total,
+            "annonces_valides": self.valid,
+            "annonces_rejetees": self.rejected,
+            "taux_validation": round(self.valid / self.total * 100, 2) if self.total else 0,
+            "prix_moyen_valides": rounded(prix.mean()) or 0,
+            "surface_moyenne_valides": rounded(surface.mean()) or 0,
+        }
+        for name, sketch in self.sketches.items():
+            stats[name] = {label: rounded(sketch.quantile(q))
+                           for label, q in QUANTILES.items()}
+            stats[name].update(min=rounded(sketch.min), max=rounded(sketch.max),
+                              nombre=sketch.count)
+        stats["motifs_rejet"] = dict(self.reasons)
+        stats["histogrammes"] = {name: histogram.classes()
+                                 for name, histogram in self.histograms.items()}
+        return stats
+
+    def to_dict(self):
+        return {
+            "total": self.total,
+            "valid": self.valid,
+            "rejected": self.rejected,
+            "reasons": self.reasons,
+            "sketches": {name: s.to_dict() for name, s in self.sketches.items()},
+            "histograms": {name: h.to_dict() for name, h in self.histograms.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        accumulator = cls()
+        accumulator.total = data["total"]
+        accumulator.valid = data["valid"]
+        accumulator.rejected = data["rejected"]
+        accumulator.reasons.update(data["reasons"])
+        accumulator.sketches = {name: QuantileSketch.from_dict(s)
+                                for name, s in data["sketches"].items()}
+        accumulator.histograms = {name: Histogram.from_dict(h)
+                                  for name, h in data["histograms"].items()}
+        return accumulator
+
+    def save(self, path):
+        """Enregistre l'état (pour reprendre le cumul au crawl suivant)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Recharge un état enregistré (accumulateur vide si absent)"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Index bitmap des équipements et classes énergétiques (bitmap_index.py) :
+requêtes comparées à un filtrage direct des annonces
+
+Usage:
+    python -m unittest test_bitmap_index
+"""
+
+import random
+import unittest
+
+from bitmap_index import (BitmapIndex, bitmap_count, bitmap_from_positions,
+                          bitmap_positions)
+from listing import Equipement as E
+
+
+LISTINGS = {
+    "a": {"equipements": int(E.BALCON), "dpe": "C", "ges": "B"},
+    "b": {"equipements": int(E.BALCON | E.MEUBLE), "dpe": "A"},
+    "c": {"equipements": int(E.PARKING | E.ASCENSEUR), "dpe": "E", "ges": "F"},
+    "d": {"equipements": 0, "dpe": None},
+    "e": {"equipements": int(E.JARDIN | E.BALCON), "dpe": "d"},
+    "f": {"equipements": int(E.TERRASSE | E.MEUBLE), "dpe": "G", "ges": "E"},
+}
+
+CLASSES = "ABCDEFG"
+
+
+def rank(value):
+    value = (value or "").strip().upper()
+    return CLASSES.index(value) if value and value in CLASSES else None
+
+
+# Requête -> prédicat équivalent sur (équipements, rang DPE, rang GES)
+QUERIES = {
+    "balcon ET NON meuble": lambda f, dpe, ges: f & E.BALCON and not f & E.MEUBLE,
+    "parking OU ascenseur": lambda f, dpe, ges: f & (E.PARKING | E.ASCENSEUR),
+    "balcon dpe<=C": lambda f, dpe, ges: f & E.BALCON and dpe is not None and dpe <= 2,
+    "(jardin | terrasse) & !meuble":
+        lambda f, dpe, ges: f & (E.JARDIN | E.TERRASSE) and not f & E.MEUBLE,
+    "ges>D": lambda f, dpe, ges: ges is not None and ges > 3,
+    "NON dpe<=G": lambda f, dpe, ges: dpe is None,
+    "dpe=A OR dpe=B AND balcon":
+        lambda f, dpe, ges: dpe == 0 or (dpe == 1 and f & E.BALCON),
+    "NOT (balcon OR parking) AND dpe >= F":
+        lambda f, dpe, ges: not f & (E.BALCON | E.PARKING) and dpe is not None and dpe >= 5,
+}
+
+
+def expected(listings, predicate):
+    return [key for key, item in listings.items()
+            if predicate(item["equipements"], rank(item.get("dpe")), rank(item.get("ges")))]
+
+
+class BitmapTest(unittest.TestCase):
+
+    def test_positions_round_trip(self):
+        positions = [0, 1, 7, 8, 63, 64, 200]
+        bitmap = bitmap_from_positions(positions, 201)
+        self.assertEqual(list(bitmap_positions(bitmap)), positions)
+        self.assertEqual(bitmap_count(bitmap), len(positions))
+        self.assertEqual(list(bitmap_positions(0)), [])
+
+
+class EvaluateTest(unittest.TestCase):
+
+    def test_balcony_without_furniture(self):
+        index = BitmapIndex(LISTINGS)
+        self.assertEqual(index.select("balcon ET NON meuble"), ["a", "e"])
+        self.assertEqual(index.count("balcon ET NON meuble"), 2)
+        self.assertEqual(index.select("Meublé"), ["b", "f"])
+
+    def test_queries_match_direct_filtering(self):
+        index = BitmapIndex(LISTINGS)
+        for query, predicate in QUERIES.items():
+            with self.subTest(query=query):
+                self.assertEqual(index.select(query), expected(LISTINGS, predicate))
+
+    def test_random_listings(self):
+        rnd = random.Random(11)
+        listings = {
+            f"id{i}": {"equipements": rnd.randrange(64),
+                       "dpe": rnd.choice(CLASSES + "  "),
+                       "ges": rnd.choice([None, *CLASSES])}
+            for i in range(300)
+        }
+        index = BitmapIndex(listings)
+        for query, predicate in QUERIES.items():
+            with self.subTest(query=query):
+                self.assertEqual(index.select(query), expected(listings, predicate))
+
+    def test_invalid_queries(self):
+        index = BitmapIndex(LISTINGS)
+        for query in ("", "piscine", "balcon ET", "(balcon", "balcon )", "dpe<=Z"):
+            with self.subTest(query=query):
+                with self.assertRaises(ValueError):
+                    index.evaluate(query)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Journal des prix (price_history.py) : encodage, relecture et index
+
+Usage:
+    python -m unittest test_price_history
+"""
+
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from price_history import (PriceHistory, decode_varint, encode_varint,
+                           unzigzag, zigzag)
+
+
+DAY = 86400
+START = int(datetime(2024, 5, 1, 8).timestamp())
+
+
+def iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+class EncodingTest(unittest.TestCase):
+
+    def test_varint_round_trip(self):
+        values = [0, 1, 127, 128, 300, 2 ** 31, 2 ** 63 + 5]
+        data = b"".join(encode_varint(value) for value in values)
+        pos = 0
+        decoded = []
+        while pos < len(data):
+            value, pos = decode_varint(data, pos)
+            decoded.append(value)
+        self.assertEqual(decoded, values)
+        self.assertEqual(len(encode_varint(127)), 1)
+        self.assertEqual(len(encode_varint(128)), 2)
+
+    def test_zigzag_round_trip(self):
+        self.assertEqual([zigzag(v) for v in (0, -1, 1, -2, 2)], [0, 1, 2, 3, 4])
+        for value in (-10 ** 9, -5000, -1, 0, 1, 4999, 10 ** 9):
+            self.assertEqual(unzigzag(zigzag(value)), value)
+
+    def test_truncated_varint_raises(self):
+        with self.assertRaises(IndexError):
+            decode_varint(encode_varint(300)[:1], 0)
+
+
+class ReplayTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "prix.log")
+        crawls = [
+            {"a": {"prix": 800}, "b": {"prix": 600}},
+            {"a": {"prix": 750}, "b": {"prix": 600}},
+            # b disparaît, c arrive avec une baisse annoncée de 20 %
+            {"a": {"prix": 750}, "c": {"prix": 800, "baisse_prix_pct": 20}},
+            {"a": {"prix": 700}, "b": {"prix": 650}, "c": {"prix": 800}},
+        ]
+        for day, listings in enumerate(crawls):
+            PriceHistory(self.path).record_crawl(listings, collected_at=START + day * DAY)
+
+    def check(self, history):
+        self.assertEqual(history.crawl_count, 4)
+        self.assertEqual(history.history("a"), [
+            (iso(START), 800.0), (iso(START + DAY), 750.0), (iso(START + 3 * DAY), 700.0)])
+        self.assertEqual(history.history("c"), [
+            (iso(START + 2 * DAY), 1000.0), (iso(START + 2 * DAY), 800.0)])
+        self.assertEqual(history.history("inconnue"), [])
+
+        drops = history.price_drops(days=0.5)
+        self.assertEqual([(d["listing_id"], d["ancien_prix"], d["nouveau_prix"])
+                          for d in drops], [("a", 750.0, 700.0)])
+        drops = history.price_drops(days=30)
+        self.assertEqual([(d["listing_id"], d["date"], d["ancien_prix"], d["nouveau_prix"])
+                          for d in drops], [
+            ("a", iso(START + DAY), 800.0, 750.0),
+            ("c", iso(START + 2 * DAY), 1000.0, 800.0),
+            ("a", iso(START + 3 * DAY), 750.0, 700.0),
+        ])
+        self.assertEqual(drops[1]["baisse_pct"], 20.0)
+        # Fenêtre passée : la baisse du dernier crawl n'en fait pas partie
+        self.assertEqual(len(history.price_drops(days=30, now=START + 2 * DAY)), 2)
+
+        self.assertEqual(history.time_on_market("a"), 3.0)
+        summary = history.summary("b")
+        self.assertEqual(summary["prix"], 650.0)
+        self.assertTrue(summary["active"])
+        self.assertEqual(history.history("b"), [
+            (iso(START), 600.0), (iso(START + 3 * DAY), 650.0)])
+
+    def test_replay_from_index(self):
+        self.check(PriceHistory(self.path))
+
+    def test_replay_without_index(self):
+        os.remove(self.path + ".idx")
+        self.check(PriceHistory(self.path))
+
+    def test_gone_listing_keeps_last_seen(self):
+        history = PriceHistory(self.path)
+        history.record_crawl({"a": {"prix": 700}}, collected_at=START + 4 * DAY)
+        summary = history.summary("c")
+        self.assertFalse(summary["active"])
+        self.assertEqual(summary["last_seen"], iso(START + 3 * DAY))
+        self.assertEqual(history.time_on_market("c"), 1.0)
+
+    def test_truncated_record_is_dropped(self):
+        size = os.path.getsize(self.path)
+        with open(self.path, "ab") as f:
+            f.write(b"\x03\x85")
+        os.remove(self.path + ".idx")
+        history = PriceHistory(self.path)
+        self.assertEqual(os.path.getsize(self.path), size)
+        self.check(history)
+
+    def test_index_does_not_grow_with_unchanged_crawls(self):
+        history = PriceHistory(self.path)
+        listings = {"a": {"prix": 700}, "b": {"prix": 650}, "c": {"prix": 800}}
+        history.record_crawl(listings, collected_at=START + 4 * DAY)
+        size = os.path.getsize(self.path + ".idx")
+        for day in range(5, 55):
+            history.record_crawl(listings, collected_at=START + day * DAY)
+        # Une position de crawl par crawl, rien par annonce inchangée
+        self.assertLess(os.path.getsize(self.path + ".idx") - size, 50 * 24)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Recherches enregistrées (profiles.py) : masques de seuils, exclusions et
+accord avec le tri principal (SortScrapSearch.sortSearch)
+
+Usage:
+    python -m unittest test_profiles
+"""
+
+import os
+import random
+import tempfile
+import unittest
+
+from profiles import (ProfileMatcher, SearchProfile, ThresholdIndex,
+                      load_profiles, save_profiles)
+from SortScrapSearch import DEFAULT_CRITERIA, SortScrapSearch
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def brute_force(profile, item):
+    """Règles des profils appliquées annonce par annonce"""
+    return not ProfileMatcher([profile]).explain(profile.nom, item)
+
+
+class ThresholdIndexTest(unittest.TestCase):
+
+    def test_minimum_includes_equal_values(self):
+        index = ThresholdIndex([(500, 0b001), (700, 0b010), (700, 0b100)])
+        self.assertEqual(index.passing(None), 0)
+        self.assertEqual(index.passing(499), 0)
+        self.assertEqual(index.passing(500), 0b001)
+        self.assertEqual(index.passing(700), 0b111)
+        self.assertEqual(index.passing(10 ** 6), 0b111)
+
+    def test_maximum_includes_equal_values(self):
+        index = ThresholdIndex([(500, 0b001), (700, 0b010), (700, 0b100)], is_max=True)
+        self.assertEqual(index.passing(0), 0b111)
+        self.assertEqual(index.passing(500), 0b111)
+        self.assertEqual(index.passing(501), 0b110)
+        self.assertEqual(index.passing(700), 0b110)
+        self.assertEqual(index.passing(701), 0)
+
+
+class MatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.profiles = [
+            SearchProfile("couple", prix_max=800, surface_min=45, pieces_min=2),
+            SearchProfile("etudiant", prix_max=500, exclure_studio=False,
+                          mots_exclus=["travaux", "RDC", "sans  ascenseur"]),
+            SearchProfile("centre", prix_min=400, quartiers=["Grangier", "Darcy"]),
+        ]
+        self.matcher = ProfileMatcher(self.profiles)
+
+    def test_whole_words_and_phrases_are_excluded(self):
+        profile = self.profiles[1]
+        self.assertEqual(profile.mots_exclus, {"travaux", "rdc", "sans ascenseur"})
+        etudiant = 0b010
+        base = {"prix": 450, "studio": True}
+        cases = {
+            "Appartement en RDC": False,
+            "Immeuble sans ascenseur, calme": False,
+            "Petits TRAVAUX à prévoir.": False,
+            "Proche de la rue du Rdcx, ascenseur": True,
+            "Retravaux terminés": True,
+        }
+        for title, kept in cases.items():
+            with self.subTest(titre=title):
+                item = dict(base, titre=title)
+                self.assertEqual(bool(self.matcher.match_one(item) & etudiant), kept)
+
+    def test_missing_surface_passes_missing_price_fails(self):
+        couple = 0b001
+        self.assertTrue(self.matcher.match_one({"prix": 700}) & couple)
+        self.assertFalse(self.matcher.match_one({"prix": 700, "surface_m2": 30}) & couple)
+        self.assertFalse(self.matcher.match_one({"surface_m2": 50}) & couple)
+        self.assertFalse(self.matcher.match_one({"prix": 0, "surface_m2": 50}) & couple)
+
+    def test_single_pass_matches_profile_by_profile(self):
+        rnd = random.Random(5)
+        words = ["calme", "travaux", "rdc", "sans ascenseur", "lumineux", "parc"]
+        listings = {
+            f"id{i}": {
+                "prix": rnd.choice([None, 0, *range(300, 1100, 50)]),
+                "surface_m2": rnd.choice([None, *range(10, 90, 5)]),
+                "nombre_pieces": rnd.choice([None, 1, 2, 3, 4]),
+                "district": rnd.choice(["grangier", "darcy", "parc", None]),
+                "colocation": rnd.random() < 0.1,
+                "studio": rnd.random() < 0.2,
+                "titre": " ".join(rnd.sample(words, 2)),
+            }
+            for i in range(400)
+        }
+        results = self.matcher.match(listings)
+        for profile in self.profiles:
+            with self.subTest(profil=profile.nom):
+                expected = [key for key, item in listings.items()
+                            if brute_force(profile, item)]
+                self.assertEqual(results.valid(profile.nom), expected)
+                partition = results.partition()[profile.nom]
+                self.assertEqual(len(partition["valides"]) + len(partition["rejetees"]),
+                                 len(listings))
+
+    def test_duplicate_names_are_rejected(self):
+        with self.assertRaises(ValueError):
+            ProfileMatcher([SearchProfile("a"), SearchProfile("a")])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profils.json")
+            save_profiles(self.profiles, path)
+            loaded = load_profiles(path)
+        self.assertEqual([p.to_dict() for p in loaded], [p.to_dict() for p in self.profiles])
+
+
+class SortSearchAgreementTest(unittest.TestCase):
+
+    def test_partition_matches_sort_search(self):
+        for name in ("files/seLoger1.json", "res.json"):
+            path = os.path.join(HERE, name)
+            if not os.path.exists(path):
+                continue
+            with self.subTest(fichier=name):
+                sorter = SortScrapSearch(path, use_cache=False)
+                profile = SearchProfile.from_criteria("defaut", DEFAULT_CRITERIA)
+                results = ProfileMatcher([profile]).match(sorter.search)
+                partition = results.partition()["defaut"]
+                self.assertEqual(set(partition["valides"]), set(sorter.validSearch))
+                self.assertEqual(set(partition["rejetees"]), set(sorter.rejectedSearch))
+
+    def test_listing_without_surface(self):
+        listings = {"sans_surface": {"lien": "https://example.test/1", "prix": 600,
+                                     "type": "Appartement"}}
+        sorter = SortScrapSearch(listings, use_cache=False)
+        profile = SearchProfile.from_criteria("defaut", DEFAULT_CRITERIA)
+        self.assertIn("sans_surface", sorter.validSearch)
+        self.assertEqual(ProfileMatcher([profile]).match(sorter.search).valid("defaut"),
+                         ["sans_surface"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Annonces similaires (similarity.py) : plus proches voisins comparés à un
+calcul direct des similarités, filtrage et index approché
+
+Usage:
+    python -m unittest test_similarity
+"""
+
+import random
+import unittest
+
+from listing import Equipement as E
+from SortScrapSearch import SortScrapSearch
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if np is not None:
+    from similarity import SimilarityIndex, standardize
+
+
+WORDS = ["lumineux", "calme", "parquet", "balcon", "cuisine", "equipee",
+         "renove", "moulures", "cave", "gare", "tramway", "jardin"]
+
+
+def market(size=300, seed=3):
+    """Annonces aléatoires autour du centre de Dijon"""
+    rnd = random.Random(seed)
+    listings = {}
+    for i in range(size):
+        surface = rnd.uniform(15, 110)
+        listings[f"id{i}"] = {
+            "prix": round(surface * rnd.uniform(9, 16), 2),
+            "surface_m2": surface,
+            "nombre_pieces": rnd.randint(1, 5),
+            "etage": rnd.choice([None, 0, 1, 2, 3, 4, 5]),
+            "equipements": rnd.randrange(64),
+            "latitude": 47.32 + rnd.uniform(-0.03, 0.03),
+            "longitude": 5.04 + rnd.uniform(-0.04, 0.04),
+            "district": rnd.choice(["Grangier", "Parc", "Cordeliers"]),
+            "description": " ".join(rnd.sample(WORDS, 4)),
+        }
+    return listings
+
+
+def brute_force(index, key, k, metric, eligible=None):
+    """k plus proches voisins calculés directement sur la matrice (float64)"""
+    matrix = index.matrix.astype(np.float64)
+    row = index.positions[key]
+    results = []
+    for other, vector in zip(index.keys, matrix):
+        if other == key or (eligible is not None and other not in eligible):
+            continue
+        if metric == "cosinus":
+            norms = np.linalg.norm(matrix[row]) * np.linalg.norm(vector)
+            score = float(matrix[row] @ vector / norms) if norms else 0.0
+            results.append((-score, other, score))
+        else:
+            distance = float(np.linalg.norm(matrix[row] - vector))
+            results.append((distance, other, distance))
+    results.sort()
+    return [(other, value) for _, other, value in results[:k]]
+
+
+@unittest.skipIf(np is None, "NumPy indisponible")
+class FeatureTest(unittest.TestCase):
+
+    def test_missing_values_are_centered(self):
+        column = standardize(np.array([1.0, np.nan, 3.0]))
+        self.assertEqual(column.tolist(), [-1.0, 0.0, 1.0])
+        self.assertEqual(standardize(np.array([np.nan, np.nan])).tolist(), [0.0, 0.0])
+
+    def test_near_duplicate_is_nearest(self):
+        listings = market()
+        listings["copie"] = dict(listings["id7"], prix=listings["id7"]["prix"] + 5,
+                                 description=listings["id7"]["description"] + " calme")
+        index = SimilarityIndex(listings)
+        for metric in ("cosinus", "euclidienne"):
+            with self.subTest(metrique=metric):
+                self.assertEqual(index.similar("copie", 1, metric)[0][0], "id7")
+                self.assertEqual(index.similar("id7", 1, metric)[0][0], "copie")
+
+
+@unittest.skipIf(np is None, "NumPy indisponible")
+class ExactSearchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.listings = market()
+        self.index = SimilarityIndex(self.listings, approximate=False)
+
+    def check(self, result, expected):
+        self.assertEqual([key for key, _ in result], [key for key, _ in expected])
+        for (_, value), (_, reference) in zip(result, expected):
+            self.assertAlmostEqual(value, reference, places=3)
+
+    def test_neighbours_match_direct_computation(self):
+        for metric in ("cosinus", "euclidienne"):
+            for key in ("id0", "id42", "id299"):
+                with self.subTest(metrique=metric, annonce=key):
+                    result = self.index.similar(key, 10, metric)
+                    self.assertEqual(len(result), 10)
+                    self.assertNotIn(key, [other for other, _ in result])
+                    self.check(result, brute_force(self.index, key, 10, metric))
+
+    def test_batch_matches_single_queries(self):
+        keys = list(self.listings)[:20]
+        for key, result in zip(keys, self.index.similar_many(keys, 5)):
+            self.assertEqual(result, self.index.similar(key, 5))
+
+    def test_mask_restricts_candidates(self):
+        eligible = {key for key, item in self.listings.items()
+                    if item["equipements"] & E.BALCON}
+        mask = self.index.mask_for(eligible | {"inconnue"})
+        self.assertEqual(int(mask.sum()), len(eligible))
+        result = self.index.similar("id0", 8, "euclidienne", mask)
+        self.assertTrue({key for key, _ in result} <= eligible)
+        self.check(result, brute_force(self.index, "id0", 8, "euclidienne", eligible))
+        # Moins d'annonces éligibles que k : toutes, sans la référence
+        few = self.index.mask_for(["id0", "id1", "id2"])
+        self.assertEqual([key for key, _ in self.index.similar("id0", 10, mask=few)],
+                         [key for key, _ in brute_force(self.index, "id0", 10, "cosinus",
+                                                        {"id1", "id2"})])
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(KeyError):
+            self.index.similar("inconnue")
+        with self.assertRaises(ValueError):
+            self.index.similar("id0", metric="manhattan")
+
+
+@unittest.skipIf(np is None, "NumPy indisponible")
+class ApproximateSearchTest(unittest.TestCase):
+
+    def test_approximate_results_are_exact_scores_of_candidates(self):
+        listings = market(size=2000, seed=9)
+        index = SimilarityIndex(listings, approximate=True, seed=1)
+        for key in ("id0", "id500", "id1999"):
+            with self.subTest(annonce=key):
+                approx = index.similar(key, 10)
+                exact = index.similar(key, 10, approximate=False)
+                self.assertEqual(len(approx), 10)
+                self.assertNotIn(key, [other for other, _ in approx])
+                # Scores exacts, triés, jamais meilleurs que le score exact de même rang
+                scores = [value for _, value in approx]
+                self.assertEqual(scores, sorted(scores, reverse=True))
+                for (other, value), (_, reference) in zip(approx, exact):
+                    self.assertLessEqual(value, reference + 1e-4)
+                    direct = index.scores(np.array([index.positions[key]]),
+                                          np.array([index.positions[other]]))[0, 0]
+                    self.assertAlmostEqual(value, float(direct), places=3)
+
+    def test_poor_buckets_fall_back_to_exact(self):
+        listings = market(size=30)
+        index = SimilarityIndex(listings, approximate=True)
+        self.assertEqual(index.similar("id3", 25), index.similar("id3", 25, approximate=False))
+
+
+@unittest.skipIf(np is None, "NumPy indisponible")
+class FindSimilarTest(unittest.TestCase):
+
+    def test_only_valid_listings_are_suggested(self):
+        listings = market(size=40)
+        for position, item in enumerate(listings.values()):
+            item.update(lien=f"https://example.test/{position}", type="Appartement")
+        sorter = SortScrapSearch(listings, use_cache=False)
+        self.assertTrue(sorter.rejectedSearch)
+        valid = {key for key, _ in sorter.findSimilar("id0", 50)}
+        self.assertEqual(valid, set(sorter.validSearch) - {"id0"})
+        everything = {key for key, _ in sorter.findSimilar("id0", 50, valid_only=False)}
+        self.assertEqual(everything, set(listings) - {"id0"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cube d'agrégats (stats_cube.py) : regroupements, requêtes et mise à jour
+d'un crawl à l'autre
+
+Usage:
+    python -m unittest test_stats_cube
+"""
+
+import os
+import random
+import tempfile
+import unittest
+
+from stats_cube import StatsCube, update_cube
+from stats_engine import DEFAULT_ALPHA, QuantileSketch
+
+
+def market(size=400, seed=7):
+    """Annonces aléatoires sur quatre quartiers"""
+    rnd = random.Random(seed)
+    return {
+        f"id{i}": {
+            "prix": rnd.randint(400, 1200),
+            "surface_m2": rnd.randint(15, 90),
+            "nombre_pieces": rnd.randint(1, 6),
+            "district": rnd.choice(["Grangier", "Parc", "Cordeliers", "Montchapet"]),
+            "dpe": rnd.choice("ABCDEFG"),
+        }
+        for i in range(size)
+    }
+
+
+def median(values):
+    """Médiane au sens du sketch : valeur de rang q * (n - 1) arrondi au-dessus"""
+    values = sorted(values)
+    return values[-(-(len(values) - 1) // 2)]
+
+
+class CubeQueryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.listings = market()
+        self.cube = StatsCube()
+        self.assertEqual(self.cube.add_all(self.listings), len(self.listings))
+
+    def selection(self, district=None, rooms=None):
+        return [item for item in self.listings.values()
+                if district in (None, item["district"])
+                and rooms in (None, min(item["nombre_pieces"], 5))]
+
+    def test_query_matches_direct_computation(self):
+        items = self.selection("Grangier", 3)
+        result = self.cube.query(quartier="Grangier", pieces=3)
+        self.assertEqual(result["nombre"], len(items))
+        self.assertAlmostEqual(result["prix_moyen"],
+                               sum(i["prix"] for i in items) / len(items), places=2)
+        self.assertAlmostEqual(result["prix_m2_moyen"],
+                               sum(i["prix"] for i in items) / sum(i["surface_m2"] for i in items),
+                               places=2)
+        expected = median(i["prix"] / i["surface_m2"] for i in items)
+        self.assertLessEqual(abs(result["prix_m2_mediane"] - expected),
+                             DEFAULT_ALPHA * expected + 0.01)
+
+    def test_rollups_are_consistent(self):
+        self.assertEqual(self.cube.query()["nombre"], len(self.listings))
+        by_district = self.cube.drill_down("quartier", pieces="5+")
+        self.assertEqual(sorted(by_district), ["cordeliers", "grangier", "montchapet", "parc"])
+        self.assertEqual(sum(cell["nombre"] for cell in by_district.values()),
+                         len(self.selection(rooms=5)))
+        compared = self.cube.compare("quartier", ["Grangier", "Parc"])
+        self.assertEqual(compared["Parc"]["nombre"], len(self.selection("Parc")))
+        with self.assertRaises(KeyError):
+            self.cube.query(ville="Dijon")
+
+    def test_unchanged_listings_are_not_counted_twice(self):
+        self.assertEqual(self.cube.add_all(self.listings), 0)
+        self.assertEqual(self.cube.query()["nombre"], len(self.listings))
+
+
+class CubeUpdateTest(unittest.TestCase):
+
+    def test_update_follows_the_current_market(self):
+        listings = market()
+        cube = StatsCube()
+        cube.update(listings)
+
+        current = dict(listings)
+        for i in range(0, 400, 10):
+            del current[f"id{i}"]
+        for i in range(1, 400, 10):
+            current[f"id{i}"] = dict(current[f"id{i}"], prix=current[f"id{i}"]["prix"] - 50)
+        current["nouvelle"] = dict(listings["id3"], district="Parc")
+        self.assertEqual(cube.update(current), (41, 40))
+
+        fresh = StatsCube()
+        fresh.add_all(current)
+        self.assertEqual(set(cube.cells), set(fresh.cells))
+        for cell_key, cell in fresh.cells.items():
+            expected = cell.summary()
+            result = cube.cells[cell_key].summary()
+            self.assertEqual(result["nombre"], expected["nombre"])
+            self.assertAlmostEqual(result["prix_moyen"], expected["prix_moyen"], places=6)
+            self.assertAlmostEqual(result["prix_m2_moyen"], expected["prix_m2_moyen"], places=6)
+
+    def test_last_listing_removed_empties_the_cell(self):
+        cube = StatsCube()
+        cube.update({"a": {"prix": 700, "surface_m2": 40, "district": "Parc"},
+                     "b": {"prix": 900, "surface_m2": 60, "district": "Grangier"}})
+        cube.update({"b": {"prix": 850, "surface_m2": 60, "district": "Grangier"}})
+        self.assertEqual(cube.query(quartier="Parc")["nombre"], 0)
+        self.assertNotIn("parc", cube.drill_down("quartier"))
+        self.assertEqual(cube.query()["prix_moyen"], 850.0)
+
+    def test_saved_cube_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cube.json")
+            listings = market(100)
+            self.assertEqual(update_cube(listings, path), (100, 0))
+            del listings["id0"]
+            self.assertEqual(update_cube(listings, path), (0, 1))
+            cube = StatsCube.load(path)
+        self.assertEqual(cube.query()["nombre"], 99)
+        self.assertEqual(len(cube.listings), 99)
+
+
+class SketchSubtractTest(unittest.TestCase):
+
+    def test_subtract_restores_previous_quantiles(self):
+        base = QuantileSketch()
+        for value in range(1, 101):
+            base.add(value)
+        extra = QuantileSketch()
+        for value in (500, 600, 700):
+            extra.add(value)
+        combined = QuantileSketch().merge(base).merge(extra)
+        combined.subtract(extra)
+        self.assertEqual(combined.count, base.count)
+        self.assertEqual(combined.bins, base.bins)
+        self.assertEqual(combined.quantile(0.5), base.quantile(0.5))
+        combined.subtract(base)
+        self.assertEqual((combined.count, combined.quantile(0.5)), (0, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
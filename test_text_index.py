@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Recherche plein texte (text_index.py, SortScrapSearch.searchText) sur un
+petit index temporaire
+
+Usage:
+    python -m unittest test_text_index
+"""
+
+import hashlib
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from SortScrapSearch import SortScrapSearch
+from text_index import TextIndex
+
+
+LISTINGS = {
+    "a": {"lien": "https://example.test/a", "prix": 600, "titre": "T2 calme",
+          "description": "Chauffage individuel, proche du parc"},
+    "b": {"lien": "https://example.test/b", "prix": 650, "titre": "T3 lumineux",
+          "description": "Très calme, chauffage collectif"},
+    "c": {"lien": "https://example.test/c", "prix": 700, "titre": "T2 rénové",
+          "description": "Cuisine équipée, proche gare"},
+}
+# Annonce d'un ancien crawl, présente dans l'index mais pas chargée
+ARCHIVED = {"z": {"lien": "https://example.test/z", "prix": 500, "titre": "Studio calme",
+                  "description": "Chauffage individuel"}}
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class SearchTextTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "index.db")
+        self.sorter = SortScrapSearch(dict(LISTINGS), use_cache=False)
+        with TextIndex(self.path) as index:
+            index.add_listings(ARCHIVED)
+        self.assertEqual(self.sorter.indexText(self.path), 3)
+
+    def test_only_loaded_listings_are_returned(self):
+        results = self.sorter.searchText("calme", index_path=self.path)
+        self.assertEqual(sorted(key for key, _ in results), ["a", "b"])
+        scores = [score for _, score in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+    def test_phrase_ignores_accents_and_limit_applies(self):
+        results = self.sorter.searchText('"chauffage individuel"', index_path=self.path)
+        self.assertEqual([key for key, _ in results], ["a"])
+        self.assertEqual([key for key, _ in self.sorter.searchText(
+            "equipee", index_path=self.path)], ["c"])
+        self.assertEqual(len(self.sorter.searchText(
+            "chauffage OR cuisine", limit=2, index_path=self.path)), 2)
+
+    def test_repeated_query_does_not_write_the_index(self):
+        before = file_digest(self.path)
+        with mock.patch.object(TextIndex, "add_listings",
+                               side_effect=AssertionError("écriture dans l'index")):
+            first = self.sorter.searchText("calme", index_path=self.path)
+            second = self.sorter.searchText("calme", index_path=self.path)
+        self.assertEqual(first, second)
+        self.assertEqual(file_digest(self.path), before)
+
+    def test_invalid_query_and_missing_index(self):
+        with self.assertRaises(ValueError):
+            self.sorter.searchText('"guillemet non fermé', index_path=self.path)
+        missing = os.path.join(os.path.dirname(self.path), "absent.db")
+        self.assertEqual(self.sorter.searchText("calme", index_path=missing), [])
+        self.assertFalse(os.path.exists(missing))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Détection des blocages et régulation du débit contre le serveur de test
+(mock_server.py), sans Scrapy ni accès au vrai site
+
+Usage:
+    python -m unittest test_throttling
+"""
+
+import time
+import unittest
+from types import SimpleNamespace
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from mock_server import MockSeLogerServer
+from throttling import AdaptiveRateController, block_reason, retry_after_seconds
+
+
+def fetch(url):
+    """
+    Télécharge une page du serveur de test
+
+    Returns:
+        tuple: (réponse au format attendu par block_reason, latence en s)
+    """
+    started = time.monotonic()
+    try:
+        with urlopen(url, timeout=5) as reply:
+            status, headers, body = reply.status, dict(reply.headers), reply.read()
+    except HTTPError as e:
+        status, headers, body = e.code, dict(e.headers), e.read()
+    response = SimpleNamespace(status=status, url=url, headers=headers,
+                               text=body.decode("utf-8"))
+    return response, time.monotonic() - started
+
+
+class BlockReasonTest(unittest.TestCase):
+
+    def test_results_page_with_datadome_tag_is_not_blocked(self):
+        with MockSeLogerServer(latency=0) as server:
+            response, _ = fetch(server.url)
+        self.assertIn("js.datadome.co", response.text)
+        self.assertIn("g-recaptcha", response.text)
+        self.assertIsNone(block_reason(response))
+
+    def test_challenge_page_is_captcha(self):
+        with MockSeLogerServer(latency=0, captcha_every=1) as server:
+            response, _ = fetch(server.url)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(block_reason(response), "captcha")
+
+    def test_rate_limit_is_reported_with_retry_after(self):
+        with MockSeLogerServer(latency=0, rate_limit=1) as server:
+            fetch(server.url)
+            response, _ = fetch(server.url)
+        self.assertEqual(block_reason(response), "http_429")
+        self.assertEqual(retry_after_seconds(response), 1.0)
+
+
+class AdaptiveRateControllerTest(unittest.TestCase):
+
+    def test_backs_off_to_the_server_rate_limit(self):
+        rate_limit = 20
+        controller = AdaptiveRateController(target_latency=0.5, start_delay=0.01,
+                                            min_delay=0.01, max_delay=2.0,
+                                            max_concurrency=1)
+        outcomes = []
+        with MockSeLogerServer(latency=0, rate_limit=rate_limit) as server:
+            for _ in range(60):
+                time.sleep(controller.delay)
+                response, latency = fetch(server.url)
+                reason = block_reason(response)
+                controller.observe(latency, response.status, blocked=reason,
+                                   retry_after=retry_after_seconds(response))
+                outcomes.append(reason)
+
+        # Trop rapide au départ : le serveur limite, le régulateur recule...
+        self.assertGreaterEqual(controller.blocks.get("http_429", 0), 1)
+        self.assertNotIn("captcha", outcomes)
+        # ...puis se stabilise sous la limite
+        self.assertLessEqual(outcomes[-20:].count("http_429"), 1)
+        self.assertGreaterEqual(controller.delay, 0.5 / rate_limit)
+
+    def test_captcha_halves_concurrency(self):
+        controller = AdaptiveRateController(target_latency=1.0, start_delay=0.5,
+                                            max_concurrency=8)
+        with MockSeLogerServer(latency=0) as server:
+            for _ in range(5):
+                response, latency = fetch(server.url)
+                controller.observe(latency, response.status, blocked=block_reason(response))
+        self.assertGreater(controller.concurrency, 1)
+        concurrency, delay = controller.concurrency, controller.delay
+
+        with MockSeLogerServer(latency=0, captcha_every=1) as server:
+            response, latency = fetch(server.url)
+        controller.observe(latency, response.status, blocked=block_reason(response))
+        self.assertEqual(controller.concurrency, max(1, concurrency // 2))
+        self.assertGreater(controller.delay, delay)
+        self.assertEqual(controller.blocks, {"captcha": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Index plein texte persistant des annonces (SQLite FTS5, classement BM25)
+Les recherches interrogent uniquement l'index sur disque, sans recharger les
+fichiers JSON des crawls.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+from listing import format_price, listing_document_id
+
+
+DEFAULT_INDEX_PATH = "annonces_index.db"
+
+# Poids BM25 des colonnes (titre, description, caractéristiques)
+COLUMN_WEIGHTS = (2.0, 1.0, 1.5)
+
+
+def listing_text_fields(item):
+    """
+    Extrait les champs texte indexés d'une annonce
+
+    Returns:
+        tuple: (titre, description, caractéristiques)
+    """
+    title = item.get('titre') or item.get('type') or ''
+    description = item.get('description') or ''
+    features = []
+    if item.get('caracteristiques'):
+        features.append(item['caracteristiques'])
+    features.extend(str(spec) for spec in item.get('specificite') or [])
+    return title, description, ', '.join(features)
+
+
+class TextIndex:
+    """Index plein texte incrémental stocké dans une base SQLite"""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, read_only=False):
+        """
+        Ouvre (ou crée) l'index
+
+        Args:
+            path: Chemin du fichier SQLite
+            read_only: Ouvrir en lecture seule (recherches), l'index doit exister
+
+        Raises:
+            FileNotFoundError: Index absent en lecture seule
+        """
+        self.path = path
+        self.read_only = read_only
+        if read_only:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Index plein texte absent: {path}")
+            self.connection = sqlite3.connect(
+                Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+        else:
+            self.connection = sqlite3.connect(path)
+            self.create_schema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Ferme la connexion à la base"""
+        self.connection.close()
+
+    def create_schema(self):
+        """Crée les tables si nécessaire"""
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY,
+                    doc_id TEXT UNIQUE NOT NULL,
+                    checksum TEXT NOT NULL,
+                    lien TEXT,
+                    prix TEXT,
+                    source TEXT,
+                    indexed_at TEXT
+                )
+            """)
+            self.connection.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+                    titre, description, caracteristiques,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            """)
+
+    def add_listings(self, listings, source=None):
+        """
+        Indexe (ou met à jour) des annonces
+
+        Les annonces dont le contenu n'a pas changé depuis la dernière
+        indexation sont ignorées.
+
+        Args:
+            listings: Dictionnaire {clé: annonce}
+            source: Nom du fichier ou du crawl d'origine
+
+        Returns:
+            int: Nombre d'annonces ajoutées ou mises à jour
+        """
+        indexed_at = datetime.now().isoformat()
+        updated = 0
+
+        with self.connection:
+            cursor = self.connection.cursor()
+            for key, item in listings.items():
+                doc_id = listing_document_id(key, item)
+                fields = listing_text_fields(item)
+                checksum = hashlib.sha1(
+                    json.dumps(fields, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+                row = cursor.execute(
+                    "SELECT id, checksum FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+                if row and row[1] == checksum:
+                    continue
+
+                if row:
+                    rowid = row[0]
+                    cursor.execute(
+                        "UPDATE documents SET checksum = ?, lien = ?, prix = ?, source = ?, indexed_at = ? WHERE id = ?",
+                        (checksum, item.get('lien'), format_price(item.get('prix')), source, indexed_at, rowid))
+                    cursor.execute(
+                        "DELETE FROM documents_fts WHERE rowid = ?", (rowid,))
+                else:
+                    cursor.execute(
+                        "INSERT INTO documents (doc_id, checksum, lien, prix, source, indexed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                        (doc_id, checksum, item.get('lien'), format_price(item.get('prix')), source, indexed_at))
+                    rowid = cursor.lastrowid
+
+                cursor.execute(
+                    "INSERT INTO documents_fts (rowid, titre, description, caracteristiques) VALUES (?, ?, ?, ?)",
+                    (rowid, *fields))
+                updated += 1
+
+        return updated
+
+    def search(self, query, limit=20, doc_ids=None):
+        """
+        Recherche des annonces, classées par pertinence BM25
+
+        La syntaxe FTS5 est acceptée : termes implicitement combinés par AND,
+        opérateurs AND/OR/NOT, phrases entre guillemets, préfixes (calm*).
+        Les accents sont ignorés.
+
+        Args:
+            query: Requête (ex: '"cuisine équipée" AND calme NOT colocation')
+            limit: Nombre maximal de résultats
+            doc_ids: Identifiants auxquels limiter la recherche (ensemble ou
+                     dictionnaire, None pour tout l'index) ; le filtre est
+                     appliqué dans la requête, avant LIMIT
+
+        Returns:
+            list: Dictionnaires {doc_id, lien, prix, source, score}
+
+        Raises:
+            ValueError: Requête FTS5 invalide
+        """
+        weights = ', '.join(str(w) for w in COLUMN_WEIGHTS)
+        selection = ""
+        if doc_ids is not None:
+            # Test d'appartenance appelé par SQLite, sans rien écrire dans la base
+            self.connection.create_function("selectionne", 1, doc_ids.__contains__)
+            selection = "AND selectionne(d.doc_id)"
+        try:
+            rows = self.connection.execute(f"""
+                SELECT d.doc_id, d.lien, d.prix, d.source, bm25(documents_fts, {weights}) AS rank
+                FROM documents_fts
+                JOIN documents d ON d.id = documents_fts.rowid
+                WHERE documents_fts MATCH ? {selection}
+                ORDER BY rank
+                LIMIT ?
+            """, (query, limit)).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Requête invalide '{query}': {e}")
+
+        # bm25() renvoie un score négatif (plus petit = plus pertinent)
+        return [
+            {'doc_id': doc_id, 'lien': lien, 'prix': prix,
+             'source': source, 'score': round(-rank, 4)}
+            for doc_id, lien, prix, source, rank in rows
+        ]
+
+    def matching_ids(self, query):
+        """
+        Retourne l'ensemble des identifiants correspondant à une requête
+        """
+        try:
+            rows = self.connection.execute("""
+                SELECT d.doc_id FROM documents_fts
+                JOIN documents d ON d.id = documents_fts.rowid
+                WHERE documents_fts MATCH ?
+            """, (query,)).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Requête invalide '{query}': {e}")
+        return {row[0] for row in rows}
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Régulation adaptative du débit de crawl
+Au lieu d'un délai fixe d'une seconde et d'une requête à la fois, le délai et
+la concurrence suivent ce que le site renvoie :
+
+- réponses rapides : le délai diminue, la concurrence augmente d'un cran ;
+- réponses plus lentes que la latence cible : le délai se rapproche de la
+  latence observée, la concurrence diminue ;
+- 429 / 503 / page captcha : le délai double (ou suit Retry-After) et la
+  concurrence est divisée par deux ; on ne réaccélère ensuite que lentement
+  sous le rythme qui a provoqué le blocage.
+
+AdaptiveRateController ne dépend pas de Scrapy (testable contre mock_server.py) ;
+AdaptiveThrottleMiddleware l'applique aux files de téléchargement de Scrapy.
+"""
+
+import re
+from collections import deque
+
+
+# Codes qui signalent une surcharge ou un refus du site
+THROTTLE_STATUSES = (429, 503)
+BLOCK_STATUSES = (403,)
+
+# Marqueurs propres aux pages de vérification (DataDome pour SeLoger,
+# PerimeterX...). Les pages ordinaires d'un site protégé embarquent le script
+# DataDome (datadome, g-recaptcha dans un formulaire...) : ces mots seuls ne
+# signalent pas un blocage.
+CHALLENGE_MARKERS = re.compile(
+    r"captcha-delivery\.com|px-captcha|vérifiez que vous êtes humain|"
+    r"verify you are (a )?human",
+    re.IGNORECASE)
+# Titre d'une page de vérification : vide, nom de domaine seul ou libellé générique
+CHALLENGE_TITLES = re.compile(
+    r"^$|^[\w.-]+\.[a-z]{2,}$|captcha|vérification|verification|"
+    r"just a moment|access denied|accès refusé",
+    re.IGNORECASE)
+TITLE_PATTERN = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+CAPTCHA_SCAN_BYTES = 64 * 1024          # Les marqueurs sont en tête de page
+
+
+def block_reason(response):
+    """
+    Détecte une réponse de blocage (limite de débit, refus, captcha)
+
+    Une page n'est considérée comme captcha que si elle contient un marqueur
+    de vérification et qu'elle est servie en erreur HTTP ou sous un titre
+    générique (page de résultats ordinaire exclue).
+
+    Args:
+        response: Réponse Scrapy (ou objet avec status, url et text)
+
+    Returns:
+        str: "http_429", "http_503", "http_403", "captcha" ou None
+    """
+    status = getattr(response, "status", 200)
+    if status in THROTTLE_STATUSES or status in BLOCK_STATUSES:
+        return f"http_{status}"
+
+    # Redirection vers la page de vérification
+    if "captcha-delivery.com" in (getattr(response, "url", "") or ""):
+        return "captcha"
+    try:
+        text = response.text
+    except (AttributeError, ValueError):
+        # Réponse binaire : pas de page de vérification
+        return None
+    head = text[:CAPTCHA_SCAN_BYTES]
+    if not CHALLENGE_MARKERS.search(head):
+        return None
+    if status >= 400:
+        return "captcha"
+    match = TITLE_PATTERN.search(head)
+    title = match.group(1).strip() if match else ""
+    if CHALLENGE_TITLES.search(title):
+        return "captcha"
+    return None
+
+
+def retry_after_seconds(response):
+    """
+    Lit l'en-tête Retry-After (en secondes) d'une réponse
+
+    Returns:
+        float ou None
+    """
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("Retry-After")
+    if isinstance(value, bytes):
+        value = value.decode("latin-1")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateController:
+    """
+    Délai et concurrence ajustés à chaque réponse
+
+    Augmentation additive de la concurrence et diminution multiplicative du
+    délai tant que le site répond vite ; recul multiplicatif dès un blocage.
+    """
+
+    def __init__(self, target_latency=1.0, start_delay=1.0, min_delay=0.1,
+                 max_delay=60.0, max_concurrency=8, max_error_rate=0.1,
+                 window=20):
+        """
+        Args:
+            target_latency: Latence visée par réponse (s)
+            start_delay: Délai initial entre deux requêtes (s)
+            min_delay: Délai minimal, même si le site répond vite (s)
+            max_delay: Délai maximal après des blocages répétés (s)
+            max_concurrency: Requêtes simultanées au plus
+            max_error_rate: Taux d'erreurs récentes au-delà duquel on n'accélère plus
+            window: Nombre de réponses récentes prises en compte
+        """
+        if target_latency <= 0:
+            raise ValueError("La latence cible doit être positive")
+        if not 0 < min_delay <= max_delay:
+            raise ValueError("Délais invalides: 0 < min_delay <= max_delay requis")
+
+        self.target_latency = target_latency
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_error_rate = max_error_rate
+
+        self.delay = min(max(start_delay, min_delay), max_delay)
+        self.concurrency = 1
+        # Délai auquel le dernier blocage est survenu : en dessous, on
+        # n'accélère plus que prudemment
+        self.blocked_delay = 0.0
+        self.recent = deque(maxlen=window)          # (latence, erreur)
+        self.responses = 0
+        self.errors = 0
+        self.blocks = {}                            # {motif: nombre}
+
+    @property
+    def error_rate(self):
+        """Part d'erreurs parmi les réponses récentes"""
+        if not self.recent:
+            return 0.0
+        return sum(error for _, error in self.recent) / len(self.recent)
+
+    @property
+    def mean_latency(self):
+        """Latence moyenne des réponses récentes réussies (s)"""
+        latencies = [latency for latency, error in self.recent if not error]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    def observe(self, latency, status=200, blocked=None, retry_after=None):
+        """
+        Prend en compte une réponse et ajuste délai et concurrence
+
+        Args:
+            latency: Durée du téléchargement (s)
+            status: Code HTTP
+            blocked: Motif de blocage (voir block_reason) ou None
+            retry_after: Attente demandée par le site (s) ou None
+
+        Returns:
+            tuple: (délai, concurrence) après ajustement
+        """
+        latency = max(0.0, latency or 0.0)
+        error = bool(blocked) or status >= 500
+        self.responses += 1
+        self.recent.append((latency, error))
+
+        if blocked:
+            self.blocks[blocked] = self.blocks.get(blocked, 0) + 1
+            self.back_off(retry_after)
+        elif error:
+            # Erreur serveur ponctuelle : on ralentit sans réduire de moitié
+            self.errors += 1
+            self.delay = min(self.max_delay, self.delay * 1.5)
+        elif latency > self.target_latency:
+            # Le site ralentit : le délai rejoint la latence observée
+            self.delay = min(self.max_delay, max(self.min_delay,
+                                                 (self.delay + latency) / 2))
+            self.concurrency = max(1, self.concurrency - 1)
+        else:
+            factor = 0.8 if self.delay > self.blocked_delay else 0.97
+            self.delay = max(self.min_delay, self.delay * factor)
+            if self.error_rate <= self.max_error_rate and \
+                    self.concurrency < self.max_concurrency and \
+                    latency * (self.concurrency + 1) <= self.target_latency * 2:
+                self.concurrency += 1
+
+        return self.delay, self.concurrency
+
+    def observe_failure(self):
+        """Échec de téléchargement (délai dépassé, connexion refusée)"""
+        self.responses += 1
+        self.errors += 1
+        self.recent.append((self.target_latency, True))
+        self.back_off()
+        return self.delay, self.concurrency
+
+    def back_off(self, retry_after=None):
+        """Recul après un blocage : délai doublé, concurrence divisée par deux"""
+        self.blocked_delay = self.delay
+        delay = max(self.delay * 2, self.min_delay * 2)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        self.delay = min(self.max_delay, delay)
+        self.concurrency = max(1, self.concurrency // 2)
+
+    def summary(self):
+        """
+        Returns:
+            dict: État courant (pour les logs et les statistiques du crawl)
+        """
+        mean_latency = self.mean_latency
+        return {
+            "delai": round(self.delay, 3),
+            "concurrence": self.concurrency,
+            "reponses": self.responses,
+            "erreurs": self.errors,
+            "blocages": dict(self.blocks),
+            "taux_erreur": round(self.error_rate, 3),
+            "latence_moyenne": round(mean_latency, 3) if mean_latency is not None else None,
+        }
+
+
+class AdaptiveThrottleMiddleware:
+    """
+    Middleware de téléchargement Scrapy appliquant AdaptiveRateController
+
+    Réglages (settings) :
+        ADAPTIVE_THROTTLE_ENABLED          Actif (défaut True)
+        ADAPTIVE_THROTTLE_TARGET_LATENCY   Latence visée en secondes (défaut 1.0)
+        ADAPTIVE_THROTTLE_MIN_DELAY        Délai minimal (défaut 0.1)
+        ADAPTIVE_THROTTLE_MAX_DELAY        Délai maximal (défaut 60)
+        ADAPTIVE_THROTTLE_MAX_CONCURRENCY  Concurrence maximale (défaut
+                                           CONCURRENT_REQUESTS_PER_DOMAIN)
+        DOWNLOAD_DELAY                     Délai initial
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.options = {
+            "target_latency": settings.getfloat("ADAPTIVE_THROTTLE_TARGET_LATENCY", 1.0),
+            "start_delay": settings.getfloat("DOWNLOAD_DELAY", 1.0),
+            "min_delay": settings.getfloat("ADAPTIVE_THROTTLE_MIN_DELAY", 0.1),
+            "max_delay": settings.getfloat("ADAPTIVE_THROTTLE_MAX_DELAY", 60.0),
+            "max_concurrency": settings.getint(
+                "ADAPTIVE_THROTTLE_MAX_CONCURRENCY",
+                settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN", 8)),
+        }
+        self.controllers = {}           # Un régulateur par file (domaine)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        from scrapy import signals
+        from scrapy.exceptions import NotConfigured
+
+        if not crawler.settings.getbool("ADAPTIVE_THROTTLE_ENABLED", True):
+            raise NotConfigured
+        middleware = cls(crawler)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def _slot(self, request):
+        key = request.meta.get("download_slot")
+        return key, self.crawler.engine.downloader.slots.get(key)
+
+    def _controller(self, key):
+        controller = self.controllers.get(key)
+        if controller is None:
+            controller = self.controllers[key] = AdaptiveRateController(**self.options)
+        return controller
+
+    def _apply(self, request, spider, update):
+        key, slot = self._slot(request)
+        controller = self._controller(key)
+        before = (controller.delay, controller.concurrency)
+        delay, concurrency = update(controller)
+        if slot is not None:
+            slot.delay = delay
+            slot.concurrency = concurrency
+        if (delay, concurrency) != before:
+            spider.logger.debug(f"Débit {key}: délai {delay:.2f}s, concurrence {concurrency}")
+        return controller
+
+    def process_response(self, request, response, spider):
+        if request.meta.get("dont_throttle"):
+            return response
+        reason = block_reason(response)
+        latency = request.meta.get("download_latency", 0.0)
+        self._apply(request, spider, lambda controller: controller.observe(
+            latency, response.status, reason, retry_after_seconds(response)))
+        if reason:
+            spider.logger.warning(f"Blocage détecté ({reason}) sur {response.url}")
+            self.crawler.stats.inc_value(f"adaptive_throttle/blocages/{reason}")
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self._apply(request, spider, lambda controller: controller.observe_failure())
+        return None
+
+    def spider_closed(self, spider):
+        for key, controller in self.controllers.items():
+            summary = controller.summary()
+            spider.logger.info(f"Débit final {key}: {summary}")
+            self.crawler.stats.set_value("adaptive_throttle/delai", summary["delai"])
+            self.crawler.stats.set_value("adaptive_throttle/concurrence", summary["concurrence"])